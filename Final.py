@@ -1,9 +1,27 @@
 import tkinter as tk
 from tkinter import messagebox
+from tkinter import filedialog
+from tkinter import simpledialog
 from tkinter import ttk
-import json
+import argparse
 import os
 import datetime
+import time
+
+import demand
+import instrumentation
+import inventory
+import metrics
+import order_index
+import order_store
+import prep_queue
+import pricing
+import ui_replay
+import ui_style
+import user_store
+# async_bridge (and asyncio), order_export, profiling, replication, reports
+# and tickets are imported where they are used, so launching the till
+# doesn't pay for them
 
 ICON_HOME = "\U0001F3E0"
 ICON_EXIT = "\u21B5"
@@ -14,67 +32,263 @@ ORDERS_FILE = os.path.join(os.path.dirname(__file__), "orders.json")
 
 USERS_FILE = os.path.join(os.path.dirname(__file__), "users.json")
 
+STOCK_FILE = os.path.join(os.path.dirname(__file__), "stock.json")
+
+# Percentile tables written by the diagnostics view / F12 hotkey
+TIMINGS_FILE = os.path.join(os.path.dirname(__file__), "timings_report.txt")
+
+# Length of a sampling profile started from the diagnostics view / F11
+PROFILE_SECONDS = 10
+
+# How often (ms) the till checks that the standby order copy is keeping up
+REPLICATION_CHECK_MS = 5000
+
+# How often (ms) the till picks up stock changes made at other tills
+STOCK_CHECK_MS = 5000
+
+# How often (ms) the prep queue screen re-reads the order store
+PREP_REFRESH_MS = 5000
+
 # Files used by the application:
-# - `users.json` stores user account dictionaries: username, password, permission.
-# - `orders.json` stores order history records (order_number, items, total, staff, paid, date).
-# Helper functions below load/save these files in a tolerant way so the app
-# starts even if the files are missing or empty.
-
-def load_users():
-    if os.path.exists(USERS_FILE):
-        try:
-            with open(USERS_FILE, "r", encoding="utf-8") as f:
-                # Read file and handle empty-file edge case (tolerant read)
-                content = f.read().strip()
-                if not content:
-                    return []
-                # Parse JSON; may raise JSONDecodeError which we catch above
-                return json.loads(content)
-        except (json.JSONDecodeError, IOError):
-            return []
-    return []
-
-def save_users(users):
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, indent=4)
-
-#The UI builds buttons and labels from this list
+# - `users.json` stores user account dictionaries: username, salted password
+#   hash, permission and an optional quick-switch PIN hash. It is read and
+#   written through user_store.UserStore, shared with the iteration entry points.
+# - `orders.json` stores order history records (order_number, items, total, staff, paid, date)
+#   as of the last checkpoint; later changes sit in journal segments beside it
+#   and both are read and written through order_store.OrderStore.
+# Both stores load in a tolerant way so the app starts even if the files are
+# missing or empty.
+
+#The UI builds buttons and labels from this list.
+# `plu` is the short code baristas key into the quick-entry field; grab-and-go
+# items also carry the in-store EAN-13 `barcode` printed on their packaging.
 
 
 MENU_ITEMS = [
-    {"name": "Cappuccino", "price": 5},
-    {"name": "Latte", "price": 5},
-    {"name": "Espresso", "price": 4},
-    {"name": "Hot Chocolate", "price": 4},
-    {"name": "Muffin", "price": 6},
-    {"name": "Flat White", "price": 4},
-    {"name": "Mocha", "price": 5},
-    {"name": "Long Black", "price": 4},
-    {"name": "Tea", "price": 3},
-    {"name": "Iced Coffee", "price": 6},
-    {"name": "Bagel", "price": 5},
-    {"name": "Brownie", "price": 4},
-    {"name": "Scone", "price": 3},
-    {"name": "Sandwich", "price": 7},
-    {"name": "Juice", "price": 4},
+    {"name": "Cappuccino", "price": 5, "plu": "101"},
+    {"name": "Latte", "price": 5, "plu": "102"},
+    {"name": "Espresso", "price": 4, "plu": "103"},
+    {"name": "Hot Chocolate", "price": 4, "plu": "104"},
+    {"name": "Muffin", "price": 6, "plu": "105", "barcode": "2000000001050"},
+    {"name": "Flat White", "price": 4, "plu": "106"},
+    {"name": "Mocha", "price": 5, "plu": "107"},
+    {"name": "Long Black", "price": 4, "plu": "108"},
+    {"name": "Tea", "price": 3, "plu": "109"},
+    {"name": "Iced Coffee", "price": 6, "plu": "110"},
+    {"name": "Bagel", "price": 5, "plu": "111", "barcode": "2000000001111"},
+    {"name": "Brownie", "price": 4, "plu": "112", "barcode": "2000000001128"},
+    {"name": "Scone", "price": 3, "plu": "113", "barcode": "2000000001135"},
+    {"name": "Sandwich", "price": 7, "plu": "114", "barcode": "2000000001142"},
+    {"name": "Juice", "price": 4, "plu": "115", "barcode": "2000000001159"},
 ]
 
 
-def load_orders():
-    if os.path.exists(ORDERS_FILE):
-        try:
-            with open(ORDERS_FILE, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-                if not content:
-                    return []
-                return json.loads(content)
-        except (json.JSONDecodeError, IOError):
-            return []
-    return []
+def build_code_index(items):
+    # Map every PLU and barcode to its menu item once, so the quick-entry
+    # field resolves a code with a single dict lookup instead of a scan.
+    index = {}
+    for item in items:
+        for key in ("plu", "barcode"):
+            code = item.get(key)
+            if not code:
+                continue
+            if code in index:
+                raise ValueError(f"Duplicate menu code {code!r} ({index[code]['name']} and {item['name']})")
+            index[code] = item
+    return index
+
+
+CODE_INDEX = build_code_index(MENU_ITEMS)
+
+# Cart promotions; pricing.py describes the rule types. They are compiled
+# into per-item lookups once, here, and applied by Cart as lines change.
+COFFEES = ["Cappuccino", "Latte", "Espresso", "Flat White", "Mocha", "Long Black", "Iced Coffee"]
+PROMOTIONS = [
+    {"type": "bundle", "name": "Coffee + Muffin", "components": [COFFEES, ["Muffin"]], "discount": 2},
+    {"type": "happy_hour", "name": "Afternoon iced coffee", "items": ["Iced Coffee"],
+     "start": "15:00", "end": "17:00", "off": 1},
+    {"type": "quantity", "item": "Scone", "min_qty": 3, "price": 2},
+]
+PRICING = pricing.PricingRules(MENU_ITEMS, PROMOTIONS)
+
+# What one unit of each item uses. Only ingredients given a level in
+# stock.json (see inventory.py) are counted down; the rest never run out.
+RECIPES = {
+    "Cappuccino": {"coffee_shot": 1, "milk_ml": 150},
+    "Latte": {"coffee_shot": 1, "milk_ml": 220},
+    "Espresso": {"coffee_shot": 1},
+    "Hot Chocolate": {"chocolate_g": 30, "milk_ml": 220},
+    "Muffin": {"muffin": 1},
+    "Flat White": {"coffee_shot": 2, "milk_ml": 120},
+    "Mocha": {"coffee_shot": 1, "chocolate_g": 20, "milk_ml": 180},
+    "Long Black": {"coffee_shot": 2},
+    "Tea": {"tea_bag": 1},
+    "Iced Coffee": {"coffee_shot": 2, "milk_ml": 100, "ice_g": 150},
+    "Bagel": {"bagel": 1},
+    "Brownie": {"brownie": 1},
+    "Scone": {"scone": 1},
+    "Sandwich": {"sandwich": 1},
+    "Juice": {"juice_bottle": 1},
+}
+
+# Seconds to make one unit, for the prep queue's wait estimates (items not
+# listed take prep_queue.DEFAULT_ITEM_SECONDS), and how many are made at once
+PREP_SECONDS = {
+    "Cappuccino": 90, "Latte": 90, "Espresso": 45, "Hot Chocolate": 75, "Muffin": 15, "Flat White": 90,
+    "Mocha": 100, "Long Black": 60, "Tea": 30, "Iced Coffee": 80, "Bagel": 120, "Brownie": 15,
+    "Scone": 15, "Sandwich": 150, "Juice": 10,
+}
+PREP_STATIONS = 2
+
+# Largest quantity accepted from a `qty*code` prefix; guards against a
+# mistyped `30*` turning into a 30 line order.
+MAX_QUICK_QTY = 99
+
+
+def parse_quick_entry(text):
+    """Parse quick-entry text into a list of (quantity, item) pairs.
+
+    The text holds one or more whitespace separated tokens, each a PLU or
+    barcode optionally prefixed by a quantity, e.g. ``"3*101 115"``.
+    Raises ValueError naming the first token that can't be resolved.
+    """
+    entries = []
+    for token in text.split():
+        qty_str, sep, code = token.rpartition("*")
+        if sep:
+            if not qty_str.isdigit() or not 1 <= int(qty_str) <= MAX_QUICK_QTY:
+                raise ValueError(f"Bad quantity in {token!r}")
+            qty = int(qty_str)
+        else:
+            qty = 1
+        item = CODE_INDEX.get(code)
+        if item is None:
+            raise ValueError(f"Unknown code {code!r}")
+        entries.append((qty, item))
+    return entries
+
+
+class Cart:
+    """Lines of the order being built, plus its running total.
+
+    `lines` maps item name to {"item": item, "count": n, "price": unit
+    price charged, "line_total": n * price} in the order items were first
+    added. Every mutation goes through `apply`, which takes a batch of
+    ("add", item, qty), ("set", name, qty) or ("remove", name) tuples; a
+    negative add takes units off and a line at zero is dropped. Only the
+    lines a batch touched, and the bundles they belong to, are then
+    re-priced (see pricing.PricingRules); `discounts` holds each bundle's
+    current discount by bundle index. The `on_change` view callback is
+    scheduled at most once per Tk idle cycle, however many mutations
+    arrived in between.
+    """
+    def __init__(self, widget=None, on_change=None, rules=None):
+        self.lines = {}
+        self.total = 0
+        self.discounts = {}
+        self.rules = rules or PRICING
+        self._windows = frozenset()
+        self._widget = widget
+        self._on_change = on_change
+        self._after_id = None
+
+    def __len__(self):
+        return len(self.lines)
+
+    def add(self, item, qty=1):
+        self.apply([("add", item, qty)])
+
+    def set_quantity(self, name, qty):
+        self.apply([("set", name, qty)])
+
+    def remove(self, name):
+        self.apply([("remove", name)])
+
+    def apply(self, mutations):
+        touched = set()
+        for op, *args in mutations:
+            if op == "add":
+                item, qty = args
+                line = self.lines.setdefault(item["name"], {"item": item, "count": 0, "price": item["price"], "line_total": 0})
+                line["count"] = max(line["count"] + qty, 0)
+                touched.add(item["name"])
+            elif op == "set":
+                name, qty = args
+                line = self.lines.get(name)
+                if line is None:
+                    continue
+                line["count"] = max(qty, 0)
+                touched.add(name)
+            elif op == "remove":
+                line = self.lines.get(args[0])
+                if line is not None:
+                    line["count"] = 0
+                    touched.add(args[0])
+            else:
+                raise ValueError(f"Unknown cart mutation {op!r}")
+        self._reprice(touched)
+        self._schedule_refresh()
+
+    def reprice(self):
+        """Bring prices up to the clock (a happy hour may have started or
+        ended since the last change); returns True if the total moved."""
+        before = self.total
+        self._reprice(set())
+        if self.total != before:
+            self._schedule_refresh()
+        return self.total != before
+
+    def _reprice(self, touched):
+        rules = self.rules
+        windows = rules.active_windows()
+        if windows != self._windows:
+            # A happy hour started or ended since the last change
+            touched.update(name for name in rules.window_items(windows ^ self._windows) if name in self.lines)
+            self._windows = windows
+        bundles = set()
+        for name in touched:
+            line = self.lines[name]
+            bundles.update(rules.bundles_for(name))
+            if line["count"] == 0:
+                self.total -= line["line_total"]
+                del self.lines[name]
+                continue
+            line["price"] = rules.unit_price(name, line["count"], windows)
+            line_total = line["price"] * line["count"]
+            self.total += line_total - line["line_total"]
+            line["line_total"] = line_total
+        for bundle in bundles:
+            discount = rules.bundle_discount(bundle, self.lines)
+            self.total -= discount - self.discounts.get(bundle, 0)
+            if discount:
+                self.discounts[bundle] = discount
+            else:
+                self.discounts.pop(bundle, None)
+
+    def discount_lines(self):
+        """[(promotion name, amount)] for the bundles the cart qualifies for."""
+        return [(self.rules.bundles[bundle]["name"], amount) for bundle, amount in self.discounts.items()]
+
+    def _schedule_refresh(self):
+        if self._on_change is None or self._after_id is not None:
+            return
+        self._after_id = self._widget.after_idle(self._refresh)
+
+    def _refresh(self):
+        self._after_id = None
+        self._on_change(self)
+
+    def attach(self, widget, on_change):
+        # Show the cart in a new view (an order screen rebuilt on a staff switch)
+        self._widget = widget
+        self._on_change = on_change
 
-def save_orders(orders):
-    with open(ORDERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(orders, f, indent=4)
+    def detach(self):
+        # Drop the view so a pending refresh can't touch destroyed widgets
+        if self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._on_change = None
 
 
 class BaseScreen(tk.Frame):
@@ -85,9 +299,17 @@ class BaseScreen(tk.Frame):
     App instance as their master (App is a tk.Tk subclass), then they can
     call app methods (for navigation, data, and persistence).
     """
+    # Screens only an Admin may keep open (checked again on staff switch)
+    admin_only = False
+
     def __init__(self, app):
         super().__init__(app, bg="white")
         self.app = app
+        self.app.current_screen = self
+
+    def rebuild(self):
+        """Build this screen afresh, e.g. for a different user's permission."""
+        return type(self)(self.app)
 
 
 class LoginScreen(BaseScreen):
@@ -99,37 +321,36 @@ class LoginScreen(BaseScreen):
         # and the entries have consistent widths independent of the window.
         frame = tk.Frame(self.app, bg="white")
         frame.pack(expand=True)
-        tk.Label(frame, text="Login", font=("Arial", 64, "bold"), bg="white").pack(pady=40)
+        tk.Label(frame, text="Login", font=ui_style.font(64, "bold"), bg="white").pack(pady=40)
 
         # Username row: label, entry and icon. Grid keeps entry expanding.
         user_frame = tk.Frame(frame, bg="white", highlightbackground="black", highlightthickness=1)
         user_frame.pack(pady=10, padx=200, fill=tk.X)
         user_frame.grid_columnconfigure(1, weight=1)
-        tk.Label(user_frame, text="Username:", font=("Arial", 24), bg="white").grid(row=0, column=0, padx=10, pady=6)
-        user_entry = tk.Entry(user_frame, font=("Arial", 24), bd=0)
+        tk.Label(user_frame, text="Username:", font=ui_style.font(24), bg="white").grid(row=0, column=0, padx=10, pady=6)
+        user_entry = tk.Entry(user_frame, font=ui_style.font(24), bd=0)
         user_entry.grid(row=0, column=1, padx=10, sticky="ew")
-        tk.Label(user_frame, text=ICON_USER, font=("Arial", 24), bg="white", width=3, anchor="center").grid(row=0, column=2, padx=10)
+        tk.Label(user_frame, text=ICON_USER, font=ui_style.font(24), bg="white", width=3, anchor="center").grid(row=0, column=2, padx=10)
 
         # Password row: similar structure with masked entry
         pass_frame = tk.Frame(frame, bg="white", highlightbackground="black", highlightthickness=1)
         pass_frame.pack(pady=10, padx=200, fill=tk.X)
         pass_frame.grid_columnconfigure(1, weight=1)
-        tk.Label(pass_frame, text="Password: ", font=("Arial", 24), bg="white").grid(row=0, column=0, padx=10, pady=6)
-        pass_entry = tk.Entry(pass_frame, font=("Arial", 24), bd=0, show="*")
+        tk.Label(pass_frame, text="Password: ", font=ui_style.font(24), bg="white").grid(row=0, column=0, padx=10, pady=6)
+        pass_entry = tk.Entry(pass_frame, font=ui_style.font(24), bd=0, show="*")
         pass_entry.grid(row=0, column=1, padx=10, sticky="ew")
-        tk.Label(pass_frame, text=ICON_LOCK, font=("Arial", 24), bg="white", width=3, anchor="center").grid(row=0, column=2, padx=10)
+        tk.Label(pass_frame, text=ICON_LOCK, font=ui_style.font(24), bg="white", width=3, anchor="center").grid(row=0, column=2, padx=10)
 
         # Login logic: check credentials from loaded users and navigate on success
         def do_login():
             username = user_entry.get()
             password = pass_entry.get()
-            for user in self.app.users:
-                if user["username"] == username and user["password"] == password:
-                    self.app.username = username
-                    self.app.permission = user["permission"]
-                    self.app.show_main()
-                    return
-            messagebox.showerror("Login Failed", "Invalid username or password.")
+            with instrumentation.timed("login_check"):
+                match = self.app.users.authenticate(username, password)
+            if match is None:
+                messagebox.showerror("Login Failed", "Invalid username or password.")
+                return
+            self.app.login(match)
 
         # Bind Enter to submit so keyboard users can log in quickly
         user_entry.bind("<Return>", lambda event: do_login())
@@ -138,12 +359,21 @@ class LoginScreen(BaseScreen):
         frame.focus_set()
 
         # Action button for mouse users
-        tk.Button(frame, text="Login", font=("Arial", 28), bg="white", bd=1, relief="solid",
+        tk.Button(frame, text="Login", font=ui_style.font(28), bg="white", bd=1, relief="solid",
                   highlightbackground="black", highlightthickness=1, width=16, command=do_login).pack(pady=30)
 
 
 class AccountsScreen(BaseScreen):
-    """Accounts management screen: list, delete, add users. """
+    """Accounts management screen: list, delete, add users.
+
+    The list is a ttk.Treeview, which only draws the rows in view, so it
+    copes with hundreds of accounts. Adding, deleting or changing a PIN
+    updates just that row (and journals just that record) instead of
+    rebuilding the screen, so the scroll position and filter are kept.
+    """
+    admin_only = True
+
+    @instrumentation.timed_function("AccountsScreen")
     def __init__(self, app):
         super().__init__(app)
         self.app.clear_content()
@@ -153,72 +383,120 @@ class AccountsScreen(BaseScreen):
             self.app.show_welcome()
             return
 
-    # Decide whether to use a scrollable canvas for long lists. If the
-    # number of users exceeds `max_visible` we create a canvas + inner
-    # frame and place the controls inside it so the list can scroll.
-        max_visible = 4
-        use_scroll = len(self.app.users) > max_visible
-
-        if use_scroll:
-            container = tk.Frame(self.app.content_frame, bg="white")
-            container.pack(fill=tk.BOTH, expand=True)
-            canvas = tk.Canvas(container, bg="white", highlightthickness=0)
-            scrollbar = tk.Scrollbar(container, orient="vertical", command=canvas.yview)
-            canvas.configure(yscrollcommand=scrollbar.set)
-            canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-            inner_frame = tk.Frame(canvas, bg="white")
-            window_id = canvas.create_window((0, 0), window=inner_frame, anchor="nw")
-
-            def on_frame_configure(event):
-                canvas.configure(scrollregion=canvas.bbox("all"))
-                canvas.itemconfig(window_id, width=canvas.winfo_width())
-            inner_frame.bind("<Configure>", on_frame_configure)
-
-            def _on_mousewheel(event):
-                canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-            inner_frame.bind("<Enter>", lambda e: canvas.bind_all("<MouseWheel>", _on_mousewheel))
-            inner_frame.bind("<Leave>", lambda e: canvas.unbind_all("<MouseWheel>"))
-
-            grid_parent = inner_frame
-        else:
-            grid_parent = self.app.content_frame
-
-        # Table headers
-        tk.Label(grid_parent, text="Username", font=("Arial", 32), bg="white").grid(row=0, column=0, padx=60, pady=20)
-        tk.Label(grid_parent, text="Password", font=("Arial", 32), bg="white").grid(row=0, column=1, padx=60, pady=20)
-        tk.Label(grid_parent, text="Permissions", font=("Arial", 32), bg="white").grid(row=0, column=2, padx=60, pady=20)
-        tk.Label(grid_parent, text="Delete", font=("Arial", 32), bg="white").grid(row=0, column=3, padx=60, pady=20)
-
-        def delete_user(idx):
-            user = self.app.users[idx]
-            if user["username"] == self.app.username:
+        ui_style.ttk_style(self.app)
+
+        # Filter box: narrows the list to usernames containing the text
+        filter_frame = tk.Frame(self.app.content_frame, bg="white")
+        filter_frame.pack(fill=tk.X, padx=60, pady=(20, 10))
+        tk.Label(filter_frame, text="Filter:", font=ui_style.font(20), bg="white").pack(side=tk.LEFT)
+        filter_var = tk.StringVar()
+        tk.Entry(filter_frame, textvariable=filter_var, font=ui_style.font(20), width=20).pack(side=tk.LEFT, padx=10)
+        count_label = tk.Label(filter_frame, text="", font=ui_style.font(16), bg="white")
+        count_label.pack(side=tk.LEFT, padx=20)
+
+        list_frame = tk.Frame(self.app.content_frame, bg="white")
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=60)
+        tree = ttk.Treeview(list_frame, columns=("permission", "pin"), style="Accounts.Treeview", selectmode="browse")
+        tree.heading("#0", text="Username")
+        tree.heading("permission", text="Permissions")
+        tree.heading("pin", text="Quick PIN")
+        tree.column("#0", width=400)
+        tree.column("permission", width=250, anchor="center")
+        tree.column("pin", width=200, anchor="center")
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Usernames are unique, so they double as the Treeview item ids.
+        # `order` keeps file order so a cleared filter restores it.
+        order = []
+
+        def row_values(user):
+            return (user["permission"], "Set" if "pin_hash" in user else "-")
+
+        def matches(username):
+            return filter_var.get().strip().lower() in username.lower()
+
+        def update_count():
+            count_label.config(text=f"{len(tree.get_children())} of {len(order)} users")
+
+        def insert_row(user):
+            order.append(user["username"])
+            if matches(user["username"]):
+                tree.insert("", tk.END, iid=user["username"], text=user["username"], values=row_values(user))
+
+        def apply_filter(*args):
+            # Detach/reattach existing rows rather than recreating them
+            position = 0
+            for username in order:
+                if matches(username):
+                    if not tree.exists(username):
+                        user = self.app.users.get(username)
+                        tree.insert("", position, iid=username, text=username, values=row_values(user))
+                    else:
+                        tree.move(username, "", position)
+                    position += 1
+                elif tree.exists(username):
+                    tree.detach(username)
+            update_count()
+
+        for user in self.app.users:
+            insert_row(user)
+        update_count()
+        filter_var.trace_add("write", apply_filter)
+
+        def selected_username():
+            selection = tree.selection()
+            if not selection:
+                messagebox.showwarning("No Selection", "Select a user in the list first.")
+                return None
+            return selection[0]
+
+        def delete_user():
+            username = selected_username()
+            if username is None:
+                return
+            if username == self.app.username:
                 messagebox.showwarning("Delete User", "You cannot delete the currently logged-in user.")
                 return
-            if messagebox.askyesno("Delete User", f"Are you sure you want to delete user '{user['username']}'?"):
-                del self.app.users[idx]
-                save_users(self.app.users)
-                messagebox.showinfo("Deleted", f"User '{user['username']}' deleted.")
-                self.app.show_accounts()
-
-        for i, user in enumerate(self.app.users, 1):
-            tk.Label(grid_parent, text=user["username"], font=("Arial", 28), bg="white").grid(row=i, column=0, padx=60, pady=10)
-            tk.Label(grid_parent, text="*" * len(user["password"]), font=("Arial", 28), bg="white").grid(row=i, column=1, padx=60, pady=10)
-            tk.Label(grid_parent, text=user["permission"], font=("Arial", 28), bg="white").grid(row=i, column=2, padx=60, pady=10)
-            del_btn = tk.Button(grid_parent, text="Delete", font=("Arial", 18), bg="#F44336", fg="white",
-                                command=lambda idx=i-1: delete_user(idx))
-            del_btn.grid(row=i, column=3, padx=20, pady=10)
+            if messagebox.askyesno("Delete User", f"Are you sure you want to delete user '{username}'?"):
+                self.app.users.delete(username)
+                tree.delete(username)
+                order.remove(username)
+                update_count()
+
+        def set_pin():
+            username = selected_username()
+            if username is None:
+                return
+            pin = simpledialog.askstring("Quick PIN", f"New 4-6 digit PIN for '{username}' (leave blank to remove):",
+                                         show="*", parent=self.app)
+            if pin is None:
+                return
+            pin = pin.strip()
+            if pin and (not pin.isdigit() or not 4 <= len(pin) <= 6):
+                messagebox.showwarning("Input Error", "PIN must be 4 to 6 digits.")
+                return
+            user = self.app.users.set_pin(username, pin or None)
+            tree.item(username, values=row_values(user))
+
+        actions = tk.Frame(self.app.content_frame, bg="white")
+        actions.pack(pady=10)
+        tk.Button(actions, text="Set PIN", font=ui_style.font(18), bg="white", command=set_pin).pack(side=tk.LEFT, padx=20)
+        tk.Button(actions, text="Delete", font=ui_style.font(18), bg="#F44336", fg="white", command=delete_user).pack(side=tk.LEFT, padx=20)
 
         # Section to add new users
-        row = len(self.app.users) + 2
-        tk.Label(grid_parent, text="Add New User", font=("Arial", 28, "bold"), bg="white").grid(row=row, column=0, columnspan=4, pady=(30, 10))
+        add_frame = tk.Frame(self.app.content_frame, bg="white")
+        add_frame.pack(pady=(10, 20))
+        tk.Label(add_frame, text="Add New User", font=ui_style.font(28, "bold"), bg="white").grid(row=0, column=0, columnspan=4, pady=(10, 10))
         new_user_var = tk.StringVar()
         new_pass_var = tk.StringVar()
         new_perm_var = tk.StringVar(value="Waiter")
-        tk.Entry(grid_parent, textvariable=new_user_var, font=("Arial", 24), width=12).grid(row=row+1, column=0, padx=10, pady=10)
-        tk.Entry(grid_parent, textvariable=new_pass_var, font=("Arial", 24), width=12, show="*").grid(row=row+1, column=1, padx=10, pady=10)
-        perm_menu = ttk.Combobox(grid_parent, textvariable=new_perm_var, font=("Arial", 20), width=10, values=["Admin", "Waiter"])
-        perm_menu.grid(row=row+1, column=2, padx=10, pady=10)
+        tk.Entry(add_frame, textvariable=new_user_var, font=ui_style.font(24), width=12).grid(row=1, column=0, padx=10, pady=10)
+        tk.Entry(add_frame, textvariable=new_pass_var, font=ui_style.font(24), width=12, show="*").grid(row=1, column=1, padx=10, pady=10)
+        perm_menu = ttk.Combobox(add_frame, textvariable=new_perm_var, font=ui_style.font(20), width=10, values=["Admin", "Waiter"])
+        perm_menu.grid(row=1, column=2, padx=10, pady=10)
 
         def add_user():
             username = new_user_var.get().strip()
@@ -230,27 +508,33 @@ class AccountsScreen(BaseScreen):
             if len(password) < 4 or len(password) > 14:
                 messagebox.showwarning("Input Error", "Password must be between 4 and 14 characters.")
                 return
-            for user in self.app.users:
-                if user["username"] == username:
-                    messagebox.showwarning("Input Error", "Username already exists.")
-                    return
-            self.app.users.append({"username": username, "password": password, "permission": permission})
-            save_users(self.app.users)
-            messagebox.showinfo("Success", f"User '{username}' added.")
-            self.app.show_accounts()
+            try:
+                user = self.app.users.add(username, password, permission)
+            except ValueError:
+                messagebox.showwarning("Input Error", "Username already exists.")
+                return
+            insert_row(user)
+            update_count()
+            new_user_var.set("")
+            new_pass_var.set("")
+            if tree.exists(username):
+                tree.see(username)
+                tree.selection_set(username)
 
-        tk.Button(grid_parent, text="Add User", font=("Arial", 20), command=add_user, bg="white", bd=1, relief="solid",
-                  highlightbackground="black", highlightthickness=1).grid(row=row+2, column=0, columnspan=4, pady=10)
+        tk.Button(add_frame, text="Add User", font=ui_style.font(20), command=add_user, bg="white", bd=1, relief="solid",
+                  highlightbackground="black", highlightthickness=1).grid(row=1, column=3, padx=10, pady=10)
 
 
 class OrderScreen(BaseScreen):
-    """Order screen encapsulated as a class."""
-    def __init__(self, app):
+    """Order screen encapsulated as a class.
+
+    Opening it starts a new order, unless `keep_cart` is set (as when it is
+    rebuilt after a staff switch).
+    """
+    @instrumentation.timed_function("OrderScreen")
+    def __init__(self, app, keep_cart=False):
         super().__init__(app)
         self.app.clear_content()
-        self.app.current_order = []
-        self.app.total_cost = 0
-        self.app.current_order_counts = {}
 
         self.app.content_frame.grid_rowconfigure(0, weight=1)
         self.app.content_frame.grid_rowconfigure(1, weight=0)
@@ -268,7 +552,17 @@ class OrderScreen(BaseScreen):
         top_frame.grid_columnconfigure(1, weight=0)
         top_frame.grid_columnconfigure(2, weight=1)
 
-        tk.Label(top_frame, text="Menu", font=("Arial", 32, "bold"), bg="white").grid(row=0, column=0, padx=20, pady=20, sticky="w")
+        tk.Label(top_frame, text="Menu", **ui_style.preset("title")).grid(row=0, column=0, padx=20, pady=20, sticky="w")
+
+        # Quick-entry field for PLU codes, `qty*code` prefixes and barcode
+        # scanners (which type the code and press Enter like a keyboard).
+        quick_frame = tk.Frame(top_frame, bg="white")
+        quick_frame.grid(row=0, column=2, padx=40, sticky="ew")
+        tk.Label(quick_frame, text="Code:", font=ui_style.font(18), bg="white").pack(side=tk.LEFT)
+        self.quick_entry = tk.Entry(quick_frame, font=ui_style.font(18), width=16)
+        self.quick_entry.pack(side=tk.LEFT, padx=10)
+        self.quick_status = tk.Label(quick_frame, text="", font=ui_style.font(14), bg="white", fg="#E53935")
+        self.quick_status.pack(side=tk.LEFT)
 
         max_visible = 10
         use_scroll = len(MENU_ITEMS) > max_visible
@@ -301,7 +595,7 @@ class OrderScreen(BaseScreen):
         order_frame.grid_rowconfigure(1, weight=1)
         order_frame.grid_columnconfigure(0, weight=1)
 
-        tk.Label(order_frame, text="Current Order", font=("Arial", 28, "bold"), bg="white").grid(row=0, column=0, columnspan=2, pady=10)
+        tk.Label(order_frame, text="Current Order", font=ui_style.font(28, "bold"), bg="white").grid(row=0, column=0, columnspan=2, pady=10)
         # Keep the cart column compact by fixing its width and preventing
         # the frame from changing sizes when text changes.
         self.cart_items_frame = tk.Frame(order_frame, bg="white")
@@ -343,10 +637,10 @@ class OrderScreen(BaseScreen):
 
         self.cart_inner.bind("<Enter>", lambda e: cart_canvas.bind_all("<MouseWheel>", _on_mousewheel_cart))
         self.cart_inner.bind("<Leave>", lambda e: cart_canvas.unbind_all("<MouseWheel>"))
-        self.app.total_label = tk.Label(order_frame, text="Total: $0", font=("Arial", 24, "bold"), bg="white")
+        self.app.total_label = tk.Label(order_frame, text="Total: $0", font=ui_style.font(24, "bold"), bg="white")
         self.app.total_label.grid(row=2, column=0, columnspan=2, pady=20)
 
-        def update_cart_items():
+        def update_cart_items(cart):
             # Clear inner cart contents
             for widget in self.cart_inner.winfo_children():
                 widget.destroy()
@@ -357,74 +651,122 @@ class OrderScreen(BaseScreen):
             self.cart_inner.grid_columnconfigure(3, minsize=30)
             self.cart_inner.grid_columnconfigure(4, minsize=30)
             self.cart_inner.grid_columnconfigure(5, minsize=60)
-            for r, (name, entry) in enumerate(self.app.current_order_counts.items()):
+            for r, (name, entry) in enumerate(cart.lines.items()):
                 item = entry['item']
                 count = entry['count']
                 max_name_len = 18
                 display_name = (name[:max_name_len-3] + '...') if len(name) > max_name_len else name
                 # Set wraplength relative to the canvas width so names wrap inside the cart box
                 wrap_len = max(80, cart_canvas.winfo_width() - 160)
-                tk.Label(self.cart_inner, text=f'{display_name}', font=("Arial", 12), bg="white", fg="black",
+                tk.Label(self.cart_inner, text=f'{display_name}', font=ui_style.font(12), bg="white", fg="black",
                          anchor="w", wraplength=wrap_len, justify="left").grid(row=r, column=0, padx=5, pady=4, sticky="ew")
-                tk.Label(self.cart_inner, text=f'x{count}', font=("Arial", 12), bg="white", anchor="center").grid(row=r, column=1, padx=5)
-                tk.Label(self.cart_inner, text=f'${item["price"] * count}', font=("Arial", 12), bg="white", anchor="e").grid(row=r, column=2, padx=5, sticky="e")
-
-                def make_incr(n=name):
-                    def incr():
-                        self.app.current_order_counts[n]['count'] += 1
-                        self.app.total_cost += self.app.current_order_counts[n]['item']['price']
-                        update_cart_items()
-                        self.app.total_label.config(text=f"Total: ${self.app.total_cost}")
-                    return incr
-
-                def make_decr(n=name):
-                    def decr():
-                        if self.app.current_order_counts[n]['count'] > 1:
-                            self.app.current_order_counts[n]['count'] -= 1
-                            self.app.total_cost -= self.app.current_order_counts[n]['item']['price']
-                        else:
-                            self.app.total_cost -= self.app.current_order_counts[n]['item']['price']
-                            del self.app.current_order_counts[n]
-                        update_cart_items()
-                        self.app.total_label.config(text=f"Total: ${self.app.total_cost}")
-                    return decr
+                tk.Label(self.cart_inner, text=f'x{count}', font=ui_style.font(12), bg="white", anchor="center").grid(row=r, column=1, padx=5)
+                tk.Label(self.cart_inner, text=f'${entry["line_total"]}', font=ui_style.font(12), bg="white", anchor="e").grid(row=r, column=2, padx=5, sticky="e")
+
+                # Relative adds so several taps before the next redraw all count
+                def make_incr(it=item):
+                    return lambda: self.app.apply_to_cart([("add", it, 1)])
+
+                def make_decr(it=item):
+                    return lambda: self.app.apply_to_cart([("add", it, -1)])
 
                 def make_remove(n=name):
-                    def remove():
-                        cnt = self.app.current_order_counts[n]['count']
-                        price = self.app.current_order_counts[n]['item']['price']
-                        self.app.total_cost -= cnt * price
-                        del self.app.current_order_counts[n]
-                        update_cart_items()
-                        self.app.total_label.config(text=f"Total: ${self.app.total_cost}")
-                    return remove
+                    return lambda: self.app.apply_to_cart([("remove", n)])
 
                 tk.Button(self.cart_inner, text="+", width=3, command=make_incr()).grid(row=r, column=3, padx=2)
                 tk.Button(self.cart_inner, text="-", width=3, command=make_decr()).grid(row=r, column=4, padx=2)
                 tk.Button(self.cart_inner, text="Remove", width=8, command=make_remove()).grid(row=r, column=5, padx=6)
-            self.app.total_label.config(text=f"Total: ${self.app.total_cost}")
-
-        update_cart_items()
+            for r, (promo, amount) in enumerate(cart.discount_lines(), start=len(cart.lines)):
+                tk.Label(self.cart_inner, text=promo, font=ui_style.font(12, "italic"), bg="white", fg="#2E7D32",
+                         anchor="w").grid(row=r, column=0, padx=5, pady=4, sticky="ew")
+                tk.Label(self.cart_inner, text=f'-${amount}', font=ui_style.font(12), bg="white", fg="#2E7D32",
+                         anchor="e").grid(row=r, column=2, padx=5, sticky="e")
+            self.app.total_label.config(text=f"Total: ${cart.total}")
+            show_wait()
+
+        def show_wait():
+            items = [{"name": name, "count": entry["count"]} for name, entry in self.app.cart.lines.items()]
+            minutes = -(-self.app.prep_queue.quote(self.app.order_type, items) // 60)
+            wait_label.config(text=f"Ready in ~{minutes:.0f} min")
+
+        # The cart redraws itself once per idle cycle after any batch of changes
+        if keep_cart:
+            self.app.cart.attach(self.app, update_cart_items)
+        else:
+            self.app.cart = Cart(self.app, on_change=update_cart_items)
 
-        def add_to_order(item):
-            self.app.current_order.append(item)
-            self.app.total_cost += item["price"]
-            name = item["name"]
-            if name in self.app.current_order_counts:
-                self.app.current_order_counts[name]["count"] += 1
-            else:
-                # Store the item dict and the running count
-                self.app.current_order_counts[name] = {"item": item, "count": 1}
-            # Rebuild the cart UI to reflect the change
-            update_cart_items()
+        def add_to_order(item, qty=1):
+            self.app.apply_to_cart([("add", item, qty)])
 
+        def submit_quick_entry(event=None):
+            # Resolve every token before touching the cart so a typo in the
+            # middle of a line doesn't leave half an order behind.
+            try:
+                entries = parse_quick_entry(self.quick_entry.get())
+            except ValueError as e:
+                self.quick_status.config(text=str(e))
+                self.quick_entry.select_range(0, tk.END)
+                self.bell()
+                return "break"
+            out = [item["name"] for _, item in entries if not self.app.inventory.available(MENU_ITEMS.index(item))]
+            if out:
+                self.quick_status.config(text="Out of stock: " + ", ".join(out))
+                self.quick_entry.select_range(0, tk.END)
+                self.bell()
+                return "break"
+            self.app.apply_to_cart([("add", item, qty) for qty, item in entries])
+            self.quick_entry.delete(0, tk.END)
+            self.quick_status.config(text="")
+            return "break"
+
+        def on_app_key(event):
+            # Keys typed while another widget has focus (e.g. after tapping a
+            # menu button) are routed into the quick-entry field so scanner
+            # input is never lost. Not while the staff switch pad is up,
+            # whose keys are a PIN.
+            if isinstance(event.widget, (tk.Entry, ttk.Entry)):
+                return None
+            overlay = getattr(self.app, "quick_switch", None)
+            if overlay is not None and overlay.winfo_exists():
+                return None
+            if event.keysym in ("Return", "KP_Enter"):
+                return submit_quick_entry()
+            if event.char and event.char.isprintable():
+                self.quick_entry.insert(tk.END, event.char)
+                self.quick_entry.focus_set()
+                return "break"
+            return None
+
+        self.quick_entry.bind("<Return>", submit_quick_entry)
+        self.quick_entry.bind("<KP_Enter>", submit_quick_entry)
+        self.app.bind("<Key>", on_app_key)
+        # The app-level binding must not outlive this screen
+        main_frame.bind("<Destroy>", lambda e: self._teardown())
+        self.quick_entry.focus_set()
+
+        menu_buttons = []
         for i, item in enumerate(MENU_ITEMS):
             row = i // 2
             col = i % 2
             # Each menu item becomes a button. Use a lambda function with default
-            b = tk.Button(menu_parent, text=f'{item["name"]} - ${item["price"]}', font=("Arial", 18), width=20, height=2,
+            b = tk.Button(menu_parent, text=f'{item["plu"]}  {item["name"]} - ${item["price"]}', font=ui_style.font(18), width=20, height=2,
                           command=lambda item=item: add_to_order(item))
             b.grid(row=row, column=col, padx=10, pady=5, sticky="nsew")
+            menu_buttons.append(b)
+
+        # Grey out items short of an ingredient; only buttons whose bit
+        # flipped since the last redraw are touched
+        drawn = [0]
+
+        def show_availability():
+            unavailable = self.app.inventory.unavailable
+            changed = unavailable ^ drawn[0]
+            for i, button in enumerate(menu_buttons):
+                if changed >> i & 1:
+                    button.config(state=tk.DISABLED if unavailable >> i & 1 else tk.NORMAL)
+            drawn[0] = unavailable
+        show_availability()
+        self.app.on_stock_change = show_availability
 
         for c in range(2):
             menu_parent.grid_columnconfigure(c, weight=1)
@@ -438,24 +780,121 @@ class OrderScreen(BaseScreen):
         for i in range(4):
             bottom_btns.grid_columnconfigure(i, weight=1)
 
-        tk.Button(bottom_btns, text="Clear Order", font=("Arial", 18), width=15, command=lambda: self.app.show_order()).grid(row=0, column=0, padx=20, pady=5)
-        tk.Button(bottom_btns, text="Submit Order", font=("Arial", 20, "bold"), width=20, bg="#4CAF50", fg="white", command=self.app.submit_order).grid(row=0, column=2, padx=40, pady=5)
-        tk.Button(bottom_btns, text="Checkout", font=("Arial", 20), width=15, bg="#2196F3", fg="white", command=self.app.checkout).grid(row=0, column=3, padx=20, pady=5)
+        tk.Button(bottom_btns, text="Clear Order", font=ui_style.font(18), width=15, command=lambda: self.app.show_order()).grid(row=0, column=0, padx=20, pady=5)
+        # Order type (kept for the next order) and the wait to quote the customer
+        type_frame = tk.Frame(bottom_btns, bg="white")
+        type_frame.grid(row=0, column=1, padx=20, pady=5)
+        type_var = tk.StringVar(value=self.app.order_type)
+        type_menu = tk.OptionMenu(type_frame, type_var, *prep_queue.ORDER_TYPES,
+                                  command=lambda value: (self.app.set_order_type(value), show_wait()))
+        type_menu.config(font=ui_style.font(18), width=8)
+        type_menu.pack(side=tk.LEFT)
+        wait_label = tk.Label(type_frame, text="", font=ui_style.font(14), bg="white")
+        wait_label.pack(side=tk.LEFT, padx=10)
+        # First draw of the cart (and the wait), now that wait_label exists
+        update_cart_items(self.app.cart)
+        tk.Button(bottom_btns, text="Submit Order", font=ui_style.font(20, "bold"), width=20, bg="#4CAF50", fg="white", command=self.app.submit_order).grid(row=0, column=2, padx=40, pady=5)
+        tk.Button(bottom_btns, text="Checkout", font=ui_style.font(20), width=15, bg="#2196F3", fg="white", command=self.app.checkout).grid(row=0, column=3, padx=20, pady=5)
+
+
+    def rebuild(self):
+        return OrderScreen(self.app, keep_cart=True)
+
+    def _teardown(self):
+        self.app.unbind("<Key>")
+        self.app.cart.detach()
+        self.app.on_stock_change = None
 
 
 class OrderHistoryScreen(BaseScreen):
-    """Order history screen as a class (newest order display first)."""
+    """Order history screen as a class (newest order display first).
+
+    The filter bar queries the app's OrderIndex; the filter is kept on the
+    app so it survives the redraw after marking or cancelling an order.
+    """
+    PAID_FILTERS = {"All": None, "Paid": True, "Unpaid": False}
+    ANY = "Any"
+    # Orders drawn at most; narrow the filter to reach older ones
+    MAX_SHOWN = 100
+
+    @instrumentation.timed_function("OrderHistoryScreen")
     def __init__(self, app):
         super().__init__(app)
         self.app.clear_content()
-        tk.Label(self.app.content_frame, text="Order History", font=("Arial", 32, "bold"), bg="white").pack(pady=20)
-
-        if not self.app.order_history:
-            tk.Label(self.app.content_frame, text="No past orders.", font=("Arial", 24), bg="white").pack(pady=40)
+        tk.Label(self.app.content_frame, text="Order History", **ui_style.preset("title")).pack(pady=20)
+        if self.app.permission == "Admin":
+            admin_bar = tk.Frame(self.app.content_frame, bg="white")
+            admin_bar.pack(pady=(0, 10))
+            tk.Button(admin_bar, text="Export Orders", **ui_style.preset("admin_button"),
+                      command=self.app.show_export).pack(side=tk.LEFT, padx=10)
+            tk.Button(admin_bar, text="Z-Report", **ui_style.preset("admin_button"),
+                      command=self.app.show_z_report).pack(side=tk.LEFT, padx=10)
+            tk.Button(admin_bar, text="Demand", **ui_style.preset("admin_button"),
+                      command=self.app.show_demand).pack(side=tk.LEFT, padx=10)
+            tk.Button(admin_bar, text="Sales Report", **ui_style.preset("admin_button"),
+                      command=self.app.show_sales_report).pack(side=tk.LEFT, padx=10)
+
+        # Filter bar: order number, date/time range, staff, paid state, item
+        current = self.app.history_filter
+        filter_bar = tk.Frame(self.app.content_frame, bg="white")
+        filter_bar.pack(pady=(0, 10))
+        number_var = tk.StringVar(value=str(current.get("number") or ""))
+        from_var = tk.StringVar(value=current.get("date_from") or "")
+        to_var = tk.StringVar(value=current.get("date_to") or "")
+        staff_var = tk.StringVar(value=current.get("staff") or self.ANY)
+        paid_var = tk.StringVar(value={None: "All", True: "Paid", False: "Unpaid"}[current.get("paid")])
+        item_var = tk.StringVar(value=current.get("item") or self.ANY)
+        fields = [
+            ("Order #", tk.Entry(filter_bar, textvariable=number_var, font=ui_style.font(14), width=6)),
+            ("From", tk.Entry(filter_bar, textvariable=from_var, font=ui_style.font(14), width=16)),
+            ("To", tk.Entry(filter_bar, textvariable=to_var, font=ui_style.font(14), width=16)),
+            ("Staff", ttk.Combobox(filter_bar, textvariable=staff_var, state="readonly", font=ui_style.font(14), width=10,
+                                   values=[self.ANY] + self.app.order_index.staff_names())),
+            ("Status", ttk.Combobox(filter_bar, textvariable=paid_var, state="readonly", font=ui_style.font(14), width=7,
+                                    values=list(self.PAID_FILTERS))),
+            ("Item", ttk.Combobox(filter_bar, textvariable=item_var, state="readonly", font=ui_style.font(14), width=14,
+                                  values=[self.ANY] + [item["name"] for item in MENU_ITEMS])),
+        ]
+        for text, widget in fields:
+            tk.Label(filter_bar, text=text, font=ui_style.font(14), bg="white").pack(side=tk.LEFT, padx=(8, 2))
+            widget.pack(side=tk.LEFT)
+
+        def apply_filter(event=None):
+            number = number_var.get().strip()
+            if number and not number.isdigit():
+                messagebox.showwarning("Input Error", f"'{number}' is not an order number.")
+                return
+            self.app.history_filter = {
+                "number": int(number) if number else None,
+                "date_from": from_var.get().strip() or None,
+                "date_to": to_var.get().strip() or None,
+                "staff": None if staff_var.get() == self.ANY else staff_var.get(),
+                "paid": self.PAID_FILTERS[paid_var.get()],
+                "item": None if item_var.get() == self.ANY else item_var.get(),
+            }
+            self.app.show_order_history()
+
+        def clear_filter():
+            self.app.history_filter = {}
+            self.app.show_order_history()
+        tk.Button(filter_bar, text="Filter", font=ui_style.font(14), command=apply_filter).pack(side=tk.LEFT, padx=(10, 2))
+        tk.Button(filter_bar, text="Clear", font=ui_style.font(14), command=clear_filter).pack(side=tk.LEFT, padx=2)
+        for _, entry in fields[:3]:
+            entry.bind("<Return>", apply_filter)
+
+        # One more than is shown, to tell whether any were left out
+        orders = self.app.order_index.query(**self.app.history_filter, limit=self.MAX_SHOWN + 1)
+        if not orders:
+            text = "No orders match the filter." if any(v is not None for v in current.values()) else "No past orders."
+            tk.Label(self.app.content_frame, text=text, font=ui_style.font(24), bg="white").pack(pady=40)
             return
+        if len(orders) > self.MAX_SHOWN:
+            tk.Label(self.app.content_frame, text=f"Showing the newest {self.MAX_SHOWN} orders; filter to find older ones",
+                     font=ui_style.font(14), bg="white").pack()
+            orders = orders[:self.MAX_SHOWN]
 
         max_visible = 4
-        use_scroll = len(self.app.order_history) > max_visible
+        use_scroll = len(orders) > max_visible
 
         if use_scroll:
             container = tk.Frame(self.app.content_frame, bg="white")
@@ -471,14 +910,13 @@ class OrderHistoryScreen(BaseScreen):
         else:
             parent = self.app.content_frame
 
-        total_orders = len(self.app.order_history)
-        for display_idx, order in enumerate(reversed(self.app.order_history)):
-            orig_idx = total_orders - 1 - display_idx
+        for order in orders:
             frame = tk.Frame(parent, bg="white", highlightbackground="black", highlightthickness=1)
             frame.pack(pady=10, padx=20, fill=tk.X)
             paid_str = " - Paid" if order.get("paid") else " - Unpaid"
+            type_str = f" - {order['type']}" if order.get("type") else ""
             date_str = f" | {order.get('date', '')}"
-            tk.Label(frame, text=f"Order #{order['order_number']}  -  Staff: {order['staff']}{paid_str}{date_str}", font=("Arial", 24, "bold"), bg="white").pack(anchor="w", padx=10, pady=5)
+            tk.Label(frame, text=f"Order #{order['order_number']}  -  Staff: {order['staff']}{paid_str}{type_str}{date_str}", font=ui_style.font(24, "bold"), bg="white").pack(anchor="w", padx=10, pady=5)
             items_strs = []
             for item in order["items"]:
                 count = item.get("count", 1)
@@ -487,42 +925,39 @@ class OrderHistoryScreen(BaseScreen):
                 else:
                     items_strs.append(f"{item['name']} (${item['price']})")
             items_str = ", ".join(items_strs)
-            tk.Label(frame, text=f"Items: {items_str}", font=("Arial", 20), bg="white", wraplength=1200, justify="left").pack(anchor="w", padx=20)
-            tk.Label(frame, text=f"Total: ${order['total']}", font=("Arial", 20, "bold"), bg="white").pack(anchor="w", padx=20, pady=(5, 10))
+            tk.Label(frame, text=f"Items: {items_str}", font=ui_style.font(20), bg="white", wraplength=1200, justify="left").pack(anchor="w", padx=20)
+            tk.Label(frame, text=f"Total: ${order['total']}", font=ui_style.font(20, "bold"), bg="white").pack(anchor="w", padx=20, pady=(5, 10))
 
             if not order.get("paid"):
-                def make_paid_closure(order_idx=orig_idx):
+                def make_paid_closure(number=order["order_number"]):
                     def mark_as_paid():
-                        self.app.order_history[order_idx]["paid"] = True
-                        save_orders(self.app.order_history)
-                        messagebox.showinfo("Order Paid", f"Order #{self.app.order_history[order_idx]['order_number']} marked as paid.")
+                        self.app.mark_order_paid(number)
+                        messagebox.showinfo("Order Paid", f"Order #{number} marked as paid.")
                         self.app.show_order_history()
                     return mark_as_paid
-                tk.Button(frame, text="Mark as Paid", font=("Arial", 16), bg="#4CAF50", fg="white",
+                tk.Button(frame, text="Mark as Paid", font=ui_style.font(16), bg="#4CAF50", fg="white",
                           command=make_paid_closure()).pack(anchor="e", padx=20, pady=(0, 10))
 
                 # Allow cancelling unpaid order: removes it from history
-                def make_cancel_closure(order_idx=orig_idx):
+                def make_cancel_closure(number=order["order_number"]):
                     def cancel_order():
-                        if messagebox.askyesno("Cancel Order", f"Remove Order #{self.app.order_history[order_idx]['order_number']} permanently?"):
-                            del self.app.order_history[order_idx]
-                            save_orders(self.app.order_history)
+                        if messagebox.askyesno("Cancel Order", f"Remove Order #{number} permanently?"):
+                            self.app.cancel_order(number)
                             messagebox.showinfo("Cancelled", "Order removed.")
                             self.app.show_order_history()
                     return cancel_order
-                tk.Button(frame, text="Cancel Order", font=("Arial", 14), bg="#E53935", fg="white",
+                tk.Button(frame, text="Cancel Order", font=ui_style.font(14), bg="#E53935", fg="white",
                           command=make_cancel_closure()).pack(anchor="e", padx=20, pady=(0, 10))
             else:
                 # For paid orders, provide an undo button to mark as unpaid
-                def make_undo_closure(order_idx=orig_idx):
+                def make_undo_closure(number=order["order_number"]):
                     def undo_paid():
-                        if messagebox.askyesno("Undo Paid", f"Mark Order #{self.app.order_history[order_idx]['order_number']} as unpaid?"):
-                            self.app.order_history[order_idx]["paid"] = False
-                            save_orders(self.app.order_history)
+                        if messagebox.askyesno("Undo Paid", f"Mark Order #{number} as unpaid?"):
+                            self.app.mark_order_unpaid(number)
                             messagebox.showinfo("Updated", "Order marked as unpaid.")
                             self.app.show_order_history()
                     return undo_paid
-                tk.Button(frame, text="Undo Paid", font=("Arial", 14), bg="#FFB300", fg="black",
+                tk.Button(frame, text="Undo Paid", font=ui_style.font(14), bg="#FFB300", fg="black",
                           command=make_undo_closure()).pack(anchor="e", padx=20, pady=(0, 10))
 
         if use_scroll:
@@ -556,6 +991,457 @@ class OrderHistoryScreen(BaseScreen):
             on_frame_configure()
             self.app.after(200, on_frame_configure)
 
+class ExportScreen(BaseScreen):
+    """Admin-only export of the order history to CSV or JSON Lines.
+
+    The export streams orders.json in a worker thread under App.run_async,
+    posting its progress back, so the till stays usable while it runs.
+    """
+    admin_only = True
+    FORMATS = {"Orders (CSV)": "orders", "Order lines (CSV)": "lines", "JSON Lines": "jsonl"}
+    PAID_FILTERS = {"All": None, "Paid": True, "Unpaid": False}
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app.clear_content()
+        if self.app.permission != "Admin":
+            messagebox.showerror("Access Denied", "You do not have permission to view this page.")
+            self.app.show_welcome()
+            return
+
+        import asyncio
+        import order_export
+
+        tk.Label(self.app.content_frame, text="Export Orders", **ui_style.preset("title")).pack(pady=20)
+        form = tk.Frame(self.app.content_frame, bg="white")
+        form.pack(pady=10)
+        format_var = tk.StringVar(value="Orders (CSV)")
+        from_var = tk.StringVar()
+        to_var = tk.StringVar()
+        paid_var = tk.StringVar(value="All")
+        rows = [
+            ("Format:", ttk.Combobox(form, textvariable=format_var, values=list(self.FORMATS), state="readonly", font=ui_style.font(18), width=18)),
+            ("From (YYYY-MM-DD):", tk.Entry(form, textvariable=from_var, font=ui_style.font(18), width=20)),
+            ("To (YYYY-MM-DD):", tk.Entry(form, textvariable=to_var, font=ui_style.font(18), width=20)),
+            ("Orders:", ttk.Combobox(form, textvariable=paid_var, values=list(self.PAID_FILTERS), state="readonly", font=ui_style.font(18), width=18)),
+        ]
+        for r, (text, widget) in enumerate(rows):
+            tk.Label(form, text=text, font=ui_style.font(20), bg="white").grid(row=r, column=0, padx=10, pady=8, sticky="e")
+            widget.grid(row=r, column=1, padx=10, pady=8, sticky="w")
+
+        frame = self.app.content_frame
+        progress = ttk.Progressbar(self.app.content_frame, length=500, maximum=100)
+        progress.pack(pady=(20, 5))
+        status = tk.Label(self.app.content_frame, text="", font=ui_style.font(18), bg="white")
+        status.pack(pady=5)
+
+        def start_export():
+            date_from = from_var.get().strip() or None
+            date_to = to_var.get().strip() or None
+            for value in (date_from, date_to):
+                if value is None:
+                    continue
+                try:
+                    datetime.datetime.strptime(value, "%Y-%m-%d")
+                except ValueError:
+                    messagebox.showwarning("Input Error", f"'{value}' is not a date in YYYY-MM-DD form.")
+                    return
+            fmt = self.FORMATS[format_var.get()]
+            ext = ".jsonl" if fmt == "jsonl" else ".csv"
+            dest = filedialog.asksaveasfilename(defaultextension=ext, initialfile=f"orders-{fmt}{ext}")
+            if not dest:
+                return
+            def show_progress(fraction, exported):
+                progress["value"] = fraction * 100
+                status.config(text=f"Exporting... {exported} orders")
+
+            def on_progress(fraction, exported):
+                # Called on the export's worker thread
+                self.app.async_bridge.post(show_progress, fraction, exported, owner=frame)
+
+            def finished(exported, error):
+                export_btn.config(state=tk.NORMAL)
+                if error is not None:
+                    status.config(text=f"Export failed: {error}", fg="#E53935")
+                else:
+                    status.config(text=f"Exported {exported} orders to {dest}", fg="black")
+
+            export_btn.config(state=tk.DISABLED)
+            status.config(text="Exporting...", fg="black")
+            # If the screen is left mid-export the file is still finished
+            self.app.run_async(asyncio.to_thread(order_export.export_orders, dest, fmt, date_from, date_to,
+                                                 self.PAID_FILTERS[paid_var.get()], source=ORDERS_FILE,
+                                                 progress=on_progress), finished)
+
+        export_btn = tk.Button(self.app.content_frame, text="Export...", font=ui_style.font(20), bg="#2196F3", fg="white",
+                               width=15, command=start_export)
+        export_btn.pack(pady=20)
+
+
+class ZReportScreen(BaseScreen):
+    """Admin-only end-of-shift report: preview the open shift and close it."""
+    admin_only = True
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app.clear_content()
+        if self.app.permission != "Admin":
+            messagebox.showerror("Access Denied", "You do not have permission to view this page.")
+            self.app.show_welcome()
+            return
+
+        import reports
+
+        report = reports.shift_report(self.app.order_store)
+        tk.Label(self.app.content_frame, text=f"Z-Report: Shift {report['shift']}",
+                 **ui_style.preset("title")).pack(pady=20)
+        text = tk.Text(self.app.content_frame, font=ui_style.font(16, family="Courier New"), bg="white", width=60, height=18, bd=1, relief="solid")
+        text.insert("1.0", reports.format_z_report(report))
+        text.config(state=tk.DISABLED)
+        text.pack(pady=10)
+
+        def close_shift():
+            if messagebox.askyesno("Close Shift", f"Close shift {report['shift']} and write the Z-report?"):
+                self.app.close_shift()
+        tk.Button(self.app.content_frame, text="Close Shift", font=ui_style.font(20), bg="#E53935", fg="white",
+                  width=15, command=close_shift).pack(pady=20)
+
+
+class SalesReportScreen(BaseScreen):
+    """Admin-only sales report over a date range of the whole history.
+
+    The report runs in worker processes (reports.SalesReport), watched by a
+    coroutine under App.run_async so the till stays responsive; leaving the
+    screen cancels it.
+    """
+    admin_only = True
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app.clear_content()
+        if self.app.permission != "Admin":
+            messagebox.showerror("Access Denied", "You do not have permission to view this page.")
+            self.app.show_welcome()
+            return
+
+        import asyncio
+        import reports
+
+        tk.Label(self.app.content_frame, text="Sales Report", **ui_style.preset("title")).pack(pady=20)
+        form = tk.Frame(self.app.content_frame, bg="white")
+        form.pack(pady=5)
+        today = datetime.date.today()
+        from_var = tk.StringVar(value=today.replace(month=1, day=1).isoformat())
+        to_var = tk.StringVar(value=today.isoformat())
+        tk.Label(form, text="From:", font=ui_style.font(20), bg="white").pack(side=tk.LEFT, padx=5)
+        tk.Entry(form, textvariable=from_var, font=ui_style.font(18), width=12).pack(side=tk.LEFT, padx=5)
+        tk.Label(form, text="To:", font=ui_style.font(20), bg="white").pack(side=tk.LEFT, padx=5)
+        tk.Entry(form, textvariable=to_var, font=ui_style.font(18), width=12).pack(side=tk.LEFT, padx=5)
+        frame = self.app.content_frame
+        status = tk.Label(self.app.content_frame, text="", font=ui_style.font(18), bg="white")
+        status.pack(pady=5)
+        text = tk.Text(self.app.content_frame, font=ui_style.font(14, family="Courier New"), bg="white", width=70, height=16, bd=1, relief="solid")
+        text.pack(pady=5)
+
+        def run():
+            for value in (from_var.get(), to_var.get()):
+                try:
+                    datetime.datetime.strptime(value, "%Y-%m-%d")
+                except ValueError:
+                    messagebox.showwarning("Input Error", f"'{value}' is not a date in YYYY-MM-DD form.")
+                    return
+            def show_progress(done, total):
+                status.config(text=f"Working... {done}/{total} partitions")
+
+            async def sales_report(date_from, date_to):
+                executor = reports.make_executor()
+                report = reports.SalesReport(ORDERS_FILE, date_from, date_to).start(executor)
+                try:
+                    while not report.done():
+                        self.app.async_bridge.post(show_progress, *report.progress(), owner=frame)
+                        await asyncio.sleep(0.1)
+                    return report.result()
+                except asyncio.CancelledError:
+                    # Screen was left mid-report
+                    report.cancel()
+                    raise
+                finally:
+                    executor.shutdown(wait=False, cancel_futures=True)
+
+            def finished(result, error):
+                run_btn.config(state=tk.NORMAL)
+                if error is not None:
+                    status.config(text=f"Report failed: {error}")
+                    return
+                status.config(text=f"Done in {result['seconds']} s")
+                text.config(state=tk.NORMAL)
+                text.delete("1.0", tk.END)
+                text.insert("1.0", reports.format_sales_report(result))
+                text.config(state=tk.DISABLED)
+
+            run_btn.config(state=tk.DISABLED)
+            self.app.run_async(sales_report(from_var.get(), to_var.get()), finished)
+
+        run_btn = tk.Button(self.app.content_frame, text="Run Report", font=ui_style.font(20), bg="#2196F3", fg="white",
+                            width=15, command=run)
+        run_btn.pack(pady=10)
+
+
+class DemandScreen(BaseScreen):
+    """Admin-only heatmap of units sold by weekday and hour, with a
+    next-hour forecast per item, drawn from the app's DemandBins."""
+    admin_only = True
+    ALL_ITEMS = "All items"
+    CELL_W, CELL_H, LABEL_W = 48, 40, 70
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app.clear_content()
+        if self.app.permission != "Admin":
+            messagebox.showerror("Access Denied", "You do not have permission to view this page.")
+            self.app.show_welcome()
+            return
+
+        bins = self.app.demand
+        tk.Label(self.app.content_frame, text="Demand by Hour", **ui_style.preset("title")).pack(pady=(20, 10))
+        item_var = tk.StringVar(value=self.ALL_ITEMS)
+        ttk.Combobox(self.app.content_frame, textvariable=item_var, state="readonly", font=ui_style.font(18), width=20,
+                     values=[self.ALL_ITEMS] + [item["name"] for item in MENU_ITEMS]).pack(pady=5)
+        body = tk.Frame(self.app.content_frame, bg="white")
+        body.pack(pady=10)
+        canvas = tk.Canvas(body, bg="white", highlightthickness=0,
+                           width=self.LABEL_W + 24 * self.CELL_W, height=(len(demand.WEEKDAYS) + 1) * self.CELL_H)
+        canvas.pack(side=tk.LEFT)
+
+        def draw(*args):
+            canvas.delete("all")
+            name = item_var.get()
+            grid = bins.grid(None if name == self.ALL_ITEMS else name)
+            peak = max(max(row) for row in grid) or 1
+            for hour in range(24):
+                canvas.create_text(self.LABEL_W + hour * self.CELL_W + self.CELL_W // 2, self.CELL_H // 2,
+                                   text=f"{hour:02d}", font=ui_style.font(12))
+            for weekday, row in enumerate(grid):
+                y = (weekday + 1) * self.CELL_H
+                canvas.create_text(self.LABEL_W // 2, y + self.CELL_H // 2, text=demand.WEEKDAYS[weekday], font=ui_style.font(14))
+                for hour, units in enumerate(row):
+                    # White (none) to deep red (the busiest slot)
+                    shade = int(255 * (1 - units / peak))
+                    x = self.LABEL_W + hour * self.CELL_W
+                    canvas.create_rectangle(x, y, x + self.CELL_W, y + self.CELL_H, outline="#DDDDDD",
+                                            fill=f"#{255 - (255 - shade) // 4:02x}{shade:02x}{shade:02x}")
+                    if units:
+                        canvas.create_text(x + self.CELL_W // 2, y + self.CELL_H // 2, text=str(units), font=ui_style.font(11),
+                                           fill="white" if units > peak / 2 else "black")
+        item_var.trace_add("write", draw)
+        draw()
+
+        side = tk.Frame(body, bg="white")
+        side.pack(side=tk.LEFT, padx=20, anchor="n")
+        next_hour = (datetime.datetime.now() + datetime.timedelta(hours=1)).strftime("%a %H:00")
+        tk.Label(side, text=f"Forecast for {next_hour}", font=ui_style.font(18, "bold"), bg="white").pack(anchor="w")
+        forecast = bins.forecast()
+        if not forecast:
+            tk.Label(side, text="Not enough history yet.", font=ui_style.font(16), bg="white").pack(anchor="w")
+        for name, units in list(forecast.items())[:12]:
+            tk.Label(side, text=f"{name}: {units:.1f}", font=ui_style.font(16), bg="white").pack(anchor="w")
+
+
+class PrepQueueScreen(BaseScreen):
+    """Orders still to be made, in the order the app's PrepQueue will make
+    them, with the next-up ticket on top. Re-reads the order store every
+    PREP_REFRESH_MS so other tills' orders appear."""
+    MAX_SHOWN = 8
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app.clear_content()
+        tk.Label(self.app.content_frame, text="Prep Queue", **ui_style.preset("title")).pack(pady=(20, 10))
+        status = tk.Label(self.app.content_frame, text="", font=ui_style.font(16), bg="white")
+        status.pack()
+        body = tk.Frame(self.app.content_frame, bg="white")
+        body.pack(fill=tk.X, padx=40, pady=10)
+        queue = self.app.prep_queue
+
+        def ready(number):
+            self.app.mark_order_ready(number)
+            draw()
+
+        def draw():
+            for widget in body.winfo_children():
+                widget.destroy()
+            tickets = queue.tickets()
+            status.config(text=f"{len(tickets)} waiting - a new order is ready in ~"
+                               f"{-(-queue.quote(self.app.order_type, []) // 60):.0f} min")
+            if not tickets:
+                tk.Label(body, text="Nothing to make.", font=ui_style.font(24), bg="white").pack(pady=40)
+            for i, order in enumerate(tickets[:self.MAX_SHOWN]):
+                next_up = i == 0
+                frame = tk.Frame(body, bg="#FFF8E1" if next_up else "white", highlightbackground="black",
+                                 highlightthickness=2 if next_up else 1)
+                frame.pack(fill=tk.X, pady=5)
+                promised = queue.promised(order["order_number"]).strftime("%H:%M")
+                wait = -(-queue.wait(order["order_number"]) // 60)
+                title = f"{'NEXT  ' if next_up else ''}#{order['order_number']}  {order['type']}  " \
+                        f"due {promised}  (~{wait:.0f} min)"
+                tk.Label(frame, text=title, font=ui_style.font(22 if next_up else 18, "bold"), bg=frame["bg"]).pack(side=tk.LEFT, padx=10, pady=5)
+                items = ", ".join(f"{item.get('count', 1)}x {item['name']}" for item in order["items"])
+                tk.Label(frame, text=items, font=ui_style.font(16), bg=frame["bg"], wraplength=700,
+                         justify="left").pack(side=tk.LEFT, padx=10)
+                tk.Button(frame, text="Ready", font=ui_style.font(16), bg="#4CAF50", fg="white", width=8,
+                          command=lambda number=order["order_number"]: ready(number)).pack(side=tk.RIGHT, padx=10, pady=5)
+            if len(tickets) > self.MAX_SHOWN:
+                tk.Label(body, text=f"... and {len(tickets) - self.MAX_SHOWN} more", font=ui_style.font(16),
+                         bg="white").pack(pady=5)
+
+        def poll():
+            if not body.winfo_exists():
+                return
+            self.app.order_store.refresh()
+            draw()
+            self.app.after(PREP_REFRESH_MS, poll)
+
+        draw()
+        self.app.after(PREP_REFRESH_MS, poll)
+
+
+class DiagnosticsScreen(BaseScreen):
+    """Admin-only view of the timing percentiles gathered by instrumentation."""
+    admin_only = True
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app.clear_content()
+        if self.app.permission != "Admin":
+            messagebox.showerror("Access Denied", "You do not have permission to view this page.")
+            self.app.show_welcome()
+            return
+
+        tk.Label(self.app.content_frame, text="Diagnostics", **ui_style.preset("title")).pack(pady=20)
+
+        controls = tk.Frame(self.app.content_frame, bg="white")
+        controls.pack(pady=10)
+        enabled_var = tk.BooleanVar(value=instrumentation.is_enabled())
+        tk.Checkbutton(controls, text="Collect timings", variable=enabled_var, font=ui_style.font(18), bg="white",
+                       command=lambda: instrumentation.enable(enabled_var.get())).pack(side=tk.LEFT, padx=20)
+        tk.Button(controls, text="Refresh", font=ui_style.font(18), command=self.app.show_diagnostics).pack(side=tk.LEFT, padx=10)
+        tk.Button(controls, text="Dump to File (F12)", font=ui_style.font(18), command=self.app.dump_timings).pack(side=tk.LEFT, padx=10)
+
+        def reset():
+            instrumentation.reset()
+            self.app.show_diagnostics()
+        tk.Button(controls, text="Reset", font=ui_style.font(18), command=reset).pack(side=tk.LEFT, padx=10)
+
+        profile_controls = tk.Frame(self.app.content_frame, bg="white")
+        profile_controls.pack(pady=10)
+        tk.Button(profile_controls, text=f"Profile {PROFILE_SECONDS} s (F11)", font=ui_style.font(18),
+                  command=self.app.start_profiler).pack(side=tk.LEFT, padx=10)
+        tk.Button(profile_controls, text="Memory Diff: Order List", font=ui_style.font(18),
+                  command=self.app.memory_diff_order_history).pack(side=tk.LEFT, padx=10)
+
+        columns = ("count", "p50", "p95", "p99", "max")
+        tree = ttk.Treeview(self.app.content_frame, columns=columns, height=15)
+        tree.heading("#0", text="Timer")
+        tree.column("#0", width=320)
+        for col in columns:
+            tree.heading(col, text=col if col == "count" else f"{col} (ms)")
+            tree.column(col, width=140, anchor="e")
+        tree.pack(padx=40, pady=10, fill=tk.BOTH, expand=True)
+        for name, s in instrumentation.summary().items():
+            tree.insert("", tk.END, text=name, values=(s["count"], f"{s['p50']:.2f}", f"{s['p95']:.2f}",
+                                                      f"{s['p99']:.2f}", f"{s['max']:.2f}"))
+
+
+class QuickSwitchOverlay(tk.Frame):
+    """PIN pad laid over the current screen for switching staff.
+
+    Tapping a name and entering that user's PIN calls App.switch_user;
+    nothing underneath is cleared or rebuilt.
+    """
+    def __init__(self, app):
+        super().__init__(app, bg="white", highlightbackground="black", highlightthickness=2)
+        self.app = app
+        self.selected = None
+        self.name_buttons = {}
+        self.place(relx=0.5, rely=0.5, anchor="center", relwidth=0.6, relheight=0.9)
+        self.lift()
+
+        tk.Label(self, text="Switch Staff", **ui_style.preset("title")).pack(pady=(20, 10))
+        names_frame = tk.Frame(self, bg="white")
+        names_frame.pack(pady=10)
+        staff = [user["username"] for user in self.app.users if "pin_hash" in user]
+        if not staff:
+            tk.Label(names_frame, text="No staff have a quick PIN yet. An Admin can set one in Accounts.",
+                     font=ui_style.font(16), bg="white").pack()
+        for i, name in enumerate(staff):
+            btn = tk.Button(names_frame, text=name, font=ui_style.font(18), width=10, bg="white",
+                            command=lambda n=name: self.select(n))
+            btn.grid(row=i // 4, column=i % 4, padx=6, pady=6)
+            self.name_buttons[name] = btn
+
+        self.pin_var = tk.StringVar()
+        self.pin_entry = tk.Entry(self, textvariable=self.pin_var, font=ui_style.font(28), show="*", width=8, justify="center")
+        self.pin_entry.pack(pady=10)
+        self.status = tk.Label(self, text="", font=ui_style.font(16), bg="white", fg="#E53935")
+        self.status.pack()
+
+        keypad = tk.Frame(self, bg="white")
+        keypad.pack(pady=10)
+        for i, key in enumerate(["1", "2", "3", "4", "5", "6", "7", "8", "9", "Clear", "0", "OK"]):
+            if key == "Clear":
+                cmd = lambda: self.pin_var.set("")
+            elif key == "OK":
+                cmd = self.submit
+            else:
+                cmd = lambda d=key: self.pin_entry.insert(tk.END, d)
+            tk.Button(keypad, text=key, font=ui_style.font(20), width=5, command=cmd).grid(row=i // 3, column=i % 3, padx=4, pady=4)
+        tk.Button(self, text="Cancel", font=ui_style.font(18), command=self.destroy).pack(pady=10)
+
+        self.pin_entry.bind("<Return>", lambda e: self.submit())
+        self.pin_entry.bind("<Escape>", lambda e: self.destroy())
+        if len(staff) == 1:
+            self.select(staff[0])
+        self.pin_entry.focus_set()
+
+    def select(self, name):
+        for other, btn in self.name_buttons.items():
+            btn.config(bg="#2196F3" if other == name else "white", fg="white" if other == name else "black")
+        self.selected = name
+        self.status.config(text="")
+        self.pin_entry.focus_set()
+
+    def submit(self):
+        if self.selected is None:
+            self.status.config(text="Tap your name first.")
+            return
+        with instrumentation.timed("quick_switch"):
+            user = self.app.users.verify_pin(self.selected, self.pin_var.get())
+        if user is None:
+            locked = self.app.users.pin_locked(self.selected)
+            self.status.config(text=f"Too many wrong PINs. Try again in {-(-locked // 60):.0f} min."
+                               if locked else "Wrong PIN.")
+            self.pin_var.set("")
+            self.bell()
+            return
+        self.destroy()
+        self.app.switch_user(user)
+
+
+# Argument builders for ui_replay.recorded: recordings name menu items and
+# orders rather than holding dicts or list indexes that differ on replay.
+def _screen(name):
+    return lambda app: {"screen": name}
+
+
+def _cart_args(app, mutations):
+    return {"mutations": [[op, target["name"] if op == "add" else target, *rest]
+                          for op, target, *rest in mutations]}
+
+
+def _order_args(app, number):
+    return {"order_number": number}
+
+
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -563,16 +1449,73 @@ class App(tk.Tk):
         self.geometry("1365x768")
         self.configure(bg="white")
         self.resizable(True, True)
-        self.order_history = load_orders()
+        # Named fonts live in this Tk interpreter
+        ui_style.reset()
+        # Order data and stock are loaded by ensure_data once the login
+        # frame is on screen, or sooner if something needs them
+        self.order_store = None
+        self.order_history = None
+        self.demand = None
+        self.order_index = None
+        self.prep_queue = None
+        self.inventory = None
+        self.history_filter = {}
+        self.order_type = prep_queue.ORDER_TYPES[0]
+        # Set by the order screen to redraw its menu buttons' availability
+        self.on_stock_change = None
+        # Called once the login frame has been drawn (see _warm_up)
+        self.on_interactive = None
+        self.interactive_at = None
+        self.after(STOCK_CHECK_MS, self.check_stock)
         self.username = None
         self.permission = None
-        # Set order_number to next available number
-        if self.order_history:
-            self.order_number = max(order.get("order_number", 0) for order in self.order_history) + 1
-        else:
-            self.order_number = 1
-        self.users = load_users()
+        self.users = user_store.UserStore(USERS_FILE)
+        self.profiler = None
+        # replication.Replicator when a standby directory is configured
+        self.replicator = None
+        self.replication_warned = False
+        # ui_replay.SessionRecorder when launched with --record
+        self.recorder = None
+        # tickets.TicketPrinter once start_printing has been called
+        self.printer = None
+        # async_bridge.AsyncBridge, created by the first run_async
+        self.async_bridge = None
+        self.cart = Cart()
         self.show_login()
+        # Idle callbacks run after Tk's own, so by the timer the frame is up
+        self.after_idle(self.after, 1, self._warm_up)
+
+    def _warm_up(self):
+        self.interactive_at = time.perf_counter()
+        if self.on_interactive is not None:
+            self.on_interactive()
+        self.ensure_data()
+
+    @instrumentation.timed_function("load_data")
+    def ensure_data(self):
+        """Load the order store, the indexes that follow it and the stock, once."""
+        if self.order_store is not None:
+            return
+        # Latest checkpoint plus the journal tail; the list is kept in step
+        # with other tills' changes whenever the store is written
+        self.order_store = order_store.OrderStore(ORDERS_FILE)
+        self.order_history = self.order_store.orders
+        # Weekday/hour demand bins; built at the next idle moment, then moved
+        # order by order as the store changes
+        self.demand = demand.DemandBins()
+        self.order_store.observe(self.demand)
+        self.after_idle(self.demand.ensure)
+        # Indexes behind the order list's filter bar, kept up to date the same way
+        self.order_index = order_index.OrderIndex(self.order_store)
+        self.order_store.observe(self.order_index)
+        self.after_idle(self.order_index.ensure)
+        # Orders still to be made, next-up first, with wait estimates
+        self.prep_queue = prep_queue.PrepQueue(PREP_SECONDS, PREP_STATIONS)
+        self.order_store.observe(self.prep_queue)
+        self.after_idle(self.prep_queue.ensure)
+        # Ingredient stock, counted down as orders are recorded
+        self.inventory = inventory.Inventory(STOCK_FILE, MENU_ITEMS, RECIPES)
+        self.update_order_gauges()
 
     def clear(self):
         for widget in self.winfo_children():
@@ -582,41 +1525,89 @@ class App(tk.Tk):
         # Instantiate the LoginScreen class which handles its own UI
         LoginScreen(self)
 
+    @ui_replay.recorded("login", lambda app, user: {"username": user["username"]})
+    def login(self, user):
+        self.ensure_data()
+        self.username = user["username"]
+        self.permission = user["permission"]
+        self.show_main()
+
     def show_main(self):
         self.clear()
         top_frame = tk.Frame(self, bg="white")
         top_frame.pack(fill=tk.X, pady=10)
 
-        home_label = tk.Label(top_frame, text=ICON_HOME, font=("Arial", 48), bg="white", cursor="hand2")
+        home_label = tk.Label(top_frame, text=ICON_HOME, font=ui_style.font(48), bg="white", cursor="hand2")
         home_label.pack(side=tk.LEFT, padx=(30, 10))
         home_label.bind("<Button-1>", lambda e: self.show_welcome())
 
-        button_frame = tk.Frame(top_frame, bg="white")
-        button_frame.pack(side=tk.LEFT, expand=True)
+        self.menu_button_frame = tk.Frame(top_frame, bg="white")
+        self.menu_button_frame.pack(side=tk.LEFT, expand=True)
+        self.build_menu_buttons()
+
+        exit_label = tk.Label(top_frame, text=ICON_EXIT, font=ui_style.font(48), bg="white", cursor="hand2")
+        exit_label.pack(side=tk.RIGHT, padx=(10, 30))
+        exit_label.bind("<Button-1>", lambda e: self.destroy())
+        # Quick staff switch: PIN overlay on top of the current screen
+        switch_label = tk.Label(top_frame, text=ICON_USER, font=ui_style.font(48), bg="white", cursor="hand2")
+        switch_label.pack(side=tk.RIGHT, padx=10)
+        switch_label.bind("<Button-1>", lambda e: self.show_quick_switch())
+        tk.Frame(self, height=2, bg="black").pack(fill=tk.X, pady=10)
+        # Hotkey to write the current timing percentiles to TIMINGS_FILE
+        self.bind("<F12>", lambda e: self.dump_timings())
+        # Hotkey to sample the Tk thread for PROFILE_SECONDS
+        self.bind("<F11>", lambda e: self.start_profiler())
+
+        self.show_welcome()
 
+    def build_menu_buttons(self):
+        # (Re)build the navigation buttons for the current user's permission
+        for widget in self.menu_button_frame.winfo_children():
+            widget.destroy()
         # Only show 'Accounts' button for Admins
         menu_buttons = [
             ("New Order", self.show_order),
             ("Order List", self.show_order_history),
+            ("Prep Queue", self.show_prep_queue),
         ]
         if self.permission == "Admin":
             menu_buttons.append(("Accounts", self.show_accounts))
+            menu_buttons.append(("Diagnostics", self.show_diagnostics))
 
         for text, cmd in menu_buttons:
-            btn = tk.Button(button_frame, text=text, font=("Arial", 20), bg="white", fg="black", bd=1, relief="solid",
+            btn = tk.Button(self.menu_button_frame, text=text, font=ui_style.font(20), bg="white", fg="black", bd=1, relief="solid",
                             highlightbackground="black", highlightthickness=2, width=16, height=2, command=cmd)
-            btn.pack(side=tk.LEFT, padx=40)
+            btn.pack(side=tk.LEFT, padx=20)
 
-        exit_label = tk.Label(top_frame, text=ICON_EXIT, font=("Arial", 48), bg="white", cursor="hand2")
-        exit_label.pack(side=tk.RIGHT, padx=(10, 30))
-        exit_label.bind("<Button-1>", lambda e: self.destroy())
-        tk.Frame(self, height=2, bg="black").pack(fill=tk.X, pady=10)
-
-        self.show_welcome()
+    def show_quick_switch(self):
+        overlay = getattr(self, "quick_switch", None)
+        if overlay is not None and overlay.winfo_exists():
+            overlay.lift()
+            return
+        self.quick_switch = QuickSwitchOverlay(self)
+
+    @ui_replay.recorded("switch_user", lambda app, user: {"username": user["username"]})
+    def switch_user(self, user):
+        """Make `user` the active staff member without rebuilding the window.
+
+        The menu buttons and the current screen are rebuilt for the new
+        user's permission, keeping any order in progress; an Admin-only
+        screen gives way to the welcome screen for anyone else.
+        """
+        self.username = user["username"]
+        self.permission = user["permission"]
+        self.build_menu_buttons()
+        screen = getattr(self, "current_screen", None)
+        if screen is None or (screen.admin_only and self.permission != "Admin"):
+            self.show_welcome()
+        else:
+            screen.rebuild()
 
+    @ui_replay.recorded("navigate", _screen("welcome"))
     def show_welcome(self):
         self.clear_content()
-        tk.Label(self.content_frame, text=f"Welcome {self.username}", font=("Arial", 64, "bold"), bg="white").pack(pady=60)
+        self.current_screen = None
+        tk.Label(self.content_frame, text=f"Welcome {self.username}", font=ui_style.font(64, "bold"), bg="white").pack(pady=60)
 
     def clear_content(self):
         if hasattr(self, 'content_frame'):
@@ -625,83 +1616,296 @@ class App(tk.Tk):
         self.content_frame.pack(fill=tk.BOTH, expand=True)
 
 
+    @ui_replay.recorded("navigate", _screen("accounts"))
     def show_accounts(self):
         # Instantiate the AccountsScreen class which builds the accounts UI
         AccountsScreen(self)
 
+    @ui_replay.recorded("navigate", _screen("export"))
+    def show_export(self):
+        ExportScreen(self)
+
+    @ui_replay.recorded("navigate", _screen("sales_report"))
+    def show_sales_report(self):
+        SalesReportScreen(self)
+
+    @ui_replay.recorded("navigate", _screen("demand"))
+    def show_demand(self):
+        DemandScreen(self)
+
+    @ui_replay.recorded("navigate", _screen("prep_queue"))
+    def show_prep_queue(self):
+        PrepQueueScreen(self)
+
+    @ui_replay.recorded("navigate", _screen("z_report"))
+    def show_z_report(self):
+        ZReportScreen(self)
+
+    @ui_replay.recorded("close_shift")
+    def close_shift(self):
+        # The report is recomputed at closing time so it matches the shift
+        # boundary recorded in the store exactly
+        import reports
+
+        report, paths = reports.close_shift(self.order_store)
+        messagebox.showinfo("Shift Closed", f"Shift {report['shift']} closed.\nZ-report written to {paths[0]}")
+        self.show_z_report()
+
+    @ui_replay.recorded("navigate", _screen("diagnostics"))
+    def show_diagnostics(self):
+        DiagnosticsScreen(self)
+
+    def dump_timings(self):
+        if self.permission != "Admin":
+            return
+        instrumentation.dump(TIMINGS_FILE)
+        messagebox.showinfo("Timings Saved", f"Timing percentiles written to {TIMINGS_FILE}")
+
+    def start_profiler(self):
+        if self.permission != "Admin":
+            return
+        if self.profiler is not None and self.profiler.is_running():
+            messagebox.showinfo("Profiler", "A profile is already being recorded.")
+            return
+        import profiling
+
+        self.profiler = profiling.SamplingProfiler(PROFILE_SECONDS).start()
+        messagebox.showinfo("Profiler", f"Sampling for {PROFILE_SECONDS} s. Collapsed stacks will be written to {self.profiler.path}")
+
+    def start_replication(self, standby_dir):
+        import replication
+
+        self.ensure_data()
+        self.replicator = replication.Replicator(self.order_store, standby_dir).start()
+        self.after(REPLICATION_CHECK_MS, self.check_replication)
+
+    def run_async(self, coro, on_done=None, owner=None):
+        """Run coroutine `coro` off the Tk thread, then `on_done(result, error)`
+        on it. The task is cancelled if `owner` (by default the current
+        screen's content frame) is destroyed first."""
+        if self.async_bridge is None:
+            import async_bridge
+
+            self.async_bridge = async_bridge.AsyncBridge(self)
+        if owner is None:
+            owner = getattr(self, "content_frame", None)
+        return self.async_bridge.submit(coro, on_done, owner)
+
+    def start_printing(self, receipt_printer=None, kitchen_printer=None, pdf_receipts=False):
+        import tickets
+
+        self.printer = tickets.TicketPrinter(receipt_printer, kitchen_printer, pdf_receipts).start()
+
+    def check_replication(self):
+        import replication
+
+        # Warn once per outage when the standby falls too far behind
+        lag = self.replicator.lag()
+        if lag > replication.MAX_LAG_SECONDS and not self.replication_warned:
+            self.replication_warned = True
+            messagebox.showwarning("Standby Copy Behind",
+                                   f"Orders have not reached the standby copy for {lag:.0f} s.\n{self.replicator.error or ''}")
+        elif lag <= replication.MAX_LAG_SECONDS:
+            self.replication_warned = False
+        self.after(REPLICATION_CHECK_MS, self.check_replication)
+
+    def check_stock(self):
+        if self.inventory is not None and self.inventory.refresh() and self.on_stock_change is not None:
+            self.on_stock_change()
+        self.after(STOCK_CHECK_MS, self.check_stock)
+
+    def memory_diff_order_history(self):
+        # Build the order list between two tracemalloc snapshots, including
+        # the idle-time layout work, then report what grew
+        import profiling
+
+        def build():
+            self.show_order_history()
+            self.update_idletasks()
+        path = profiling.memory_diff(build, "OrderHistoryScreen")
+        messagebox.showinfo("Memory Diff", f"Allocation growth written to {path}")
+
 
         # --- Function: show_order ---
+    @ui_replay.recorded("navigate", _screen("order"))
     def show_order(self):
         # Instantiate the OrderScreen which will build the order UI
         OrderScreen(self)
 
 
+    # Every cart change from the order screen goes through here so that a
+    # recorded session captures it; see Cart.apply for the mutation tuples.
+    @ui_replay.recorded("cart", _cart_args)
+    def apply_to_cart(self, mutations):
+        self.cart.apply(mutations)
+
+    @ui_replay.recorded("order_type", lambda app, order_type: {"type": order_type})
+    def set_order_type(self, order_type):
+        self.order_type = order_type
+
     # --- Function: checkout ---
+    @ui_replay.recorded("checkout")
     def checkout(self):
         # Warn user if order is empty
-        if not self.current_order:
+        if not self.cart:
             messagebox.showwarning("No Items", "No items in order.")
             return
 
         # Record the order as paid
-        self.record_order(paid=True)
+        number = self.record_order(paid=True)
 
         # Notify user that the order is complete and paid
-        messagebox.showinfo("Order Complete", f"Order #{self.order_number - 1} has been placed and paid.")
+        messagebox.showinfo("Order Complete", f"Order #{number} has been placed and paid.")
 
         # Show updated order screen
         self.show_order()
 
 
     # --- Function: submit_order ---
+    @ui_replay.recorded("submit_order")
     def submit_order(self):
         # Warn user if order is empty
-        if not self.current_order:
+        if not self.cart:
             messagebox.showwarning("No Items", "No items in order.")
             return
 
         # Record the order as unpaid
-        self.record_order(paid=False)
+        number = self.record_order(paid=False)
 
         # Notify user that the order has been placed but not paid
-        messagebox.showinfo("Order Submitted", f"Order #{self.order_number - 1} has been placed and is unpaid.")
+        messagebox.showinfo("Order Submitted", f"Order #{number} has been placed and is unpaid.")
 
         # Refresh or return to the order screen
         self.show_order()
 
 
+    @instrumentation.timed_function("record_order")
     def record_order(self, paid=True):
-        if hasattr(self, 'current_order_counts') and self.current_order_counts:
-            items = []
-            for entry in self.current_order_counts.values():
-                item = entry["item"].copy()
-                count = entry["count"]
-                item["count"] = count
-                items.append(item)
-        else:
-            items = self.current_order
+        # Charge the prices in force now, not those of the last cart change
+        self.cart.reprice()
+        items = []
+        for entry in self.cart.lines.values():
+            # Only persist name and the unit price charged; menu codes stay
+            # in MENU_ITEMS
+            item = {"name": entry["item"]["name"], "price": entry["price"]}
+            item["count"] = entry["count"]
+            items.append(item)
         order_record = {
-            "order_number": self.order_number,
             "items": items,
-            "total": self.total_cost,
+            "total": self.cart.total,
             "staff": self.username,
             "paid": paid,
+            "type": self.order_type,
             "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-        self.order_history.append(order_record)
-        save_orders(self.order_history)
-        # Increment the persistent order counter so saved orders always carry
-        # a unique increasing order number across app sessions.
-        self.order_number += 1
-
-    # After saving the order, incrementing order_number ensures uniqueness
-    # across app restarts (order_number was initialized from existing history).
-
+        discounts = self.cart.discount_lines()
+        if discounts:
+            order_record["discounts"] = [{"name": name, "amount": amount} for name, amount in discounts]
+        # The store issues the number under its file lock, so two tills
+        # sharing the order files never give out the same one
+        number = self.order_store.add(order_record)
+        # One stock journal line per order, written in the background
+        self.inventory.consume(number, items)
+        # Receipt and kitchen ticket print on the printer's own thread
+        if self.printer is not None:
+            self.printer.submit(self.order_store.get(number))
+        metrics.inc("cafe_orders_recorded_total")
+        if paid:
+            metrics.inc("cafe_orders_paid_total")
+        self.update_order_gauges()
+        return number
+
+    # Order list actions, by order number. The store and its observers
+    # (gauges aside) follow the change themselves.
+    @ui_replay.recorded("mark_order_paid", _order_args)
+    def mark_order_paid(self, number):
+        # Counted only if this till actually changed it (not already paid elsewhere)
+        if self.order_store.set_paid(number, True) is not None:
+            metrics.inc("cafe_orders_paid_total")
+        self.update_order_gauges()
+
+    @ui_replay.recorded("mark_order_unpaid", _order_args)
+    def mark_order_unpaid(self, number):
+        self.order_store.set_paid(number, False)
+        self.update_order_gauges()
+
+    @ui_replay.recorded("mark_order_ready", _order_args)
+    def mark_order_ready(self, number):
+        self.order_store.set_ready(number)
+
+    @ui_replay.recorded("cancel_order", _order_args)
+    def cancel_order(self, number):
+        order = self.order_store.cancel(number)
+        if order is not None:
+            self.inventory.restore(number, order["items"])
+            metrics.inc("cafe_orders_cancelled_total")
+        self.update_order_gauges()
+
+    def update_order_gauges(self):
+        # The store keeps these totals up to date as it applies changes
+        metrics.set_gauge("cafe_orders_unpaid", self.order_store.unpaid)
+        metrics.set_gauge("cafe_revenue_dollars", self.order_store.revenue)
+
+    @ui_replay.recorded("navigate", _screen("order_history"))
     def show_order_history(self):
         # Instantiate the OrderHistoryScreen which builds the history view
         OrderHistoryScreen(self)
 
 # Add main entry point to run the app
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cafe point-of-sale system")
+    parser.add_argument("--instrument", action="store_true",
+                        help="collect timing percentiles from startup")
+    parser.add_argument("--metrics-file", default=os.environ.get("CAFE_METRICS_FILE"),
+                        help="Prometheus textfile-collector file to keep updated")
+    parser.add_argument("--metrics-interval", type=float, default=15.0,
+                        help="seconds between metrics file writes (default 15)")
+    parser.add_argument("--profile", type=float, metavar="SECONDS",
+                        help="sample the Tk thread from launch for SECONDS and write collapsed stacks")
+    parser.add_argument("--record", metavar="DIR",
+                        help="record this session's UI actions to DIR for replay with ui_replay.py")
+    parser.add_argument("--standby", metavar="DIR", default=os.environ.get("CAFE_STANDBY_DIR"),
+                        help="keep a continuously updated copy of the order store in DIR")
+    parser.add_argument("--receipt-printer", metavar="PATH", default=os.environ.get("CAFE_RECEIPT_PRINTER"),
+                        help="ESC/POS receipt printer device or file (default: text files in receipts/)")
+    parser.add_argument("--kitchen-printer", metavar="PATH", default=os.environ.get("CAFE_KITCHEN_PRINTER"),
+                        help="ESC/POS kitchen ticket printer device or file (default: text files in receipts/)")
+    parser.add_argument("--pdf-receipts", action="store_true",
+                        help="also write a PDF of every receipt to receipts/")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.instrument:
+        instrumentation.enable()
+    exporter = None
+    if args.metrics_file:
+        exporter = metrics.TextfileExporter(args.metrics_file, args.metrics_interval).start()
+    if args.profile:
+        # Started before App() so the profile covers startup as well
+        import profiling
+
+        profiling.SamplingProfiler(args.profile).start()
+    user_store.migrate(USERS_FILE)
     app = App()
+    if args.record:
+        # Snapshot the data files as they were at startup, then log actions
+        app.ensure_data()
+        app.recorder = ui_replay.SessionRecorder(args.record, app.order_store.files() + app.inventory.files()
+                                                 + [USERS_FILE, USERS_FILE + ".journal"])
+    if args.standby:
+        app.start_replication(args.standby)
+    app.start_printing(args.receipt_printer, args.kitchen_printer, args.pdf_receipts)
     app.mainloop()
+    if app.async_bridge is not None:
+        app.async_bridge.stop()
+    if app.recorder is not None:
+        app.recorder.close()
+    if app.replicator is not None:
+        app.replicator.stop()
+    if app.inventory is not None:
+        app.inventory.stop()
+    app.printer.stop()
+    if exporter is not None:
+        exporter.stop()
@@ -1,12 +1,13 @@
 # Import required modules for GUI, file handling, and JSON
 import tkinter as tk
 from tkinter import messagebox
-import os
-import json
 
-# Path to the JSON file used to persist usernames and passwords.
-# It is stored in the same directory as this script.
-PASSWORDS_FILE = os.path.join(os.path.dirname(__file__), "passwords.json")
+import user_store
+
+# Accounts live in users.json, shared with Final.py. The old passwords.json
+# store is merged into it by user_store.migrate at startup. Those accounts
+# can use the till, so new ones are only added by an Admin in Final.py.
+USERS_FILE = user_store.USERS_FILE
 
 
 class User:
@@ -14,58 +15,30 @@ class User:
 
     Attributes:
         username (str): the user's login name
-        password (str): the user's password
+        store (UserStore): where the user's hashed password is kept
     """
-    def __init__(self, username, password):
+    def __init__(self, username, store):
         self.username = username
-        self.password = password
+        self.store = store
 
     def authenticate(self, password):
-        # Return True if the supplied password matches this user's password.
-        return self.password == password
+        # Return True if the supplied password matches this user's stored hash.
+        return self.store.authenticate(self.username, password) is not None
 
 
 class UserManager:
-    # Manages loading, saving and basic operations on users appended to a JSON file.
+    # Wraps the shared user_store so this window sees the same accounts as Final.py.
     def __init__(self, filepath):
-        self.filepath = filepath
-        # Load existing users
-        self.users = self.load_users()
-
-    def load_users(self):
-        """Load users from self.filepath and return a dict of User objects.
-
-        If the file doesn't exist or is invalid the method returns an empty dict.
-        """
-        if os.path.exists(self.filepath):
-            try:
-                with open(self.filepath, "r") as f:
-                    data = json.load(f)
-                return {u: User(u, p) for u, p in data.items()}
-            except Exception:
-                # If reading/parsing fails, don't crash the application — return an empty store.
-                return {}
-        # File doesn't exist yet, start with an empty user store.
-        return {}
-
-    def save_users(self):
-        # Append the current user to the JSON file.
-        data = {u: user.password for u, user in self.users.items()}
-        with open(self.filepath, "w") as f:
-            json.dump(data, f, indent=2)
-
-    def add_user(self, username, password):
-        # Create a new User and save the updated store to JSON file.
-        self.users[username] = User(username, password)
-        self.save_users()
+        self.store = user_store.UserStore(filepath)
 
     def get_user(self, username):
         # Return the User object for a username, or None if not found.
-        return self.users.get(username)
+        record = self.store.get(username)
+        return User(record["username"], self.store) if record else None
 
 
 class LoginWindow(tk.Tk):
-   # Tkinter-based login window that allows signing in or registering.
+   # Tkinter-based login window for existing accounts.
     def __init__(self, user_manager):
         super().__init__()
         self.user_manager = user_manager
@@ -129,7 +102,7 @@ class LoginWindow(tk.Tk):
 
     def login(self):
         """Handle the login button press. Read username and password from the entry widgets. 
-        If validated open MainWindow. If user doesn't exist, prompt to register and create the user.
+        If validated open MainWindow.
         """
         # Trim whitespace from input fields
         username = self.user_entry.get().strip()
@@ -153,16 +126,12 @@ class LoginWindow(tk.Tk):
                 # Password mismatch
                 messagebox.showerror("Error", "Incorrect password.")
         else:
-            # User not found: offer to register as a new user
-            if messagebox.askyesno("Register", f"Username '{username}' not found. Register as new user?"):
-                self.user_manager.add_user(username, password)
-                messagebox.showinfo("Registered", "User registered and logged in!")
-                self.destroy()
-                MainWindow(username)
+            # No self-registration: accounts in users.json can use the till
+            messagebox.showerror("Error", f"Username '{username}' not found. Ask an Admin to add you.")
 
 
 class MainWindow(tk.Tk):
-    # Main application window shown after successful login or registration.
+    # Main application window shown after successful login.
 
     def __init__(self, username):
         super().__init__()
@@ -174,6 +143,7 @@ class MainWindow(tk.Tk):
 
 if __name__ == "__main__":
     # Initialize the UserManager with the JSON file and start the login UI.
-    user_manager = UserManager(PASSWORDS_FILE)
+    user_store.migrate()
+    user_manager = UserManager(USERS_FILE)
     app = LoginWindow(user_manager)
     app.mainloop()
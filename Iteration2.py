@@ -1,69 +1,47 @@
 # Import modules for UI, dialogs, files and JSON handling
 import tkinter as tk
 from tkinter import messagebox
-import os
-import json
 
-# Path to the JSON file for storing user credentials
-PASSWORDS_FILE = os.path.join(os.path.dirname(__file__), "passwords.json")
+import user_store
+
+# Shared credentials file (users.json); passwords.json is migrated into it.
+# Its accounts can use the till, so new ones are only added by an Admin in
+# Final.py.
+USERS_FILE = user_store.USERS_FILE
 
 
 class User:
     """
-    Represents a user with a username and password.
+    Represents a user whose hashed password lives in the shared UserStore.
     """
 
-    def __init__(self, username, password):
+    def __init__(self, username, store):
         self.username = username  # user's login name
-        self.password = password  # user's password
+        self.store = store  # UserStore holding the password hash
 
     def authenticate(self, password):
-        # Check if the provided password matches the stored password
-        return self.password == password
+        # Check the provided password against the stored hash
+        return self.store.authenticate(self.username, password) is not None
 
 
 class UserManager:
     """
-    Handles loading and saving users to a JSON file.
-    Provides methods to add and retrieve users.
+    Wraps the shared user_store (users.json) used by Final.py.
+    Provides a method to retrieve users.
     """
 
     def __init__(self, filepath):
-        self.filepath = filepath
-        self.users = self.load_users()  # Load users at startup
-
-    def load_users(self):
-        # Try to read users from JSON file; if missing or invalid, return empty dict
-        if os.path.exists(self.filepath):
-            try:
-                with open(self.filepath, "r") as f:
-                    data = json.load(f)
-                # Convert dict of username:password to User objects
-                return {u: User(u, p) for u, p in data.items()}
-            except Exception:
-                # If file is corrupt or unreadable, start with no users
-                return {}
-        return {}
-
-    def save_users(self):
-        # Save all users to JSON file (overwrites file)
-        data = {u: user.password for u, user in self.users.items()}
-        with open(self.filepath, "w") as f:
-            json.dump(data, f, indent=2)
-
-    def add_user(self, username, password):
-        # Add a new user and save to file
-        self.users[username] = User(username, password)
-        self.save_users()
+        self.store = user_store.UserStore(filepath)
 
     def get_user(self, username):
         # Return User object for username, or None if not found
-        return self.users.get(username)
+        record = self.store.get(username)
+        return User(record["username"], self.store) if record else None
 
 
 class LoginWindow(tk.Tk):
     """
-    Login window for user authentication and registration.
+    Login window for user authentication.
     Handles placeholder text and input validation.
     """
 
@@ -95,7 +73,7 @@ class LoginWindow(tk.Tk):
         self.pass_entry.bind("<FocusIn>", self._clear_pass_placeholder)
         self.pass_entry.bind("<FocusOut>", self._add_pass_placeholder)
 
-        # Login button triggers login/registration logic
+        # Login button triggers login logic
         tk.Button(self, text="Login", font=("Arial", 18), command=self.login).pack(pady=20)
 
     def _clear_user_placeholder(self, event):
@@ -131,7 +109,7 @@ class LoginWindow(tk.Tk):
             messagebox.showerror("Error", "Please enter both username and password.")
             return
 
-        # Try to authenticate user; if not found, offer registration
+        # Try to authenticate user
         user = self.user_manager.get_user(username)
         if user:
             if user.authenticate(password):
@@ -141,16 +119,8 @@ class LoginWindow(tk.Tk):
             else:
                 messagebox.showerror("Error", "Incorrect password.")
         else:
-            # Ask to register new user if username not found
-            if messagebox.askyesno("Register", f"Username '{username}' not found. Register as new user?"):
-                # Enforce password length constraints on registration
-                if len(password) < 4 or len(password) > 14:
-                    messagebox.showwarning("Input Error", "Password must be between 4 and 14 characters.")
-                    return
-                self.user_manager.add_user(username, password)
-                messagebox.showinfo("Registered", "User registered and logged in!")
-                self.destroy()
-                WelcomeWindow(username)
+            # No self-registration: accounts in users.json can use the till
+            messagebox.showerror("Error", f"Username '{username}' not found. Ask an Admin to add you.")
 
 
 class WelcomeWindow(tk.Tk):
@@ -337,5 +307,6 @@ class WelcomeWindow(tk.Tk):
 
 if __name__ == "__main__":
     # Entry point: create UserManager and start login window
-    user_manager = UserManager(PASSWORDS_FILE)
+    user_store.migrate()
+    user_manager = UserManager(USERS_FILE)
     LoginWindow(user_manager).mainloop()
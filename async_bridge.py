@@ -0,0 +1,114 @@
+"""An asyncio event loop running beside Tk's, for slow work off the UI path.
+
+Tk widgets may only be touched from the thread running mainloop(), and
+asyncio wants a loop of its own, so `AsyncBridge` runs one on a daemon
+thread, started the first time there is something for it to do.
+`submit(coro, on_done, owner)` schedules a coroutine there; when it
+finishes, `on_done(result, error)` is called back on the Tk thread, which
+drains finished work every POLL_MS while any is outstanding (and not at
+all otherwise). Coroutines do blocking file work through
+asyncio.to_thread() and report progress through `post()`.
+
+Work belongs to an owner widget, normally the content frame of the screen
+that started it. When the owner is destroyed (the user navigates away) its
+tasks are cancelled and their callbacks, and any progress still posted for
+it, are dropped, so nothing reaches a widget that has gone. Cancelling a
+task interrupts it at its next await; a function already handed to
+to_thread() runs to the end on its worker thread.
+"""
+import asyncio
+import queue
+import threading
+
+# Milliseconds between checks for finished work while any is outstanding
+POLL_MS = 50
+
+
+class AsyncBridge:
+    def __init__(self, root, poll_ms=POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.loop = None
+        self._thread = None
+        # (owner, function, args) to run on the Tk thread; filled from any thread
+        self._calls = queue.SimpleQueue()
+        # owner widget -> futures of its unfinished tasks, until it is destroyed
+        self._owned = {}
+        self._outstanding = 0
+        self._after_id = None
+
+    def _start(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="asyncio", daemon=True)
+        self._thread.start()
+
+    # --- Called on the Tk thread ---------------------------------------------
+
+    def submit(self, coro, on_done=None, owner=None):
+        """Run `coro` on the asyncio loop; returns its concurrent Future."""
+        if self.loop is None:
+            self._start()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        if owner is not None:
+            if owner not in self._owned:
+                self._owned[owner] = set()
+                owner.bind("<Destroy>", lambda event: event.widget is owner and self.cancel(owner), add="+")
+            self._owned[owner].add(future)
+        self._outstanding += 1
+        future.add_done_callback(lambda f: self._calls.put((owner, self._finished, (f, owner, on_done))))
+        self._schedule()
+        return future
+
+    def cancel(self, owner):
+        """Cancel the unfinished tasks of `owner` and drop their callbacks."""
+        for future in self._owned.pop(owner, ()):
+            future.cancel()
+
+    def _schedule(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        self._after_id = None
+        try:
+            while True:
+                try:
+                    owner, func, args = self._calls.get_nowait()
+                except queue.Empty:
+                    break
+                if func == self._finished:
+                    self._outstanding -= 1
+                elif owner is not None and owner not in self._owned:
+                    continue
+                func(*args)
+        finally:
+            if self._outstanding:
+                self._schedule()
+
+    def _finished(self, future, owner, on_done):
+        futures = self._owned.get(owner)
+        if futures is not None:
+            futures.discard(future)
+        elif owner is not None:
+            # The owner was destroyed while this was finishing
+            return
+        if on_done is None or future.cancelled():
+            return
+        error = future.exception()
+        on_done(None if error else future.result(), error)
+
+    def stop(self, timeout=2.0):
+        """Cancel everything still running and stop the loop."""
+        if self.loop is None:
+            return
+        for owner in list(self._owned):
+            self.cancel(owner)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self.loop = None
+
+    # --- Called from any thread ----------------------------------------------
+
+    def post(self, func, *args, owner=None):
+        """Call `func(*args)` on the Tk thread, unless `owner` has gone by then."""
+        self._calls.put((owner, func, args))
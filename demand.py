@@ -0,0 +1,125 @@
+"""Hourly demand per menu item, binned by weekday and hour, with a forecast.
+
+`DemandBins` observes the order store (OrderStore.observe): it is built
+from the history once, in one pass, and after that each order added,
+changed or cancelled moves only its own items' bins, so the demand view
+opens without touching the history. Order dates are "YYYY-MM-DD HH:MM:SS"
+strings; the hour is sliced out and the weekday is computed once per
+distinct day.
+
+The forecast for the coming hour is a moving average: the units sold in
+that hour on the last FORECAST_WEEKS trading days with the same weekday.
+"""
+import datetime
+
+import instrumentation
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+# Same-weekday trading days averaged by the next-hour forecast
+FORECAST_WEEKS = 4
+
+
+class DemandBins:
+    """Units sold per item in a 7 x 24 weekday/hour grid, kept incrementally."""
+    def __init__(self):
+        self.ready = False
+        self._orders = None
+        # item -> [weekday][hour] units
+        self.bins = {}
+        # (day, hour) -> {item: units}, for the moving average
+        self._day_hour = {}
+        # weekday -> {day: orders that day}
+        self._days = [{} for _ in WEEKDAYS]
+        self._weekday_of = {}
+
+    # --- OrderStore observer ----------------------------------------------
+
+    def reset(self, orders):
+        # Defer the full pass until the bins are first needed (see ensure)
+        self.ready = False
+        self._orders = orders
+
+    def order_changed(self, old, new):
+        if not self.ready:
+            # The pending build reads the live history, change included
+            return
+        if old is not None:
+            self._add(old, -1)
+        if new is not None:
+            self._add(new, 1)
+
+    @instrumentation.timed_function("demand_build")
+    def ensure(self):
+        """Build the bins from the history if that hasn't happened yet."""
+        if self.ready:
+            return
+        self.bins = {}
+        self._day_hour = {}
+        self._days = [{} for _ in WEEKDAYS]
+        for order in self._orders or ():
+            self._add(order, 1)
+        self.ready = True
+
+    # --- Binning -------------------------------------------------------------
+
+    def _weekday(self, day):
+        weekday = self._weekday_of.get(day)
+        if weekday is None:
+            weekday = self._weekday_of[day] = datetime.date(int(day[:4]), int(day[5:7]), int(day[8:10])).weekday()
+        return weekday
+
+    def _add(self, order, sign):
+        date = order.get("date", "")
+        try:
+            day, hour = date[:10], int(date[11:13])
+            weekday = self._weekday(day)
+        except ValueError:
+            return
+        days = self._days[weekday]
+        days[day] = days.get(day, 0) + sign
+        if not days[day]:
+            del days[day]
+        slot = self._day_hour.setdefault((day, hour), {})
+        for item in order.get("items", []):
+            name, units = item["name"], item.get("count", 1) * sign
+            grid = self.bins.get(name)
+            if grid is None:
+                grid = self.bins[name] = [[0] * 24 for _ in WEEKDAYS]
+            grid[weekday][hour] += units
+            slot[name] = slot.get(name, 0) + units
+
+    # --- Queries -------------------------------------------------------------
+
+    def grid(self, item=None):
+        """7 x 24 units for one item, or summed over all items."""
+        self.ensure()
+        if item is not None:
+            return self.bins.get(item, [[0] * 24 for _ in WEEKDAYS])
+        total = [[0] * 24 for _ in WEEKDAYS]
+        for grid in self.bins.values():
+            for weekday, row in enumerate(grid):
+                total_row = total[weekday]
+                for hour, units in enumerate(row):
+                    total_row[hour] += units
+        return total
+
+    def forecast(self, when=None, weeks=FORECAST_WEEKS):
+        """Expected units per item for the hour after `when` (default now).
+
+        Returns {item: units}, highest first, averaging that hour over the
+        last `weeks` trading days with the same weekday.
+        """
+        self.ensure()
+        when = (when or datetime.datetime.now()) + datetime.timedelta(hours=1)
+        # Earlier days only: today's later hours haven't happened yet
+        today = when.strftime("%Y-%m-%d")
+        days = sorted(day for day in self._days[when.weekday()] if day < today)[-weeks:]
+        if not days:
+            return {}
+        totals = {}
+        for day in days:
+            for name, units in self._day_hour.get((day, when.hour), {}).items():
+                totals[name] = totals.get(name, 0) + units
+        forecast = {name: units / len(days) for name, units in totals.items() if units > 0}
+        return dict(sorted(forecast.items(), key=lambda kv: -kv[1]))
@@ -0,0 +1,302 @@
+"""Read parts of the orders.json checkpoint by day or order number through mmap.
+
+The checkpoint is written by json.dump(indent=4) (see order_store). Each
+order of the top-level array therefore starts with "\\n    {" and ends with
+"\\n    }", with nested records indented further. Its own "order_number"
+and "date" keys sit at the next indent; lines may also end in "\\r\\n", as
+in checkpoints written by text-mode files on Windows. `HistoryIndex.scan`
+finds these in one regular-expression pass over the mapped file, without
+decoding any order. It records each order's byte span, number and day.
+
+The index is saved beside the checkpoint as `orders.json.index`, stamped
+with the checkpoint's mtime and size. OrderStore writes it after every
+checkpoint, and a missing or stale index is rebuilt on first use.
+
+`HistoryFile` maps the checkpoint and decodes only the orders asked for. It
+decodes up to BATCH_BYTES of neighbouring records at a time; consecutive
+records are already valid JSON array items. A report over one week of a
+year's history touches only that week's pages, and memory stays flat
+however large the file grows. The journal since the checkpoint is short
+and is read whole (order_store.tail_changes).
+
+    python history_index.py --from 2025-10-13 --to 2025-10-13
+    python history_index.py --first 100 --last 150
+"""
+import argparse
+import bisect
+import json
+import mmap
+import os
+import re
+
+import order_store
+
+INDEX_SUFFIX = ".index"
+
+# Neighbouring records decoded together, up to about this many bytes
+BATCH_BYTES = 64 * 1024
+
+# An order's opening and closing brace, and its own number and day
+_TOKENS = re.compile(rb'\r?\n    (\{)|\r?\n    \}|\r?\n        "order_number": (\d+)|\r?\n        "date": "(\d{4}-\d\d-\d\d)')
+
+# What json.dump(indent=4) puts before the first order and between orders
+_HEAD = (b"[\n    ", b"[\r\n    ")
+_GAP = (b",\n    ", b",\r\n    ")
+
+
+class HistoryIndex:
+    """Byte spans, numbers and days of the orders in one checkpoint file.
+
+    Queries return runs: sorted, non-overlapping (first, end) ranges of
+    record positions in the file.
+    """
+    def __init__(self, base, starts, ends, numbers, day_runs):
+        # (mtime_ns, size) of the file indexed
+        self.base = base
+        self.starts = starts
+        self.ends = ends
+        self.numbers = numbers
+        # [day, first, end] for each run of consecutive records on one day
+        self.day_runs = day_runs
+        if all(a < b for a, b in zip(numbers, numbers[1:])):
+            self._by_number = None
+        else:
+            # Not in number order (merged by hand?): look numbers up in a sorted copy
+            self._by_number = sorted(range(len(numbers)), key=numbers.__getitem__)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def scan(cls, data, base):
+        """Index the checkpoint contents `data` (bytes or an mmap)."""
+        starts, ends, numbers, day_runs = [], [], [], []
+        start = number = None
+        day = ""
+        for match in _TOKENS.finditer(data):
+            brace, digits, date = match.groups()
+            if brace:
+                start, number, day = match.start(1), None, ""
+            elif digits:
+                number = int(digits)
+            elif date:
+                day = date.decode("ascii")
+            elif start is not None:
+                if number is None:
+                    raise ValueError(f"Order at byte {start} has no order_number")
+                if day_runs and day_runs[-1][0] == day:
+                    day_runs[-1][2] += 1
+                else:
+                    day_runs.append([day, len(starts), len(starts) + 1])
+                starts.append(start)
+                ends.append(match.end())
+                numbers.append(number)
+                start = None
+        # Anything between the records means the file isn't laid out as
+        # order_store writes it, and the spans can't be trusted
+        if starts:
+            laid_out = data[:starts[0]] in _HEAD and data[ends[-1]:].strip() == b"]" \
+                and all(data[end:start] in _GAP for end, start in zip(ends, starts[1:]))
+        else:
+            laid_out = len(data) < 64 and bytes(data[:]).strip() in (b"", b"[]")
+        if not laid_out:
+            raise ValueError("Not an order checkpoint written by order_store")
+        return cls(base, starts, ends, numbers, day_runs)
+
+    @classmethod
+    def read(cls, index_path, base):
+        """The index saved at `index_path` if it was built for `base`, else None."""
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if data.get("base") != list(base):
+            return None
+        return cls(tuple(data["base"]), data["starts"], data["ends"], data["numbers"], data["days"])
+
+    def save(self, index_path):
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"base": list(self.base), "starts": self.starts, "ends": self.ends,
+                       "numbers": self.numbers, "days": self.day_runs}, f, separators=(",", ":"))
+        os.replace(tmp_path, index_path)
+
+    # --- Queries -------------------------------------------------------------
+
+    def for_days(self, date_from=None, date_to=None):
+        """Runs of the records dated within [date_from, date_to] ("YYYY-MM-DD")."""
+        runs = [(first, end) for day, first, end in self.day_runs
+                if not (date_from and day < date_from) and not (date_to and day > date_to)]
+        return _merge(runs)
+
+    def for_numbers(self, first=None, last=None):
+        """Runs of the records numbered within [first, last]."""
+        if self._by_number is None:
+            lo = bisect.bisect_left(self.numbers, first) if first is not None else 0
+            hi = bisect.bisect_right(self.numbers, last) if last is not None else len(self.numbers)
+            return [(lo, hi)] if lo < hi else []
+        keys = [self.numbers[i] for i in self._by_number]
+        lo = bisect.bisect_left(keys, first) if first is not None else 0
+        hi = bisect.bisect_right(keys, last) if last is not None else len(keys)
+        return _merge((i, i + 1) for i in sorted(self._by_number[lo:hi]))
+
+    def select(self, date_from=None, date_to=None, first=None, last=None):
+        """Runs of the records matching both the day and the number bounds."""
+        runs = [(0, len(self))] if len(self) else []
+        if date_from or date_to:
+            runs = _intersect(runs, self.for_days(date_from, date_to))
+        if first is not None or last is not None:
+            runs = _intersect(runs, self.for_numbers(first, last))
+        return runs
+
+    def spans(self, runs):
+        """Byte spans covering `runs`, each one batch of neighbouring records."""
+        for first, end in runs:
+            i = first
+            while i < end:
+                j = i + 1
+                while j < end and self.ends[j] - self.starts[i] <= BATCH_BYTES:
+                    j += 1
+                yield self.starts[i], self.ends[j - 1]
+                i = j
+
+
+def _merge(runs):
+    merged = []
+    for first, end in runs:
+        if merged and merged[-1][1] == first:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((first, end))
+    return merged
+
+
+def _intersect(a, b):
+    out, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        first, end = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if first < end:
+            out.append((first, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+
+class HistoryFile:
+    """A checkpoint file mapped read-only, with its index loaded on demand.
+
+    Use as a context manager. On Windows a mapped file can't be replaced,
+    so hold it only as long as a read takes, or map a snapshot (as reports
+    do). `index_path` defaults to the file's own path plus INDEX_SUFFIX.
+    """
+    def __init__(self, path=order_store.ORDERS_FILE, index_path=None):
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        self._file = None
+        self._map = b""
+        self._base = None
+        self._index = None
+
+    def __enter__(self):
+        try:
+            self._file = open(self.path, "rb")
+        except FileNotFoundError:
+            self._base = (0, 0)
+            return self
+        st = os.fstat(self._file.fileno())
+        self._base = (st.st_mtime_ns, st.st_size)
+        if st.st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = b""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = HistoryIndex.read(self.index_path, self._base)
+            if self._index is None:
+                self._index = HistoryIndex.scan(self._map, self._base)
+                if self._file is not None:
+                    try:
+                        self._index.save(self.index_path)
+                    except OSError:
+                        # Read-only media: rebuilt next time
+                        pass
+        return self._index
+
+    def decode(self, spans):
+        """Yield the orders in byte `spans` (from HistoryIndex.spans)."""
+        for start, end in spans:
+            yield from json.loads(b"[" + self._map[start:end] + b"]")
+
+    def orders(self, runs):
+        """Yield the orders in record `runs`, in file order."""
+        return self.decode(self.index.spans(runs))
+
+
+def write_index(path=order_store.ORDERS_FILE):
+    """(Re)build and save the index of the checkpoint at `path`."""
+    with HistoryFile(path) as history:
+        index = HistoryIndex.scan(history._map, history._base)
+        index.save(history.index_path)
+    return index
+
+
+def read_orders(path=order_store.ORDERS_FILE, date_from=None, date_to=None, first=None, last=None):
+    """Yield the current orders dated within [date_from, date_to] and
+    numbered within [first, last], decoding only those of the checkpoint.
+    Journalled changes are applied as in order_export.iter_current_orders."""
+    def wanted(order):
+        day, number = order.get("date", "")[:10], order["order_number"]
+        return not ((date_from and day < date_from) or (date_to and day > date_to)
+                    or (first is not None and number < first) or (last is not None and number > last))
+
+    # The journal first: a checkpoint taken in between only moves changes
+    # into the file, while one taken after would delete segments unread
+    changes = order_store.tail_changes(path)
+    with HistoryFile(path) as history:
+        for order in history.orders(history.index.select(date_from, date_to, first, last)):
+            number = order["order_number"]
+            if number in changes:
+                order = changes.pop(number)
+                if order is None or not wanted(order):
+                    continue
+            yield order
+    # Orders taken since the checkpoint, or moved into the range by a change
+    for order in changes.values():
+        if order is not None and wanted(order):
+            yield order
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print one day's or one range's orders without loading the history.")
+    parser.add_argument("--source", default=order_store.ORDERS_FILE, help="order store (default orders.json)")
+    parser.add_argument("--from", dest="date_from", metavar="YYYY-MM-DD", help="first day")
+    parser.add_argument("--to", dest="date_to", metavar="YYYY-MM-DD", help="last day")
+    parser.add_argument("--first", type=int, help="lowest order number")
+    parser.add_argument("--last", type=int, help="highest order number")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the index first")
+    args = parser.parse_args(argv)
+    if args.rebuild:
+        write_index(args.source)
+    for order in read_orders(args.source, args.date_from, args.date_to, args.first, args.last):
+        items = ", ".join(f"{item.get('count', 1)}x {item['name']}" for item in order.get("items", []))
+        print(f"#{order['order_number']:<6} {order.get('date', ''):<20} {'$' + str(order.get('total', 0)):>6}  "
+              f"{'paid' if order.get('paid') else 'unpaid':<7} {items}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Lightweight timing hooks for the cafe system.
+
+Wrap a block in `timed("name")` or decorate a function with
+`timed_function("name")` and each call's duration is kept in a rolling
+window of recent samples for that name. Timing is off by default; while it
+is off the hooks skip the clock entirely, so they can stay on hot paths.
+Turn it on with `enable()`, the `--instrument` launch flag of Final.py or
+the CAFE_INSTRUMENT=1 environment variable.
+"""
+import collections
+import contextlib
+import datetime
+import functools
+import os
+import time
+
+# Number of recent samples kept per timer; older samples roll off.
+HISTORY_SIZE = 2048
+
+_enabled = os.environ.get("CAFE_INSTRUMENT", "") not in ("", "0")
+_samples = {}
+_NULL_TIMER = contextlib.nullcontext()
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def is_enabled():
+    return _enabled
+
+
+def record(name, seconds):
+    # Store one sample; creates the rolling window on first use
+    window = _samples.get(name)
+    if window is None:
+        window = _samples[name] = collections.deque(maxlen=HISTORY_SIZE)
+    window.append(seconds)
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def timed(name):
+    """Context manager timing the enclosed block under `name`."""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def timed_function(name):
+    """Decorator timing every call of the wrapped function under `name`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summary():
+    """Return {name: {"count", "p50", "p95", "p99", "max"}} in milliseconds."""
+    stats = {}
+    for name, window in sorted(_samples.items()):
+        values = sorted(window)
+        stats[name] = {
+            "count": len(values),
+            "p50": percentile(values, 50) * 1000,
+            "p95": percentile(values, 95) * 1000,
+            "p99": percentile(values, 99) * 1000,
+            "max": values[-1] * 1000 if values else 0.0,
+        }
+    return stats
+
+
+def format_summary(stats=None):
+    stats = summary() if stats is None else stats
+    lines = [f"{'timer':<28}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+    for name, s in stats.items():
+        lines.append(f"{name:<28}{s['count']:>8}{s['p50']:>10.2f}{s['p95']:>10.2f}{s['p99']:>10.2f}{s['max']:>10.2f}")
+    return "\n".join(lines)
+
+
+def dump(path):
+    """Append a timestamped percentile table to `path` and return the path."""
+    stamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"# Timings at {stamp}\n{format_summary()}\n\n")
+    return path
+
+
+def reset():
+    _samples.clear()
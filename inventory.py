@@ -0,0 +1,300 @@
+"""Ingredient stock, used up by recorded orders through each item's recipe.
+
+`stock.json` holds {"levels": {ingredient: amount}, "low": {ingredient:
+threshold}}; changes since it was written sit in a journal beside it,
+`stock.json.journal.<generation>`, one JSON line per change:
+  {"op": "adjust", "reason": "order" | "cancel" | "restock", "order": n,
+   "delta": {ingredient: amount}}
+  {"op": "set", "ingredient": name, "level": amount[, "low": threshold]}
+An order's ingredients go in one "adjust" line, so the write per order is a
+few dozen bytes. Lines are appended by a background thread; the till's
+in-memory levels change at once. Every COMPACT_AFTER lines the journal is
+folded into a new stock.json with the next generation number (deltas add
+up, so unlike users.json an old journal must never be replayed onto a
+newer base). Only ingredients with a level are tracked; the rest are
+treated as unlimited.
+
+An item is unavailable while any ingredient in its recipe is at or below
+its low threshold (0 unless set). `unavailable` is a bitmask over the menu
+(bit i for MENU_ITEMS[i]), updated only for the ingredients a change
+touched, so the order screen can compare it with the one it last drew.
+
+    python inventory.py show
+    python inventory.py set milk_ml 20000 --low 2000
+    python inventory.py restock milk_ml 10000
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+import metrics
+from locks import file_lock, stat_stamp
+
+STOCK_FILE = os.path.join(os.path.dirname(__file__), "stock.json")
+
+# Journal lines folded into stock.json at a time
+COMPACT_AFTER = 200
+
+
+class Inventory:
+    def __init__(self, path=STOCK_FILE, menu_items=(), recipes=None):
+        self.path = path
+        self.recipes = recipes or {}
+        self.generation = 0
+        # Levels as written to the files, and as this till sees them: the
+        # latter also holds changes the writer thread hasn't appended yet
+        self._committed = {}
+        self.levels = {}
+        self.low = {}
+        self.unavailable = 0
+        self._low_set = set()
+        # ingredient -> bitmask of the menu items that use it
+        self._users_of = {}
+        for i, item in enumerate(menu_items):
+            for ingredient in self.recipes.get(item["name"], {}):
+                self._users_of[ingredient] = self._users_of.get(ingredient, 0) | (1 << i)
+        self._stamp = None
+        self._offset = 0
+        self._entries = 0
+        self._unwritten = []
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = None
+        self.error = None
+        with self._lock:
+            self._refresh()
+
+    def _journal_path(self, generation=None):
+        return f"{self.path}.journal.{self.generation if generation is None else generation}"
+
+    # --- Reading -------------------------------------------------------------
+
+    def refresh(self):
+        """Pick up other tills' changes; returns True if the bitmask changed."""
+        before = self.unavailable
+        with self._lock:
+            self._refresh()
+        return self.unavailable != before
+
+    def _refresh(self):
+        stamp = stat_stamp(self.path)
+        if stamp != self._stamp:
+            self._load(stamp)
+        self._read_journal()
+
+    def _load(self, stamp):
+        data = {}
+        if stamp is not None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                data = {}
+        self._stamp = stamp
+        self.generation = data.get("generation", 0)
+        self._committed = dict(data.get("levels", {}))
+        self.low = dict(data.get("low", {}))
+        self._offset = 0
+        self._entries = 0
+        self._read_journal(rebuild=True)
+
+    def _read_journal(self, rebuild=False):
+        try:
+            with open(self._journal_path(), "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except OSError:
+            data = b""
+        # A line still being written by another till has no newline yet
+        end = data.rfind(b"\n") + 1
+        lines = [line for line in data[:end].splitlines() if line.strip()]
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Torn by a till that crashed mid-append; skip it
+                continue
+            self._apply(self._committed, entry)
+        self._offset += end
+        self._entries += len(lines)
+        if rebuild:
+            self._low_set = set()
+        if lines or rebuild:
+            # Ours still on their way to the journal go back on top
+            self.levels = dict(self._committed)
+            for entry in self._unwritten:
+                self._apply(self.levels, entry)
+            self._update_available(self.levels)
+
+    def _apply(self, levels, entry):
+        if entry["op"] == "adjust":
+            for ingredient, amount in entry["delta"].items():
+                if ingredient in levels:
+                    levels[ingredient] += amount
+        elif entry["op"] == "set":
+            levels[entry["ingredient"]] = entry["level"]
+            if "low" in entry and levels is self._committed:
+                self.low[entry["ingredient"]] = entry["low"]
+
+    def _update_available(self, ingredients):
+        for ingredient in ingredients:
+            level = self.levels.get(ingredient)
+            if level is not None and level <= self.low.get(ingredient, 0):
+                self._low_set.add(ingredient)
+            else:
+                self._low_set.discard(ingredient)
+        mask = 0
+        for ingredient in self._low_set:
+            mask |= self._users_of.get(ingredient, 0)
+        self.unavailable = mask
+
+    def available(self, index):
+        return not self.unavailable >> index & 1
+
+    def low_ingredients(self):
+        return sorted(self._low_set)
+
+    # --- Changes -------------------------------------------------------------
+
+    def _usage(self, items, sign):
+        delta = {}
+        for item in items:
+            for ingredient, amount in self.recipes.get(item["name"], {}).items():
+                delta[ingredient] = delta.get(ingredient, 0) + sign * amount * item.get("count", 1)
+        return delta
+
+    def consume(self, number, items):
+        """Take a recorded order's ingredients out of stock."""
+        self._change({"op": "adjust", "reason": "order", "order": number, "delta": self._usage(items, -1)})
+
+    def restore(self, number, items):
+        """Put a cancelled order's ingredients back."""
+        self._change({"op": "adjust", "reason": "cancel", "order": number, "delta": self._usage(items, 1)})
+
+    def restock(self, ingredient, amount):
+        self._change({"op": "adjust", "reason": "restock", "delta": {ingredient: amount}})
+
+    def set_level(self, ingredient, level, low=None):
+        entry = {"op": "set", "ingredient": ingredient, "level": level}
+        if low is not None:
+            entry["low"] = low
+            self.low[ingredient] = low
+        self._change(entry)
+
+    def _change(self, entry):
+        if entry["op"] == "adjust" and not any(ingredient in self.levels for ingredient in entry["delta"]):
+            return
+        with self._lock:
+            self._unwritten.append(entry)
+            self._apply(self.levels, entry)
+            self._update_available(entry["delta"] if entry["op"] == "adjust" else [entry["ingredient"]])
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="stock-writer", daemon=True)
+            self._writer.start()
+        self._queue.put(True)
+
+    # --- Background writer ---------------------------------------------------
+
+    def _write_loop(self):
+        # Each queued token is a wake-up; one pass writes every change made
+        # by then, so a burst of orders becomes a single append
+        while True:
+            stopping = self._queue.get() is None
+            while not stopping:
+                try:
+                    stopping = self._queue.get_nowait() is None
+                except queue.Empty:
+                    break
+            if self._unwritten:
+                try:
+                    self._write()
+                    self.error = None
+                except OSError as e:
+                    # Kept in _unwritten and tried again on the next wake-up
+                    self.error = str(e)
+            if stopping:
+                break
+
+    def _write(self):
+        start = time.perf_counter()
+        with file_lock(self.path), self._lock:
+            # Other tills' lines first, so ours go after the journal's end
+            self._refresh()
+            pending = list(self._unwritten)
+            data = b"".join((json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8") for entry in pending)
+            with open(self._journal_path(), "ab") as f:
+                if f.tell() > self._offset:
+                    # Past the last complete line: a crashed till's torn write
+                    f.truncate(self._offset)
+                f.write(data)
+            for entry in pending:
+                self._apply(self._committed, entry)
+            del self._unwritten[:len(pending)]
+            self._offset += len(data)
+            self._entries += len(pending)
+            if self._entries >= COMPACT_AFTER:
+                self._write_base()
+        metrics.record_write("stock", time.perf_counter() - start, len(data))
+
+    def _write_base(self):
+        # New generation first, then its empty journal, then drop the old
+        # journal; a till still on the old base reloads when its stamp moves
+        old_journal = self._journal_path()
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"generation": self.generation + 1, "levels": self._committed, "low": self.low}, f, indent=4)
+        open(self._journal_path(self.generation + 1), "ab").close()
+        os.replace(tmp_path, self.path)
+        self.generation += 1
+        self._stamp = stat_stamp(self.path)
+        self._offset = 0
+        self._entries = 0
+        try:
+            os.remove(old_journal)
+        except OSError:
+            pass
+
+    def files(self):
+        """Paths of the stock file and its current journal, where present."""
+        return [p for p in (self.path, self._journal_path()) if os.path.exists(p)]
+
+    def stop(self):
+        """Wait for changes made so far to reach the journal."""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingredient stock levels.")
+    parser.add_argument("--file", default=STOCK_FILE, help="stock file (default stock.json)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("show", help="list tracked ingredients")
+    set_cmd = sub.add_parser("set", help="set an ingredient's level (starts tracking it)")
+    set_cmd.add_argument("ingredient")
+    set_cmd.add_argument("level", type=float)
+    set_cmd.add_argument("--low", type=float, help="low-stock threshold")
+    restock = sub.add_parser("restock", help="add to an ingredient's level")
+    restock.add_argument("ingredient")
+    restock.add_argument("amount", type=float)
+    args = parser.parse_args(argv)
+
+    inventory = Inventory(args.file)
+    if args.command == "set":
+        inventory.set_level(args.ingredient, args.level, args.low)
+    elif args.command == "restock":
+        if args.ingredient not in inventory.levels:
+            parser.error(f"{args.ingredient} is not tracked; use 'set' first")
+        inventory.restock(args.ingredient, args.amount)
+    inventory.stop()
+    for ingredient, level in sorted(inventory.levels.items()):
+        flag = "  LOW" if level <= inventory.low.get(ingredient, 0) else ""
+        print(f"{ingredient:<20} {level:>10g}  (low at {inventory.low.get(ingredient, 0):g}){flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Headless multi-terminal load test of the order flow.
+
+Starts N simulated tills as separate processes against one shared order
+store. Each till behaves like a running Final.App: it loads the history
+once at startup, then replays a mix of actions through the app's own code
+(App.record_order -> OrderStore.add, mark_order_paid, cancel_order) at a
+Poisson arrival rate. Afterwards the shared store is checked against what
+every till believes it wrote.
+
+Usage:
+    python loadtest.py --terminals 10 --duration 30 --rate 2
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import Final
+import inventory
+import order_store
+import prep_queue
+from instrumentation import percentile
+
+# Relative weights of the simulated till actions
+DEFAULT_MIX = {"submit": 35, "checkout": 35, "mark_paid": 15, "cancel": 5, "history": 10}
+
+
+class HeadlessTerminal:
+    """Just enough of Final.App's state for its order methods to run.
+
+    The methods are borrowed from Final.App unchanged, so the test
+    exercises the real record/save path rather than a copy of it.
+    """
+    record_order = Final.App.record_order
+    mark_order_paid = Final.App.mark_order_paid
+    cancel_order = Final.App.cancel_order
+    update_order_gauges = Final.App.update_order_gauges
+    printer = None
+
+    def __init__(self, name):
+        self.username = name
+        self.order_store = order_store.OrderStore(Final.ORDERS_FILE)
+        self.order_history = self.order_store.orders
+        self.inventory = inventory.Inventory(Final.STOCK_FILE, Final.MENU_ITEMS, Final.RECIPES)
+        self.cart = Final.Cart()
+        # Tills take a mix of order types, as at a counter with a delivery app
+        self.order_type = prep_queue.ORDER_TYPES[int(name[1:]) % len(prep_queue.ORDER_TYPES)]
+
+
+def _fill_cart(terminal, rng):
+    terminal.cart = Final.Cart()
+    for item in rng.sample(Final.MENU_ITEMS, rng.randint(1, 4)):
+        terminal.cart.add(item, rng.randint(1, 3))
+
+
+def _history_view(terminal):
+    # The data side of OrderHistoryScreen: newest first, one line per order
+    lines = []
+    for order in reversed(terminal.order_history):
+        items = ", ".join(f"{item.get('count', 1)}x {item['name']}" for item in order["items"])
+        lines.append(f"#{order['order_number']} {order['staff']} {items} ${order['total']}")
+    return len(lines)
+
+
+def run_terminal(index, store_path, duration, rate, mix, seed, start_at):
+    """Worker process body; returns the till's action log."""
+    Final.ORDERS_FILE = store_path
+    Final.STOCK_FILE = os.path.join(os.path.dirname(store_path), "stock.json")
+    rng = random.Random(seed + index)
+    name = f"T{index:02d}"
+    actions, weights = zip(*mix.items())
+    while time.time() < start_at:
+        time.sleep(0.001)
+    terminal = HeadlessTerminal(name)
+    log = {"latency": collections.defaultdict(list), "recorded": [], "cancelled": [], "skipped": 0}
+    deadline = time.monotonic() + duration
+    next_at = time.monotonic()
+    while True:
+        next_at += rng.expovariate(rate)
+        delay = next_at - time.monotonic()
+        if next_at >= deadline:
+            break
+        if delay > 0:
+            time.sleep(delay)
+        action = rng.choices(actions, weights)[0]
+        start = time.perf_counter()
+        if action in ("submit", "checkout"):
+            _fill_cart(terminal, rng)
+            number = terminal.record_order(paid=action == "checkout")
+            log["recorded"].append([name, number])
+        elif action in ("mark_paid", "cancel"):
+            unpaid = [i for i, order in enumerate(terminal.order_history) if not order.get("paid")]
+            if not unpaid:
+                log["skipped"] += 1
+                continue
+            order = terminal.order_history[rng.choice(unpaid)]
+            if action == "mark_paid":
+                terminal.mark_order_paid(order["order_number"])
+            else:
+                log["cancelled"].append([order["staff"], order["order_number"]])
+                terminal.cancel_order(order["order_number"])
+        else:
+            _history_view(terminal)
+        log["latency"][action].append(time.perf_counter() - start)
+    # Let a checkpoint this till started finish before the store is checked
+    terminal.order_store.wait()
+    terminal.inventory.stop()
+    return log
+
+
+def _read_store(path):
+    # Checkpoint plus journal tail, as the next till to start would see it
+    try:
+        return order_store.OrderStore(path).orders, None
+    except (OSError, ValueError) as e:
+        return [], str(e)
+
+
+def analyse(logs, store_path, wall_time):
+    """Compare the tills' logs with the shared store and build a report."""
+    latency = collections.defaultdict(list)
+    recorded, cancelled, skipped = [], set(), 0
+    for log in logs:
+        for action, values in log["latency"].items():
+            latency[action].extend(values)
+        recorded.extend(tuple(key) for key in log["recorded"])
+        cancelled.update(tuple(key) for key in log["cancelled"])
+        skipped += log["skipped"]
+
+    stored, error = _read_store(store_path)
+    stored_keys = collections.Counter((order.get("staff"), order.get("order_number")) for order in stored)
+    expected = set(recorded) - cancelled
+    issued = collections.defaultdict(set)
+    for staff, number in recorded:
+        issued[number].add(staff)
+    in_store = collections.defaultdict(set)
+    for staff, number in stored_keys:
+        in_store[number].add(staff)
+
+    ops = sum(len(values) for values in latency.values())
+    report = {
+        "terminals": len(logs),
+        "wall_seconds": round(wall_time, 3),
+        "operations": ops,
+        "throughput_ops_per_s": round(ops / wall_time, 2) if wall_time else 0.0,
+        "skipped_no_unpaid_order": skipped,
+        "latency_ms": {},
+        "orders_recorded": len(recorded),
+        "orders_cancelled": len(cancelled),
+        "orders_in_store": len(stored),
+        "lost_orders": len(expected - set(stored_keys)),
+        "duplicated_orders": sum(count - 1 for count in stored_keys.values() if count > 1),
+        "number_collisions_issued": sum(1 for staffs in issued.values() if len(staffs) > 1),
+        "number_collisions_in_store": sum(1 for staffs in in_store.values() if len(staffs) > 1),
+        "store_error": error,
+    }
+    for action, values in sorted(latency.items()):
+        values.sort()
+        report["latency_ms"][action] = {
+            "count": len(values),
+            "p50": round(percentile(values, 50) * 1000, 3),
+            "p99": round(percentile(values, 99) * 1000, 3),
+            "max": round(values[-1] * 1000, 3),
+        }
+    return report
+
+
+def format_report(report):
+    lines = [
+        f"Terminals: {report['terminals']}   wall time: {report['wall_seconds']} s",
+        f"Throughput: {report['throughput_ops_per_s']} ops/s ({report['operations']} ops, "
+        f"{report['skipped_no_unpaid_order']} skipped with no unpaid order)",
+        "",
+        f"{'action':<12}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for action, s in report["latency_ms"].items():
+        lines.append(f"{action:<12}{s['count']:>8}{s['p50']:>10.2f}{s['p99']:>10.2f}{s['max']:>10.2f}")
+    lines += [
+        "",
+        f"Orders recorded: {report['orders_recorded']}   cancelled: {report['orders_cancelled']}   "
+        f"in store: {report['orders_in_store']}",
+        f"Lost orders: {report['lost_orders']}",
+        f"Duplicated orders: {report['duplicated_orders']}",
+        f"Order numbers issued by more than one till: {report['number_collisions_issued']}",
+        f"Order numbers shared by different orders in the store: {report['number_collisions_in_store']}",
+    ]
+    if report["store_error"]:
+        lines.append(f"Store unreadable at the end: {report['store_error']}")
+    return "\n".join(lines)
+
+
+def _prefill(store_path, count, seed):
+    # Paid history so each save writes a realistically sized file
+    rng = random.Random(seed)
+    orders = []
+    for number in range(1, count + 1):
+        items = [{"name": item["name"], "price": item["price"], "count": rng.randint(1, 3)}
+                 for item in rng.sample(Final.MENU_ITEMS, rng.randint(1, 4))]
+        orders.append({"order_number": number, "items": items,
+                       "total": sum(item["price"] * item["count"] for item in items),
+                       "staff": "History", "paid": True, "date": "2025-01-01 09:00:00"})
+    with open(store_path, "w", encoding="utf-8") as f:
+        json.dump(orders, f, indent=4)
+
+
+def parse_mix(text):
+    # "submit=35,checkout=35,..." -> dict of weights
+    mix = {}
+    for part in text.split(","):
+        action, _, weight = part.partition("=")
+        if action not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown action {action!r}")
+        mix[action] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate several tills sharing one order store.")
+    parser.add_argument("--terminals", type=int, default=5, help="simulated tills (default 5)")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of traffic (default 20)")
+    parser.add_argument("--rate", type=float, default=2.0, help="actions per second per till (default 2)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="action weights, e.g. submit=35,checkout=35,mark_paid=15,cancel=5,history=10")
+    parser.add_argument("--history", type=int, default=500, help="paid orders in the store beforehand (default 500)")
+    parser.add_argument("--store", help="order store to use (default: a fresh temporary file)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    tmp_dir = None
+    store_path = args.store
+    if store_path is None:
+        tmp_dir = tempfile.mkdtemp(prefix="cafe-loadtest-")
+        store_path = os.path.join(tmp_dir, "orders.json")
+    if args.history and not os.path.exists(store_path):
+        _prefill(store_path, args.history, args.seed)
+    try:
+        start_at = time.time() + 1.0
+        jobs = [(i, store_path, args.duration, args.rate, args.mix, args.seed, start_at)
+                for i in range(args.terminals)]
+        with multiprocessing.Pool(args.terminals) as pool:
+            logs = pool.starmap(run_terminal, jobs)
+        report = analyse(logs, store_path, time.time() - start_at)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(format_report(report))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Cross-process file locks and change stamps shared by the data stores.
+
+`file_lock(path)` is held by whoever creates `<path>.lock` first. It is not
+reentrant: a process that takes it twice waits on itself (see
+OrderStore._locked for a store that needs that). A lock older than
+LOCK_TIMEOUT is taken to have been left by a till that crashed mid-write.
+A waiter takes it over by renaming it aside, so only one of several
+waiters can win. `stat_stamp(path)` is the (mtime, size) pair the stores
+compare to tell whether another till has changed a file.
+"""
+import contextlib
+import os
+import time
+
+# Seconds a lock may be held before another till assumes its holder died
+LOCK_TIMEOUT = 5.0
+
+
+@contextlib.contextmanager
+def file_lock(path, timeout=LOCK_TIMEOUT):
+    lock_path = path + ".lock"
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            _steal_if_stale(lock_path, timeout)
+            time.sleep(0.005)
+    try:
+        yield
+    finally:
+        try:
+            # Only remove the lock file if it is still ours (not stolen
+            # after a stall longer than the timeout)
+            if os.path.samestat(os.fstat(fd), os.stat(lock_path)):
+                os.remove(lock_path)
+        except OSError:
+            pass
+        os.close(fd)
+
+
+def _steal_if_stale(lock_path, timeout):
+    try:
+        st = os.stat(lock_path)
+    except OSError:
+        return
+    if time.time() - st.st_mtime <= timeout:
+        return
+    # Rename, not remove: of several waiters only one can move the file
+    stale_path = f"{lock_path}.{os.getpid()}.{time.monotonic_ns()}.stale"
+    try:
+        os.rename(lock_path, stale_path)
+    except OSError:
+        return
+    try:
+        if not os.path.samestat(st, os.stat(stale_path)):
+            # It was released and taken afresh since the stat: hand the new
+            # holder its lock back (link never replaces an existing file)
+            os.link(stale_path, lock_path)
+        os.remove(stale_path)
+    except OSError:
+        pass
+
+
+def stat_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
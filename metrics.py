@@ -0,0 +1,148 @@
+"""Counters, gauges and histograms exported in Prometheus textfile format.
+
+The till records business and persistence metrics here as they happen
+(cheap in-memory updates on the Tk thread). When a textfile path is
+configured, `TextfileExporter` rewrites that file on a background timer so
+a node exporter's textfile collector can scrape it; the Tk loop never
+waits on that write.
+"""
+import os
+import threading
+
+# Upper bounds (seconds) of the write latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+def describe(name, kind, help_text):
+    """Register metric `name` as a "counter", "gauge" or "histogram"."""
+    with _lock:
+        _metrics.setdefault(name, {"kind": kind, "help": help_text, "series": {}})
+
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+def inc(name, amount=1, labels=None):
+    key = _label_str(labels)
+    with _lock:
+        series = _metrics[name]["series"]
+        series[key] = series.get(key, 0) + amount
+
+
+def set_gauge(name, value, labels=None):
+    with _lock:
+        _metrics[name]["series"][_label_str(labels)] = value
+
+
+def observe(name, value, labels=None):
+    key = _label_str(labels)
+    with _lock:
+        series = _metrics[name]["series"]
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+
+
+def value(name, labels=None):
+    # Current value of a counter or gauge series (0 if never set)
+    with _lock:
+        return _metrics[name]["series"].get(_label_str(labels), 0)
+
+
+def _with_label(key, extra):
+    # Merge an extra label (le="...") into a rendered label string
+    if not key:
+        return "{" + extra + "}"
+    return key[:-1] + "," + extra + "}"
+
+
+def render():
+    """Return every metric in Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for name, metric in sorted(_metrics.items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            for key, val in sorted(metric["series"].items()):
+                if metric["kind"] != "histogram":
+                    lines.append(f"{name}{key} {val}")
+                    continue
+                bounds = [str(b) for b in LATENCY_BUCKETS] + ["+Inf"]
+                for bound, count in zip(bounds, val["buckets"] + [val["count"]]):
+                    le = _with_label(key, 'le="%s"' % bound)
+                    lines.append(f"{name}_bucket{le} {count}")
+                lines.append(f"{name}_sum{key} {val['sum']}")
+                lines.append(f"{name}_count{key} {val['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    # Write to a temp file and rename so the collector never reads a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+def record_write(store, seconds, nbytes):
+    """Record one persistence write of `nbytes` to `store` taking `seconds`."""
+    observe("cafe_persistence_write_seconds", seconds, {"store": store})
+    inc("cafe_persistence_bytes_written_total", nbytes, {"store": store})
+
+
+class TextfileExporter:
+    """Rewrites a textfile-collector file every `interval` seconds."""
+    def __init__(self, path, interval=15.0):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # Signal the thread and write a final copy so the last values are kept
+        self._stop.set()
+        self._thread.join(timeout=self.interval)
+        self._write()
+
+    def _write(self):
+        try:
+            write_textfile(self.path)
+        except OSError:
+            # A missing or read-only collector dir must never take the till down
+            pass
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._write()
+
+
+describe("cafe_orders_recorded_total", "counter", "Orders recorded at this till.")
+describe("cafe_orders_paid_total", "counter", "Orders marked as paid (at checkout or later).")
+describe("cafe_orders_cancelled_total", "counter", "Unpaid orders cancelled from the order list.")
+describe("cafe_orders_unpaid", "gauge", "Orders currently recorded but not yet paid.")
+describe("cafe_revenue_dollars", "gauge", "Total value of paid orders in the order history.")
+describe("cafe_persistence_write_seconds", "histogram", "Time taken to write a data file.")
+describe("cafe_persistence_bytes_written_total", "counter", "Bytes written to data files.")
+describe("cafe_replication_lag_seconds", "gauge", "Seconds since the standby order store was last known to be current.")
+describe("cafe_tickets_printed_total", "counter", "Receipts, kitchen tickets and PDF receipts written.")
+describe("cafe_tickets_failed_total", "counter", "Receipts and tickets given up on after retries or a full print queue.")
+
+# Unlabelled series start at zero so they are exported before the first event
+for _name in ("cafe_orders_recorded_total", "cafe_orders_paid_total", "cafe_orders_cancelled_total",
+              "cafe_orders_unpaid", "cafe_revenue_dollars"):
+    inc(_name, 0)
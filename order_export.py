@@ -0,0 +1,190 @@
+"""Streaming export of the order history to CSV or JSON Lines.
+
+Orders are read from `orders.json` one record at a time with an
+incremental JSON decoder, brought up to date with the order journal (see
+order_store), passed through generator filters and written straight out,
+so memory use stays flat however long the history gets.
+
+Usage:
+    python order_export.py out.csv --format lines --from 2025-10-01 --to 2025-10-31 --paid
+"""
+import argparse
+import csv
+import json
+import os
+
+import order_store
+
+ORDERS_FILE = os.path.join(os.path.dirname(__file__), "orders.json")
+
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = ("orders", "lines", "jsonl")
+
+ORDER_COLUMNS = ["order_number", "date", "staff", "paid", "total", "item_count"]
+LINE_COLUMNS = ["order_number", "date", "staff", "paid", "item", "price", "count", "line_total"]
+
+
+def iter_orders(path=ORDERS_FILE, progress=None, chunk_size=CHUNK_SIZE):
+    """Yield the orders of a JSON array file one at a time.
+
+    Only the current chunk and the record being decoded are held in memory.
+    `progress(chars_read)` is called after every chunk read. A missing or
+    empty file yields nothing; a malformed one raises ValueError.
+    """
+    if not os.path.exists(path):
+        return
+    decoder = json.JSONDecoder()
+    chars_read = 0
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos = "", 0
+        expect = "["
+        while True:
+            # Skip whitespace, refilling the buffer once it is used up
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf):
+                    break
+                buf, pos = f.read(chunk_size), 0
+                chars_read += len(buf)
+                if progress is not None:
+                    progress(chars_read)
+                if not buf:
+                    if expect == "[":
+                        return
+                    raise ValueError(f"{path}: unexpected end of file")
+            ch = buf[pos]
+            if expect == "[":
+                if ch != "[":
+                    raise ValueError(f"{path}: expected a JSON array of orders")
+                pos += 1
+                expect = "value"
+                continue
+            if ch == "]":
+                return
+            if expect == "separator":
+                if ch != ",":
+                    raise ValueError(f"{path}: expected ',' between orders")
+                pos += 1
+                expect = "value"
+                continue
+            while True:
+                try:
+                    order, pos = decoder.raw_decode(buf, pos)
+                    break
+                except json.JSONDecodeError:
+                    # Record spans the chunk boundary; keep its start and read on
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        raise ValueError(f"{path}: truncated order record")
+                    chars_read += len(chunk)
+                    if progress is not None:
+                        progress(chars_read)
+                    buf, pos = buf[pos:] + chunk, 0
+            expect = "separator"
+            yield order
+
+
+def iter_current_orders(path=ORDERS_FILE, progress=None):
+    """Like iter_orders, with the changes journalled since the last
+    checkpoint applied; only those changes are held in memory."""
+    changes = order_store.tail_changes(path)
+    for order in iter_orders(path, progress):
+        number = order.get("order_number")
+        if number in changes:
+            order = changes.pop(number)
+            if order is None:
+                continue
+        yield order
+    # Orders taken since the checkpoint
+    for order in changes.values():
+        if order is not None:
+            yield order
+
+
+def filter_orders(orders, date_from=None, date_to=None, paid=None):
+    """Keep orders dated within [date_from, date_to] (inclusive
+    "YYYY-MM-DD" strings) and, if `paid` is not None, with that paid flag."""
+    for order in orders:
+        day = order.get("date", "")[:10]
+        if date_from and day < date_from:
+            continue
+        if date_to and day > date_to:
+            continue
+        if paid is not None and bool(order.get("paid")) != paid:
+            continue
+        yield order
+
+
+def order_rows(orders):
+    for order in orders:
+        yield [order.get("order_number"), order.get("date", ""), order.get("staff", ""),
+               bool(order.get("paid")), order.get("total", 0),
+               sum(item.get("count", 1) for item in order.get("items", []))]
+
+
+def line_rows(orders):
+    for order in orders:
+        for item in order.get("items", []):
+            count = item.get("count", 1)
+            yield [order.get("order_number"), order.get("date", ""), order.get("staff", ""),
+                   bool(order.get("paid")), item["name"], item["price"], count, item["price"] * count]
+
+
+def export_orders(dest, fmt="orders", date_from=None, date_to=None, paid=None,
+                  source=ORDERS_FILE, progress=None):
+    """Stream the matching orders of `source` into `dest` and return the
+    number of orders exported. `progress(fraction, exported)` is called as
+    the source file is read."""
+    total_size = max(os.path.getsize(source), 1) if os.path.exists(source) else 1
+    exported = 0
+
+    def on_read(chars_read):
+        if progress is not None:
+            progress(min(chars_read / total_size, 1.0), exported)
+
+    def counted(orders):
+        nonlocal exported
+        for order in orders:
+            exported += 1
+            yield order
+
+    orders = counted(filter_orders(iter_current_orders(source, on_read), date_from, date_to, paid))
+    with open(dest, "w", encoding="utf-8", newline="") as f:
+        if fmt == "jsonl":
+            for order in orders:
+                f.write(json.dumps(order, separators=(",", ":")) + "\n")
+        elif fmt in ("orders", "lines"):
+            writer = csv.writer(f)
+            if fmt == "orders":
+                writer.writerow(ORDER_COLUMNS)
+                writer.writerows(order_rows(orders))
+            else:
+                writer.writerow(LINE_COLUMNS)
+                writer.writerows(line_rows(orders))
+        else:
+            raise ValueError(f"Unknown export format {fmt!r}")
+    if progress is not None:
+        progress(1.0, exported)
+    return exported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the order history as CSV or JSON Lines.")
+    parser.add_argument("dest", help="file to write")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="orders",
+                        help="orders: one CSV row per order; lines: one per item; jsonl: one order per line")
+    parser.add_argument("--from", dest="date_from", metavar="YYYY-MM-DD", help="first day to include")
+    parser.add_argument("--to", dest="date_to", metavar="YYYY-MM-DD", help="last day to include")
+    paid_group = parser.add_mutually_exclusive_group()
+    paid_group.add_argument("--paid", dest="paid", action="store_const", const=True, help="only paid orders")
+    paid_group.add_argument("--unpaid", dest="paid", action="store_const", const=False, help="only unpaid orders")
+    parser.add_argument("--source", default=ORDERS_FILE, help="order history file (default orders.json)")
+    args = parser.parse_args(argv)
+    count = export_orders(args.dest, args.format, args.date_from, args.date_to, args.paid, args.source)
+    print(f"Exported {count} orders to {args.dest}")
+
+
+if __name__ == "__main__":
+    main()
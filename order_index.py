@@ -0,0 +1,149 @@
+"""Search indexes over the order history for the order list's filter bar.
+
+`OrderIndex` observes the order store (OrderStore.observe) and keeps:
+  * every order's (date, number) in one sorted list, so a date/time range
+    is two bisects;
+  * staff name -> order numbers;
+  * menu item name -> order numbers (an inverted index);
+  * the numbers of unpaid orders.
+Each order added, changed or cancelled updates only its own entries. A
+query starts from the most selective of these and checks the remaining
+conditions only on that candidate set, never scanning the whole history.
+"""
+import bisect
+
+import instrumentation
+
+# Upper bound for a "YYYY-MM-DD[ HH:MM[:SS]]" prefix compared as a string
+_END = "\uffff"
+
+
+class OrderIndex:
+    def __init__(self, store):
+        self.store = store
+        self.ready = False
+        self._orders = None
+        self._by_date = []
+        self._staff = {}
+        self._items = {}
+        self._unpaid = set()
+
+    # --- OrderStore observer ----------------------------------------------
+
+    def reset(self, orders):
+        # Defer the full build until the first query (see ensure)
+        self.ready = False
+        self._orders = orders
+
+    def order_changed(self, old, new):
+        if not self.ready:
+            return
+        if old is not None:
+            self._remove(old)
+        if new is not None:
+            self._add(new)
+
+    @instrumentation.timed_function("order_index_build")
+    def ensure(self):
+        if self.ready:
+            return
+        orders = self._orders or ()
+        # Usually already in date order, which the sort finds in one pass
+        self._by_date = sorted((order.get("date", ""), order["order_number"]) for order in orders)
+        self._staff, self._items, self._unpaid = {}, {}, set()
+        for order in orders:
+            self._add_terms(order)
+        self.ready = True
+
+    def _add_terms(self, order):
+        number = order["order_number"]
+        self._staff.setdefault(order.get("staff", ""), set()).add(number)
+        for item in order.get("items", []):
+            self._items.setdefault(item["name"], set()).add(number)
+        if not order.get("paid"):
+            self._unpaid.add(number)
+
+    def _add(self, order):
+        bisect.insort(self._by_date, (order.get("date", ""), order["order_number"]))
+        self._add_terms(order)
+
+    def _remove(self, order):
+        number = order["order_number"]
+        key = (order.get("date", ""), number)
+        pos = bisect.bisect_left(self._by_date, key)
+        if pos < len(self._by_date) and self._by_date[pos] == key:
+            del self._by_date[pos]
+        self._staff.get(order.get("staff", ""), set()).discard(number)
+        for item in order.get("items", []):
+            self._items.get(item["name"], set()).discard(number)
+        self._unpaid.discard(number)
+
+    # --- Queries -------------------------------------------------------------
+
+    def staff_names(self):
+        self.ensure()
+        # Orders from before staff were recorded have no name (None or "")
+        return sorted(name for name, numbers in self._staff.items() if numbers and name)
+
+    @instrumentation.timed_function("order_query")
+    def query(self, number=None, date_from=None, date_to=None, staff=None, paid=None, item=None, limit=None):
+        """Orders matching every given condition, newest first.
+
+        `date_from`/`date_to` are inclusive "YYYY-MM-DD" prefixes, optionally
+        with a time ("YYYY-MM-DD HH:MM"); `paid` is True, False or None.
+        At most `limit` orders are returned, the newest ones.
+        """
+        self.ensure()
+        if number is not None:
+            order = self.store.get(number)
+            matches = [order] if order is not None else []
+            return [order for order in matches
+                    if self._matches(order, date_from, date_to, staff, paid, item)]
+
+        lo = bisect.bisect_left(self._by_date, (date_from,)) if date_from else 0
+        hi = bisect.bisect_right(self._by_date, (date_to + _END,)) if date_to else len(self._by_date)
+        sets = []
+        if staff is not None:
+            sets.append(self._staff.get(staff, set()))
+        if item is not None:
+            sets.append(self._items.get(item, set()))
+        if paid is False:
+            sets.append(self._unpaid)
+        smallest = min(sets, key=len) if sets else None
+
+        if smallest is not None and len(smallest) < hi - lo:
+            # Few candidates: check them, then order by date
+            keys = []
+            for candidate in smallest:
+                order = self.store.get(candidate)
+                if order is not None and self._matches(order, date_from, date_to, staff, paid, item):
+                    keys.append((order.get("date", ""), candidate))
+            keys.sort(reverse=True)
+            if limit is not None:
+                del keys[limit:]
+        else:
+            # The date range is the narrowest cut: walk it newest first,
+            # stopping once `limit` orders have matched
+            keys = []
+            for pos in range(hi - 1, lo - 1, -1):
+                if limit is not None and len(keys) >= limit:
+                    break
+                key = self._by_date[pos]
+                if all(key[1] in s for s in sets) and (paid is not True or key[1] not in self._unpaid):
+                    keys.append(key)
+        return [self.store.get(key[1]) for key in keys]
+
+    @staticmethod
+    def _matches(order, date_from, date_to, staff, paid, item):
+        date = order.get("date", "")
+        if date_from and date < date_from:
+            return False
+        if date_to and date > date_to + _END:
+            return False
+        if staff is not None and order.get("staff", "") != staff:
+            return False
+        if paid is not None and bool(order.get("paid")) != paid:
+            return False
+        if item is not None and not any(line["name"] == item for line in order.get("items", [])):
+            return False
+        return True
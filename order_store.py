@@ -0,0 +1,470 @@
+"""Order history kept as a checkpoint plus an append-only change journal.
+
+`orders.json` is the checkpoint: every order as of the last checkpoint, still
+a plain JSON array so order_export and older tools can read it. Each change
+since then is one JSON line in a journal segment,
+`orders.json.journal.<segment>`: {"op": "put", "order": {...}} adds or
+replaces an order by number, {"op": "cancel", "order_number": n, "order":
+{...}, "at": time} removes one and {"op": "close_shift", "shift": {...}}
+marks the end of a shift for the Z-report. `orders.json.checkpoint` records
+which segment the checkpoint stops at, together with the next order number,
+the unpaid/revenue totals, the last closed shift and the orders cancelled
+since, so a restart reads the checkpoint and replays only the short tail
+after it. `orders.json.index` holds the byte offsets of the checkpoint's
+orders by number and day, for reading part of the history (history_index).
+
+Every entry holds the full final state of one order, so replaying a
+segment that is already folded into the checkpoint changes nothing. Order
+numbers are issued under the store's file lock, so tills that share the
+files never hand out the same number.
+
+`segment_paths`, `read_checkpoint` and `read_lines` read these files
+without an OrderStore, for tools that follow the journal (replication).
+"""
+import bisect
+import contextlib
+import datetime
+import glob
+import json
+import os
+import threading
+import time
+
+import instrumentation
+import metrics
+from locks import file_lock, stat_stamp
+
+ORDERS_FILE = os.path.join(os.path.dirname(__file__), "orders.json")
+
+# Journal entries after which the history is checkpointed in the background
+CHECKPOINT_AFTER = 200
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def segment_paths(path):
+    """{segment number: path} of the journal segments of `path` on disk."""
+    segments = {}
+    for seg_path in glob.glob(glob.escape(path) + ".journal.*"):
+        suffix = seg_path.rsplit(".", 1)[1]
+        if suffix.isdigit():
+            segments[int(suffix)] = seg_path
+    return segments
+
+
+def read_checkpoint(path):
+    """The `<path>.checkpoint` record (segment, next order number, totals,
+    shift), or None if there is none or it can't be read."""
+    try:
+        with open(path + ".checkpoint", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def read_lines(seg_path, offset=0):
+    """(entries, offset after them) for the complete journal lines of a
+    segment from `offset` on; torn lines are skipped."""
+    try:
+        with open(seg_path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except OSError:
+        return [], offset
+    # A line still being written by another till has no newline yet
+    end = data.rfind(b"\n") + 1
+    entries = []
+    for line in data[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            # Left torn by a till that crashed mid-append (and, before torn
+            # tails were cut off, glued to the next line): skip it
+            continue
+    return entries, offset + end
+
+
+def tail_changes(path=ORDERS_FILE):
+    """Net effect of the journal on the checkpoint, without loading it.
+
+    Returns {order_number: order, or None if cancelled} in journal order;
+    used to stream the current history straight from the checkpoint file.
+    """
+    changes = {}
+    segments = segment_paths(path)
+    for segment in sorted(segments):
+        for entry in read_lines(segments[segment])[0]:
+            if entry["op"] == "put":
+                changes[entry["order"]["order_number"]] = entry["order"]
+            elif entry["op"] == "cancel":
+                changes[entry["order_number"]] = None
+    return changes
+
+
+class OrderStore:
+    """The order history of one till, kept in step with the shared files.
+
+    `orders` is the history in the order it was taken. Its dicts are never
+    changed in place; an update replaces the order with a new dict, which is
+    what lets a checkpoint copy the list cheaply and write it off the UI
+    thread.
+    """
+    def __init__(self, path=ORDERS_FILE):
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self.orders = []
+        self._by_number = {}
+        # The numbers of `orders`, in step with it while they ascend (as the
+        # store writes them), so an update or cancel finds its order by
+        # bisection; None for a list merged out of order by hand
+        self._numbers = []
+        self.next_order_number = 1
+        self.unpaid = 0
+        self.revenue = 0
+        # Last closed shift ({"number", "through", "closed_at"}) and the
+        # orders cancelled since: {order_number: {"order", "at"}}
+        self.shift = None
+        self.cancelled = {}
+        self._segment = 0
+        self._offset = 0
+        self._tail_entries = 0
+        self._checkpoint_thread = None
+        # The file lock isn't reentrant; _locked() takes it once per process
+        self._lock = threading.RLock()
+        self._holding = False
+        # Called (from whichever thread wrote) after each journal append
+        self.on_append = None
+        # Derived views kept up to date with the history; see observe()
+        self._observers = []
+        with self._locked():
+            self._load()
+        if self._tail_entries >= CHECKPOINT_AFTER:
+            self.checkpoint()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # The store's file lock, which refresh() may also need while a
+        # writer already holds it; other threads wait on the RLock
+        with self._lock:
+            if self._holding:
+                yield
+                return
+            with file_lock(self.path):
+                self._holding = True
+                try:
+                    yield
+                finally:
+                    self._holding = False
+
+    # --- Reading -----------------------------------------------------------
+
+    @instrumentation.timed_function("load_orders")
+    def _load(self):
+        # Full read: checkpoint, then every segment from the one it stops at.
+        # Caller holds the file lock so no segment is deleted underneath us.
+        meta = read_checkpoint(self.path)
+        orders = []
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    content = f.read().strip()
+                orders = json.loads(content) if content else []
+            except (json.JSONDecodeError, IOError):
+                orders = []
+        self.orders[:] = orders
+        self._by_number = {order["order_number"]: order for order in orders}
+        self._numbers = [order["order_number"] for order in orders]
+        if not all(a < b for a, b in zip(self._numbers, self._numbers[1:])):
+            self._numbers = None
+        if meta is not None and meta.get("base") == list(stat_stamp(self.path) or ()):
+            self.next_order_number = meta["next_order_number"]
+            self.unpaid = meta["unpaid"]
+            self.revenue = meta["revenue"]
+        else:
+            # No checkpoint yet, or orders.json changed since it was taken
+            self.next_order_number = max(self._by_number, default=0) + 1
+            self.unpaid = sum(1 for order in orders if not order.get("paid"))
+            self.revenue = sum(order.get("total", 0) for order in orders if order.get("paid"))
+        # Unlike the totals these don't depend on orders.json, only on the
+        # segment the checkpoint stops at
+        self.shift = meta.get("shift") if meta is not None else None
+        self.cancelled = {entry["order"]["order_number"]: entry for entry in (meta or {}).get("cancelled", [])}
+        segments = segment_paths(self.path)
+        first = meta["segment"] if meta is not None else min(segments, default=0)
+        self._segment, self._offset, self._tail_entries = first, 0, 0
+        for segment in sorted(s for s in segments if s >= first):
+            self._segment, self._offset = segment, 0
+            self._read_segment()
+        for observer in self._observers:
+            observer.reset(self.orders)
+
+    def _read_segment(self):
+        entries, self._offset = read_lines(self._seg_path(self._segment), self._offset)
+        for entry in entries:
+            self._apply(entry)
+        self._tail_entries += len(entries)
+
+    def _seg_path(self, segment):
+        return f"{self.path}.journal.{segment}"
+
+    def refresh(self):
+        """Apply the journal lines other tills have written since we last looked.
+
+        Safe with or without the file lock held through _locked().
+        """
+        if not os.path.exists(self._seg_path(self._segment)):
+            meta = read_checkpoint(self.path)
+            if meta is not None and meta["segment"] > self._segment:
+                # Our segment was folded into a checkpoint and deleted before
+                # we had read all of it
+                with self._locked():
+                    self._load()
+                return
+        while True:
+            # Check for a newer segment before reading: once it exists,
+            # nothing more is written to ours, so one read finishes it
+            has_next = os.path.exists(self._seg_path(self._segment + 1))
+            self._read_segment()
+            if not has_next:
+                break
+            # Another till has checkpointed everything before that segment
+            self._segment, self._offset, self._tail_entries = self._segment + 1, 0, 0
+
+    def _apply(self, entry):
+        if entry["op"] == "put":
+            order = entry["order"]
+            number = order["order_number"]
+            old = self._by_number.get(number)
+            if old is None:
+                if self._numbers is not None:
+                    if self._numbers and number < self._numbers[-1]:
+                        self._numbers = None
+                    else:
+                        self._numbers.append(number)
+                self.orders.append(order)
+            else:
+                self._untally(old)
+                self.orders[self._position(old)] = order
+            self._by_number[number] = order
+            self.unpaid += 0 if order.get("paid") else 1
+            self.revenue += order.get("total", 0) if order.get("paid") else 0
+            self.next_order_number = max(self.next_order_number, number + 1)
+            for observer in self._observers:
+                observer.order_changed(old, order)
+        elif entry["op"] == "cancel":
+            old = self._by_number.pop(entry["order_number"], None)
+            if old is not None:
+                self._untally(old)
+                position = self._position(old)
+                del self.orders[position]
+                if self._numbers is not None:
+                    del self._numbers[position]
+                for observer in self._observers:
+                    observer.order_changed(old, None)
+            if "order" in entry and (self.shift is None or entry["at"] > self.shift["closed_at"]):
+                self.cancelled[entry["order_number"]] = {"order": entry["order"], "at": entry["at"]}
+        elif entry["op"] == "close_shift":
+            shift = entry["shift"]
+            if self.shift is None or shift["number"] > self.shift["number"]:
+                self.shift = shift
+                self.cancelled = {number: c for number, c in self.cancelled.items() if c["at"] > shift["closed_at"]}
+
+    def _position(self, order):
+        # Index of `order` in `orders`
+        if self._numbers is not None:
+            return bisect.bisect_left(self._numbers, order["order_number"])
+        return self.orders.index(order)
+
+    def _untally(self, order):
+        if order.get("paid"):
+            self.revenue -= order.get("total", 0)
+        else:
+            self.unpaid -= 1
+
+    def get(self, number):
+        return self._by_number.get(number)
+
+    def observe(self, observer):
+        """Keep `observer` in step with the history.
+
+        `observer.reset(orders)` is called now and after any full reload,
+        and `observer.order_changed(old, new)` for every order added (old
+        is None), replaced or cancelled (new is None), whichever till made
+        the change.
+        """
+        self._observers.append(observer)
+        observer.reset(self.orders)
+
+    # --- Writing -----------------------------------------------------------
+
+    @instrumentation.timed_function("save_orders")
+    def _append(self, entry):
+        # Caller holds the file lock and has just refreshed, so our segment
+        # is the newest and ends exactly at our offset
+        start = time.perf_counter()
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8")
+        with open(self._seg_path(self._segment), "ab") as f:
+            if f.tell() > self._offset:
+                # Only a writer holding the lock appends, so anything past
+                # the last complete line is a crashed till's torn write
+                f.truncate(self._offset)
+            f.write(line)
+        self._apply(entry)
+        self._offset += len(line)
+        self._tail_entries += 1
+        metrics.record_write("orders", time.perf_counter() - start, len(line))
+        if self._tail_entries >= CHECKPOINT_AFTER:
+            self._start_checkpoint()
+        if self.on_append is not None:
+            self.on_append()
+
+    def add(self, order):
+        """Give `order` the next order number, save it and return the number."""
+        with self._locked():
+            self.refresh()
+            order = dict(order, order_number=self.next_order_number)
+            self._append({"op": "put", "order": order})
+        return order["order_number"]
+
+    def set_paid(self, number, paid=True):
+        """Mark an order paid or unpaid; returns the updated order, or None
+        if there is no such order or it already was."""
+        with self._locked():
+            self.refresh()
+            order = self._by_number.get(number)
+            if order is None or bool(order.get("paid")) == paid:
+                return None
+            order = dict(order, paid=paid)
+            self._append({"op": "put", "order": order})
+        return order
+
+    def set_ready(self, number, ready=True):
+        """Mark an order made (or not); returns the updated order or None."""
+        with self._locked():
+            self.refresh()
+            order = self._by_number.get(number)
+            if order is None:
+                return None
+            order = dict(order, ready=ready)
+            self._append({"op": "put", "order": order})
+        return order
+
+    def cancel(self, number):
+        """Remove an order; returns the removed order or None."""
+        with self._locked():
+            self.refresh()
+            order = self._by_number.get(number)
+            if order is not None:
+                self._append({"op": "cancel", "order_number": number, "order": order,
+                              "at": datetime.datetime.now().strftime(TIME_FORMAT)})
+        return order
+
+    def shift_orders(self):
+        """Yield the orders taken since the last shift was closed.
+
+        Numbers are issued in order, so this walks back from the newest
+        order and stops at the shift boundary instead of scanning the
+        whole history.
+        """
+        through = self.shift["through"] if self.shift is not None else 0
+        for order in reversed(self.orders):
+            if order["order_number"] <= through:
+                break
+            yield order
+
+    def close_shift(self, through):
+        """Close the current shift at order number `through` and return it.
+
+        Orders after `through` (taken by other tills while the report was
+        being read) fall into the next shift.
+        """
+        with self._locked():
+            self.refresh()
+            shift = {"number": self.shift["number"] + 1 if self.shift is not None else 1,
+                     "through": through, "closed_at": datetime.datetime.now().strftime(TIME_FORMAT)}
+            self._append({"op": "close_shift", "shift": shift})
+        return shift
+
+    def replicate(self, entries):
+        """Append journal entries copied from another store (see replication)."""
+        with self._locked():
+            self.refresh()
+            for entry in entries:
+                self._append(entry)
+
+    # --- Checkpoints -------------------------------------------------------
+
+    def checkpoint(self, background=True):
+        """Fold the journal into orders.json, on a worker thread by default."""
+        with self._locked():
+            self.refresh()
+            self._start_checkpoint()
+        if not background:
+            self.wait()
+
+    def _start_checkpoint(self):
+        # Under the file lock: open a fresh segment for new changes, then
+        # write everything before it out on a worker thread
+        if self._checkpoint_thread is not None and self._checkpoint_thread.is_alive():
+            return
+        self._segment, self._offset, self._tail_entries = self._segment + 1, 0, 0
+        open(self._seg_path(self._segment), "ab").close()
+        state = {"segment": self._segment, "next_order_number": self.next_order_number,
+                 "unpaid": self.unpaid, "revenue": self.revenue,
+                 "shift": self.shift, "cancelled": list(self.cancelled.values())}
+        self._checkpoint_thread = threading.Thread(target=self._write_checkpoint, args=(list(self.orders), state),
+                                                   name="order-checkpoint", daemon=True)
+        self._checkpoint_thread.start()
+
+    def wait(self):
+        """Block until a running background checkpoint has finished."""
+        if self._checkpoint_thread is not None:
+            self._checkpoint_thread.join()
+
+    @instrumentation.timed_function("checkpoint_orders")
+    def _write_checkpoint(self, orders, state):
+        # Only one till writes a checkpoint at a time, and never an older one
+        # over a newer one
+        with file_lock(self.checkpoint_path):
+            meta = read_checkpoint(self.path)
+            if meta is not None and meta["segment"] >= state["segment"]:
+                return
+            start = time.perf_counter()
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            # "\n" line endings on every platform: history_index reads the
+            # layout byte for byte
+            with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+                json.dump(orders, f, indent=4)
+                size = f.tell()
+            os.replace(tmp_path, self.path)
+            state["base"] = list(stat_stamp(self.path))
+            state["orders"] = len(orders)
+            metrics.record_write("orders", time.perf_counter() - start, size)
+            with self._locked():
+                tmp_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.checkpoint_path)
+                for segment, seg_path in segment_paths(self.path).items():
+                    if segment < state["segment"]:
+                        try:
+                            os.remove(seg_path)
+                        except OSError:
+                            # Still open elsewhere (Windows); the next checkpoint retries
+                            pass
+            # Offsets of the new checkpoint's orders, for reports that read
+            # only part of the history
+            import history_index
+
+            try:
+                history_index.write_index(self.path)
+            except (OSError, ValueError):
+                # Rebuilt by the first report that needs it
+                pass
+
+    def files(self):
+        """Paths of every file currently making up the store."""
+        paths = [self.path, self.checkpoint_path] + list(segment_paths(self.path).values())
+        return [p for p in paths if os.path.exists(p)]
@@ -0,0 +1,203 @@
+"""Preparation queue: which order to make next, and how long a new one waits.
+
+Every order carries a "type" (ORDER_TYPES) and is promised ready by the
+time it was placed plus PROMISE_MINUTES for its type. Orders still to be
+made sit in a heap on (promised time, TYPE_PRIORITY, number), so the next
+ticket is the top of the heap. Their preparation time (seconds per unit,
+from the items) is also summed into a Fenwick tree by promised minute, so
+the wait for a queued order, or the quote for a new one, is the work
+promised no later than it, shared across the stations: two prefix sums,
+as work more than OVERDUE_MINUTES past its promise is left out.
+
+`PrepQueue` observes the order store (OrderStore.observe): an order that
+is readied or cancelled leaves the tree at once and is skipped when it
+reaches the top of the heap; one that is paid keeps its place. Every
+operation is O(log n) in the orders waiting.
+
+Only orders with a type (recorded since order types were) that are not
+marked "ready" and were placed in the last STALE_HOURS are queued.
+"""
+import datetime
+import heapq
+
+import instrumentation
+
+ORDER_TYPES = ("Pickup", "Delivery", "Dine-in")
+
+# Minutes after placing that an order is promised ready
+PROMISE_MINUTES = {"Pickup": 10, "Delivery": 8, "Dine-in": 12}
+
+# Among orders promised for the same time, lowest goes first (the courier waits)
+TYPE_PRIORITY = {"Delivery": 0, "Pickup": 1, "Dine-in": 2}
+
+# Orders older than this are taken to have been served
+STALE_HOURS = 12
+
+# An order this long past its promised time has been handed over, whether or
+# not anyone tapped Ready; it no longer counts towards waits and quotes
+OVERDUE_MINUTES = 30
+
+# Preparation seconds per unit of an item with no entry of its own
+DEFAULT_ITEM_SECONDS = 60
+
+# Minutes covered by the Fenwick tree, from midnight of the day it was built
+HORIZON_MINUTES = 2 * 24 * 60
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class PrepQueue:
+    def __init__(self, item_seconds=None, stations=1):
+        self.item_seconds = item_seconds or {}
+        self.stations = stations
+        self.ready = False
+        self._orders = None
+        # number -> (heap key, work seconds, order)
+        self._entries = {}
+        self._heap = []
+        self._tree = [0] * (HORIZON_MINUTES + 1)
+        self._base = None
+        self._cutoff = ""
+
+    # --- OrderStore observer ----------------------------------------------
+
+    def reset(self, orders):
+        self.ready = False
+        self._orders = orders
+
+    def order_changed(self, old, new):
+        if not self.ready:
+            return
+        if new is not None and self._queued(new):
+            self._add(new)
+        elif old is not None:
+            self._remove(old["order_number"])
+
+    @instrumentation.timed_function("prep_queue_build")
+    def ensure(self, now=None):
+        now = now or datetime.datetime.now()
+        if self.ready and now < self._base + datetime.timedelta(days=1):
+            return
+        # (Re)build: also once a day, so the tree's minutes stay ahead of the clock
+        self._base = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        self._cutoff = (now - datetime.timedelta(hours=STALE_HOURS)).strftime(TIME_FORMAT)
+        self._entries = {}
+        self._heap = []
+        self._tree = [0] * (HORIZON_MINUTES + 1)
+        self.ready = True
+        # Orders are kept in number order, so the recent ones are at the end
+        for order in reversed(self._orders or ()):
+            if order.get("date", "") < self._cutoff:
+                break
+            if self._queued(order):
+                self._add(order)
+
+    # --- Bookkeeping -------------------------------------------------------
+
+    def _queued(self, order):
+        return order.get("type") in TYPE_PRIORITY and not order.get("ready") \
+            and order.get("date", "") >= self._cutoff
+
+    def work(self, items):
+        """Preparation seconds for a list of order or cart items."""
+        return sum(self.item_seconds.get(item["name"], DEFAULT_ITEM_SECONDS) * item.get("count", 1)
+                   for item in items)
+
+    def _key(self, placed, order_type, number):
+        promised = placed + datetime.timedelta(minutes=PROMISE_MINUTES[order_type])
+        return (promised, TYPE_PRIORITY[order_type], number)
+
+    def _minute(self, when):
+        minute = int((when - self._base).total_seconds() // 60)
+        return min(max(minute, 0), HORIZON_MINUTES - 1)
+
+    def _tree_add(self, minute, seconds):
+        i = minute + 1
+        while i <= HORIZON_MINUTES:
+            self._tree[i] += seconds
+            i += i & -i
+
+    def _work_through(self, minute):
+        i, total = minute + 1, 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _work_ahead(self, promised, now):
+        # Work promised no later than `promised`, less what is long overdue
+        overdue = now - datetime.timedelta(minutes=OVERDUE_MINUTES)
+        total = self._work_through(self._minute(promised))
+        if overdue >= self._base:
+            total -= self._work_through(self._minute(overdue))
+        return max(total, 0)
+
+    def _add(self, order):
+        number = order["order_number"]
+        try:
+            placed = datetime.datetime.strptime(order["date"], TIME_FORMAT)
+        except (KeyError, ValueError):
+            return
+        key = self._key(placed, order["type"], number)
+        work = self.work(order.get("items", []))
+        entry = self._entries.get(number)
+        if entry is not None:
+            self._tree_add(self._minute(entry[0][0]), -entry[1])
+        if entry is None or entry[0] != key:
+            # A ticket that is only being updated (e.g. paid) keeps its slot
+            heapq.heappush(self._heap, key)
+        self._entries[number] = (key, work, order)
+        self._tree_add(self._minute(key[0]), work)
+
+    def _remove(self, number):
+        entry = self._entries.pop(number, None)
+        if entry is None:
+            return
+        self._tree_add(self._minute(entry[0][0]), -entry[1])
+        if len(self._heap) > 2 * len(self._entries) + 32:
+            # Mostly stale slots: rebuild the heap from the live entries
+            self._heap = [key for key, _, _ in self._entries.values()]
+            heapq.heapify(self._heap)
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and (heap[0][2] not in self._entries or self._entries[heap[0][2]][0] != heap[0]):
+            heapq.heappop(heap)
+
+    # --- Queries -------------------------------------------------------------
+
+    def next_up(self):
+        """The order to make next, or None when nothing is waiting."""
+        self.ensure()
+        self._drop_stale()
+        return self._entries[self._heap[0][2]][2] if self._heap else None
+
+    def __len__(self):
+        self.ensure()
+        return len(self._entries)
+
+    def promised(self, number):
+        entry = self._entries.get(number)
+        return entry[0][0] if entry is not None else None
+
+    def wait(self, number, now=None):
+        """Seconds until a queued order should be ready, or None."""
+        now = now or datetime.datetime.now()
+        self.ensure(now)
+        entry = self._entries.get(number)
+        if entry is None:
+            return None
+        return self._work_ahead(entry[0][0], now) / self.stations
+
+    def quote(self, order_type, items, now=None):
+        """Seconds a new order of `order_type` with `items` would wait."""
+        now = now or datetime.datetime.now()
+        self.ensure(now)
+        promised = now + datetime.timedelta(minutes=PROMISE_MINUTES[order_type])
+        return (self._work_ahead(promised, now) + self.work(items)) / self.stations
+
+    def tickets(self):
+        """Queued orders in the order they'll be made (for display)."""
+        self.ensure()
+        keys = sorted(key for key, _, _ in self._entries.values())
+        return [self._entries[key[2]][2] for key in keys]
@@ -0,0 +1,105 @@
+"""Promotions for the cart, compiled once per menu item.
+
+A promotion is a dict with a "type":
+  * "quantity"   {"item", "min_qty", "price"}: the unit price of a line once
+                 it holds at least min_qty (several tiers per item allowed);
+  * "happy_hour" {"name", "items", "start", "end", "off"[, "days"]}: `off`
+                 dollars off each unit from "HH:MM" start to end, optionally
+                 only on some weekdays (0 = Monday);
+  * "bundle"     {"name", "components", "discount"}: `discount` off for every
+                 complete set of one unit from each component, a component
+                 being a list of interchangeable items (e.g. any coffee).
+
+`PricingRules` turns the list into a lookup from item name to the tiers,
+happy hours and bundles that mention it. The cart uses it to re-price only
+the lines a change touched, plus the bundles those lines belong to, rather
+than running every promotion over the whole cart.
+"""
+import datetime
+
+
+class PricingRules:
+    def __init__(self, menu_items, promotions):
+        prices = {item["name"]: item["price"] for item in menu_items}
+        self.prices = prices
+        self.windows = []
+        self.bundles = []
+        # item name -> {"tiers": [(min_qty, price)], "windows": [i], "bundles": [i]}
+        self._by_item = {}
+
+        def rules_for(name):
+            if name not in prices:
+                raise ValueError(f"Promotion names unknown menu item {name!r}")
+            return self._by_item.setdefault(name, {"tiers": [], "windows": [], "bundles": []})
+
+        for promo in promotions:
+            kind = promo.get("type")
+            if kind == "quantity":
+                rules_for(promo["item"])["tiers"].append((promo["min_qty"], promo["price"]))
+            elif kind == "happy_hour":
+                window = dict(promo, start=_minutes(promo["start"]), end=_minutes(promo["end"]),
+                              days=frozenset(promo.get("days", range(7))))
+                self.windows.append(window)
+                for name in promo["items"]:
+                    rules_for(name)["windows"].append(len(self.windows) - 1)
+            elif kind == "bundle":
+                components = [tuple(component) for component in promo["components"]]
+                names = [name for component in components for name in component]
+                if len(names) != len(set(names)):
+                    raise ValueError(f"Bundle {promo['name']!r} lists an item in more than one place")
+                self.bundles.append(dict(promo, components=components))
+                for name in names:
+                    rules_for(name)["bundles"].append(len(self.bundles) - 1)
+            else:
+                raise ValueError(f"Unknown promotion type {kind!r}")
+        for rules in self._by_item.values():
+            # Highest threshold first, so the first tier reached wins
+            rules["tiers"].sort(reverse=True)
+
+    def active_windows(self, now=None):
+        """Indexes of the happy hours running at `now` (default: the clock)."""
+        if not self.windows:
+            return frozenset()
+        now = now or datetime.datetime.now()
+        minute, weekday = now.hour * 60 + now.minute, now.weekday()
+        active = set()
+        for i, window in enumerate(self.windows):
+            start, end = window["start"], window["end"]
+            inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if inside and weekday in window["days"]:
+                active.add(i)
+        return frozenset(active)
+
+    def window_items(self, windows):
+        return {name for i in windows for name in self.windows[i]["items"]}
+
+    def bundles_for(self, name):
+        rules = self._by_item.get(name)
+        return rules["bundles"] if rules else ()
+
+    def unit_price(self, name, count, windows=frozenset()):
+        """Price of one unit of `name` in a line of `count` units."""
+        price = self.prices.get(name, 0)
+        rules = self._by_item.get(name)
+        if rules is None:
+            return price
+        for min_qty, tier_price in rules["tiers"]:
+            if count >= min_qty:
+                price = tier_price
+                break
+        for i in rules["windows"]:
+            if i in windows:
+                price -= self.windows[i]["off"]
+        return max(price, 0)
+
+    def bundle_discount(self, index, lines):
+        """Discount bundle `index` earns on cart lines {name: {"count": n}}."""
+        bundle = self.bundles[index]
+        sets = min(sum(lines[name]["count"] for name in component if name in lines)
+                   for component in bundle["components"])
+        return sets * bundle["discount"]
+
+
+def _minutes(hhmm):
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
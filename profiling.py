@@ -0,0 +1,115 @@
+"""On-till profiling: a sampling profiler and tracemalloc screen diffs.
+
+`SamplingProfiler` samples the Tk main thread's stack from a background
+thread for a fixed number of seconds and writes collapsed stacks (one
+"frame;frame;frame count" line per distinct stack), the input format of
+flamegraph.pl, speedscope and similar tools. `memory_diff` takes tracemalloc
+snapshots around an action, such as building a screen, and writes the
+source lines whose allocations grew the most.
+"""
+import collections
+import datetime
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), "profiles")
+
+
+def _output_path(prefix, ext):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(PROFILE_DIR, f"{prefix}-{stamp}.{ext}")
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples one thread's stack every `interval` seconds for `duration`.
+
+    Only the sampler thread does any work, so the profiled thread pays
+    nothing beyond the GIL hand-off at each sample.
+    """
+    def __init__(self, duration=10.0, interval=0.005, thread_id=None, path=None):
+        self.duration = duration
+        self.interval = interval
+        self.thread_id = threading.main_thread().ident if thread_id is None else thread_id
+        self.path = path or _output_path("profile", "folded")
+        self.samples = 0
+        self._stacks = collections.Counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def is_running(self):
+        return self._thread.is_alive()
+
+    def join(self):
+        self._thread.join()
+
+    def _run(self):
+        deadline = time.monotonic() + self.duration
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            del frame
+            time.sleep(self.interval)
+        self.write()
+
+    def write(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return self.path
+
+
+def memory_diff(action, label="action", limit=40):
+    """Run `action()` between two tracemalloc snapshots and report growth.
+
+    Tracing is started (and stopped again afterwards) if it isn't already
+    on. Returns the path of the report, listing the source lines whose
+    allocations grew most, with the allocating call stack of the top few.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(10)
+    try:
+        before = tracemalloc.take_snapshot()
+        action()
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+
+    path = _output_path(f"memory-{label}", "txt")
+    by_line = after.compare_to(before, "lineno")
+    by_trace = after.compare_to(before, "traceback")
+    with open(path, "w", encoding="utf-8") as f:
+        total = sum(stat.size_diff for stat in by_line)
+        f.write(f"# tracemalloc diff around {label}: {total / 1024:+.1f} KiB net\n\n")
+        f.write("# Top lines by size growth\n")
+        for stat in by_line[:limit]:
+            f.write(f"{stat}\n")
+        f.write("\n# Call stacks of the largest growth\n")
+        for stat in by_trace[:10]:
+            f.write(f"\n{stat.size_diff / 1024:+.1f} KiB in {stat.count_diff:+d} blocks\n")
+            for line in stat.traceback.format():
+                f.write(f"{line}\n")
+    return path
@@ -0,0 +1,208 @@
+"""Continuous copy of the order store to a standby directory, and failover.
+
+A `Replicator` runs on a background thread beside the till. It tails the
+journal segments of the primary order store (see order_store) and appends
+each new entry to an order store of the same name in the standby directory,
+e.g. a USB drive or NAS mount. Only new journal lines cross over; the
+standby checkpoints itself like any other store. It is woken by every local
+append and also polls for other tills' changes, so in normal running the
+standby is at most REPLICATION_INTERVAL behind. Its position in the primary
+journal is kept in `replication.json` in the standby directory, so a
+restarted till carries on where it stopped. A full copy of orders.json is
+made only to seed an empty standby, or one whose position was folded into
+a checkpoint and deleted while no replicator was running.
+
+Run one replicator per standby directory (from one till).
+
+Failover, with the tills closed:
+    python replication.py failover /mnt/usb/cafe-standby
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import threading
+import time
+
+import metrics
+import order_store
+from locks import file_lock
+from order_store import read_checkpoint, read_lines, segment_paths
+
+# Seconds between polls of the primary journal for other tills' changes
+REPLICATION_INTERVAL = 1.0
+
+# Lag (seconds) beyond which the till warns that the standby is stale
+MAX_LAG_SECONDS = 30.0
+
+POSITION_FILE = "replication.json"
+
+
+class Replicator:
+    """Keeps `standby_dir` in step with `store`'s files on a daemon thread."""
+    def __init__(self, store, standby_dir, interval=REPLICATION_INTERVAL):
+        self.source = os.path.abspath(store.path)
+        self.standby_dir = standby_dir
+        self.standby_path = os.path.join(standby_dir, os.path.basename(store.path))
+        self.position_path = os.path.join(standby_dir, POSITION_FILE)
+        self.interval = interval
+        self.error = None
+        self.standby = None
+        self._position = None
+        self._caught_up_at = time.monotonic()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="order-replication", daemon=True)
+        store.on_append = self._wake.set
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # One last pass so changes made just before exit reach the standby
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+
+    def lag(self):
+        """Seconds since the standby was last known to be current."""
+        return time.monotonic() - self._caught_up_at
+
+    def _run(self):
+        while True:
+            stopping = self._stop.is_set()
+            try:
+                self.sync()
+                self.error = None
+            except (OSError, ValueError) as e:
+                # Standby unplugged or unwritable: keep retrying, lag grows
+                self.error = str(e)
+            metrics.set_gauge("cafe_replication_lag_seconds", round(self.lag(), 3))
+            if stopping:
+                break
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def sync(self):
+        """Copy every complete journal entry not yet on the standby."""
+        started = time.monotonic()
+        if self.standby is None:
+            os.makedirs(self.standby_dir, exist_ok=True)
+            self._position = self._read_position()
+            if self._position is None:
+                self._seed()
+            else:
+                self.standby = order_store.OrderStore(self.standby_path)
+        while True:
+            segment, offset = self._position["segment"], self._position["offset"]
+            seg_path = f"{self.source}.journal.{segment}"
+            has_next = os.path.exists(f"{self.source}.journal.{segment + 1}")
+            if not os.path.exists(seg_path):
+                meta = read_checkpoint(self.source)
+                if meta is not None and meta["segment"] > segment:
+                    # Folded into a checkpoint before we had copied all of it
+                    self._seed()
+                    continue
+            entries, offset = read_lines(seg_path, offset)
+            if entries:
+                self.standby.replicate(entries)
+            if has_next:
+                segment, offset = segment + 1, 0
+            if (segment, offset) != (self._position["segment"], self._position["offset"]):
+                self._write_position(segment, offset)
+            if not has_next:
+                break
+        self._caught_up_at = started
+
+    def _seed(self):
+        # Whole copy of the primary checkpoint; the checkpoint lock keeps
+        # orders.json and the segment it stops at consistent while we copy
+        with file_lock(self.source + ".checkpoint"):
+            meta = read_checkpoint(self.source)
+            if meta is not None:
+                segment = meta["segment"]
+            else:
+                segment = min(segment_paths(self.source), default=0)
+            tmp_path = self.standby_path + ".seed.tmp"
+            if os.path.exists(self.source):
+                shutil.copyfile(self.source, tmp_path)
+            else:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write("[]")
+        for path in list(segment_paths(self.standby_path).values()) + [self.standby_path + ".checkpoint"]:
+            if os.path.exists(path):
+                os.remove(path)
+        os.replace(tmp_path, self.standby_path)
+        self.standby = order_store.OrderStore(self.standby_path)
+        self._write_position(segment, 0)
+
+    def _read_position(self):
+        try:
+            with open(self.position_path, "r", encoding="utf-8") as f:
+                position = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return position if position.get("source") == self.source else None
+
+    def _write_position(self, segment, offset):
+        self._position = {"source": self.source, "segment": segment, "offset": offset}
+        tmp_path = self.position_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._position, f)
+        os.replace(tmp_path, self.position_path)
+
+
+def failover(standby_dir, primary_path=order_store.ORDERS_FILE):
+    """Rebuild the primary order store from the standby copy.
+
+    The primary's existing files are kept beside it with a ".pre-failover-
+    <time>" suffix. Returns the number of orders restored.
+    """
+    standby_path = os.path.join(standby_dir, os.path.basename(primary_path))
+    if not os.path.exists(standby_path):
+        raise FileNotFoundError(f"No standby order store at {standby_path}")
+    standby = order_store.OrderStore(standby_path)
+    standby.checkpoint(background=False)
+    suffix = ".pre-failover-" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    with file_lock(primary_path):
+        for path in [primary_path, primary_path + ".checkpoint"] + list(segment_paths(primary_path).values()):
+            if os.path.exists(path):
+                os.replace(path, path + suffix)
+        tmp_path = primary_path + ".failover.tmp"
+        shutil.copyfile(standby_path, tmp_path)
+        os.replace(tmp_path, primary_path)
+    # The first load has no checkpoint file and recounts the totals; write
+    # one so the next start is a fast one. The standby reseeds from it.
+    primary = order_store.OrderStore(primary_path)
+    primary.checkpoint(background=False)
+    position_path = os.path.join(standby_dir, POSITION_FILE)
+    if os.path.exists(position_path):
+        os.remove(position_path)
+    return len(primary.orders)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Order store standby tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fail = sub.add_parser("failover", help="rebuild the primary order store from a standby directory")
+    fail.add_argument("standby_dir")
+    fail.add_argument("--primary", default=order_store.ORDERS_FILE, help="primary store (default orders.json)")
+    sync = sub.add_parser("sync", help="bring a standby directory up to date once and exit")
+    sync.add_argument("standby_dir")
+    sync.add_argument("--primary", default=order_store.ORDERS_FILE, help="primary store (default orders.json)")
+    args = parser.parse_args(argv)
+
+    if args.command == "failover":
+        count = failover(args.standby_dir, args.primary)
+        print(f"Restored {count} orders from {args.standby_dir} into {args.primary}")
+    else:
+        replicator = Replicator(order_store.OrderStore(args.primary), args.standby_dir)
+        replicator.sync()
+        replicator.standby.wait()
+        print(f"Standby {args.standby_dir} holds {len(replicator.standby.orders)} orders")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""Sales reports over the order history.
+
+Every report is built from `summarise` partials, which `merge` combines.
+`z_report` is the end-of-shift summary: gross sales, paid against unpaid,
+cancellations, units per item, sales per staff member and the average
+ticket, all gathered in a single pass over the orders of the shift (see
+OrderStore.shift_orders). Closing the shift records it in the order store
+so the next report starts after it, and writes the report to REPORT_DIR as
+text and JSON.
+
+`SalesReport` covers any date range of the whole history, such as the
+year to date. The checkpoint's offset index (history_index) gives the
+byte spans of the orders dated in the range, so orders outside it are never
+read. The spans are shared out between worker processes. Each worker maps
+the file and decodes its spans a batch at a time, and the parent merges
+their partials with the journal tail. Parsing is the bulk of the work, so
+the report scales with the number of cores, and memory stays flat
+whatever the size of the history. A checkpoint that can't be indexed (not
+laid out as order_store writes it) is streamed whole by one worker instead.
+
+Usage:
+    python reports.py                                # preview the open shift
+    python reports.py --close                        # close it and write the report files
+    python reports.py --sales --from 2025-01-01      # sales report, year to date
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+import history_index
+import instrumentation
+import order_store
+from locks import file_lock
+
+REPORT_DIR = os.path.join(os.path.dirname(__file__), "reports")
+
+
+def summarise(orders, date_from=None, date_to=None, skip=()):
+    """Aggregate `orders` in one pass into a partial result for `merge`.
+
+    Orders dated outside [date_from, date_to] (inclusive "YYYY-MM-DD") or
+    numbered in `skip` are left out.
+    """
+    partial = {"orders": 0, "gross": 0, "paid_count": 0, "paid_total": 0, "lowest": None, "highest": None,
+               "first": None, "last": None, "items": {}, "staff": {}, "days": {}}
+    items, staff, days = partial["items"], partial["staff"], partial["days"]
+    for order in orders:
+        date = order.get("date", "")
+        day = date[:10]
+        if (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        number = order["order_number"]
+        if number in skip:
+            continue
+        total = order.get("total", 0)
+        partial["orders"] += 1
+        partial["gross"] += total
+        if order.get("paid"):
+            partial["paid_count"] += 1
+            partial["paid_total"] += total
+        if partial["lowest"] is None or number < partial["lowest"]:
+            partial["lowest"] = number
+        if partial["highest"] is None or number > partial["highest"]:
+            partial["highest"] = number
+        if partial["first"] is None or date < partial["first"]:
+            partial["first"] = date
+        if partial["last"] is None or date > partial["last"]:
+            partial["last"] = date
+        line = staff.setdefault(order.get("staff", ""), {"orders": 0, "sales": 0})
+        line["orders"] += 1
+        line["sales"] += total
+        line = days.setdefault(day, {"orders": 0, "sales": 0})
+        line["orders"] += 1
+        line["sales"] += total
+        for item in order.get("items", []):
+            units = item.get("count", 1)
+            line = items.setdefault(item["name"], {"units": 0, "sales": 0})
+            line["units"] += units
+            line["sales"] += item["price"] * units
+    return partial
+
+
+def _merge_lines(into, lines):
+    for key, line in lines.items():
+        target = into.get(key)
+        if target is None:
+            into[key] = dict(line)
+        else:
+            for field, value in line.items():
+                target[field] += value
+
+
+def merge(partials):
+    """Combine partial results from `summarise` into one."""
+    merged = summarise(())
+    for partial in partials:
+        for field in ("orders", "gross", "paid_count", "paid_total"):
+            merged[field] += partial[field]
+        for field, pick in (("lowest", min), ("highest", max), ("first", min), ("last", max)):
+            values = [v for v in (merged[field], partial[field]) if v is not None]
+            merged[field] = pick(values) if values else None
+        for field in ("items", "staff", "days"):
+            _merge_lines(merged[field], partial[field])
+    return merged
+
+
+def _totals(partial):
+    # Report fields shared by the Z-report and the sales report
+    count = partial["orders"]
+    return {
+        "orders": count,
+        "gross_sales": partial["gross"],
+        "paid": {"count": partial["paid_count"], "total": partial["paid_total"]},
+        "unpaid": {"count": count - partial["paid_count"], "total": partial["gross"] - partial["paid_total"]},
+        "average_ticket": round(partial["gross"] / count, 2) if count else 0,
+        "items": dict(sorted(partial["items"].items(), key=lambda kv: -kv[1]["units"])),
+        "staff": dict(sorted(partial["staff"].items(), key=lambda kv: -kv[1]["sales"])),
+    }
+
+
+@instrumentation.timed_function("z_report")
+def z_report(orders, cancelled=(), shift=None):
+    """Summarise one shift in a single pass over `orders`.
+
+    `cancelled` holds the orders cancelled during the shift and `shift` is
+    the previously closed shift record (None for the first). The report's
+    "through" is the highest order number it covers, the value to close
+    the shift at.
+    """
+    partial = summarise(orders)
+    cancelled = list(cancelled)
+    report = {
+        "shift": shift["number"] + 1 if shift is not None else 1,
+        "opened_at": shift["closed_at"] if shift is not None else partial["first"],
+        "generated_at": datetime.datetime.now().strftime(order_store.TIME_FORMAT),
+        "from_order": partial["lowest"],
+        "through": max(partial["highest"] or 0, shift["through"] if shift is not None else 0),
+        "first_order": partial["first"],
+        "last_order": partial["last"],
+        "cancelled": {"count": len(cancelled), "total": sum(order.get("total", 0) for order in cancelled)},
+    }
+    report.update(_totals(partial))
+    return report
+
+
+def shift_report(store):
+    """Z-report of the open shift of an OrderStore, brought up to date first."""
+    store.refresh()
+    return z_report(store.shift_orders(), [c["order"] for c in store.cancelled.values()], store.shift)
+
+
+def format_z_report(report):
+    lines = [
+        f"Z-REPORT  shift {report['shift']}",
+        f"Opened:    {report['opened_at'] or '-'}",
+        f"Generated: {report['generated_at']}",
+        f"Orders:    #{report['from_order']} to #{report['through']}, {report['first_order']} to {report['last_order']}"
+        if report["orders"] else "Orders:    none",
+        "",
+        f"{'Orders':<24}{report['orders']:>10}",
+        f"{'Gross sales':<24}{'$' + str(report['gross_sales']):>10}",
+        f"{'Paid':<14}{report['paid']['count']:>10}{'$' + str(report['paid']['total']):>10}",
+        f"{'Unpaid':<14}{report['unpaid']['count']:>10}{'$' + str(report['unpaid']['total']):>10}",
+        f"{'Cancelled':<14}{report['cancelled']['count']:>10}{'$' + str(report['cancelled']['total']):>10}",
+        f"{'Average ticket':<24}{'$' + format(report['average_ticket'], '.2f'):>10}",
+        "",
+        f"{'Item':<24}{'units':>10}{'sales':>10}",
+    ]
+    for name, line in report["items"].items():
+        lines.append(f"{name:<24}{line['units']:>10}{'$' + str(line['sales']):>10}")
+    lines += ["", f"{'Staff':<24}{'orders':>10}{'sales':>10}"]
+    for name, line in report["staff"].items():
+        lines.append(f"{name:<24}{line['orders']:>10}{'$' + str(line['sales']):>10}")
+    return "\n".join(lines)
+
+
+def write_z_report(report, directory=REPORT_DIR):
+    """Write the report as text and JSON; returns the two paths."""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    base = os.path.join(directory, f"z-report-shift{report['shift']}-{stamp}")
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write(format_z_report(report) + "\n")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    return base + ".txt", base + ".json"
+
+
+def close_shift(store, directory=REPORT_DIR):
+    """Report the open shift, mark it closed in the store and write the files.
+
+    Returns (report, paths).
+    """
+    report = shift_report(store)
+    shift = store.close_shift(report["through"])
+    report["closed_at"] = shift["closed_at"]
+    return report, write_z_report(report, directory)
+
+
+# Partitions smaller than this are not worth a worker process
+MIN_PARTITION_BYTES = 256 * 1024
+
+
+def _partition(spans, parts):
+    # Consecutive byte spans grouped into up to `parts` lists of similar size
+    size = sum(end - start for start, end in spans)
+    parts = max(1, min(parts, size // MIN_PARTITION_BYTES))
+    partitions, current, filled = [], [], 0
+    for start, end in spans:
+        current.append((start, end))
+        filled += end - start
+        if filled * parts >= size * (len(partitions) + 1) and len(partitions) < parts - 1:
+            partitions.append(current)
+            current = []
+    if current:
+        partitions.append(current)
+    return partitions
+
+
+def _summarise_spans(path, spans, date_from, date_to, skip):
+    # Worker process: decode the orders in some spans of the checkpoint and summarise them
+    with history_index.HistoryFile(path) as history:
+        return summarise(history.decode(spans), date_from, date_to, skip)
+
+
+def _summarise_file(path, date_from, date_to, skip):
+    # Worker process: stream the whole checkpoint, for one that can't be indexed
+    import order_export
+
+    return summarise(order_export.iter_orders(path), date_from, date_to, skip)
+
+
+@contextlib.contextmanager
+def _history_snapshot(path):
+    # A checkpoint replaces orders.json rather than rewriting it, so a hard
+    # link keeps this one readable for the workers. Taken under the
+    # checkpoint lock so the journal tail read with it matches.
+    snapshot = f"{path}.{os.getpid()}.report"
+    with file_lock(path + ".checkpoint"):
+        if os.path.exists(path):
+            try:
+                os.link(path, snapshot)
+            except OSError:
+                shutil.copyfile(path, snapshot)
+        else:
+            with open(snapshot, "w", encoding="utf-8") as f:
+                f.write("[]")
+        changes = order_store.tail_changes(path)
+    try:
+        yield snapshot, changes
+    finally:
+        try:
+            os.remove(snapshot)
+        except OSError:
+            pass
+
+
+def make_executor(workers=None):
+    """Process pool for SalesReport. Workers are spawned, not forked, so
+    they don't inherit the till's Tk state or background threads."""
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                                  mp_context=multiprocessing.get_context("spawn"))
+
+
+class SalesReport:
+    """Sales summary of the history between two dates, computed in parallel.
+
+    `start(executor)` hands the partitions to the pool and returns at once;
+    the caller polls `done()` / `progress()` (the till does so from Tk's
+    after()) and then calls `result()`.
+    """
+    def __init__(self, path=order_store.ORDERS_FILE, date_from=None, date_to=None):
+        self.path = path
+        self.date_from = date_from
+        self.date_to = date_to
+        self._futures = []
+        self._tail = None
+        self._snapshot = None
+        self._started = None
+
+    def start(self, executor, parts=None):
+        self._started = time.perf_counter()
+        # The snapshot is released by result() or cancel(), or here if
+        # anything below fails
+        with contextlib.ExitStack() as stack:
+            snapshot, changes = stack.enter_context(_history_snapshot(self.path))
+            # The journal tail supersedes those orders' checkpointed versions
+            skip = frozenset(changes)
+            try:
+                # The snapshot is a link to orders.json, so its index is orders.json's
+                with history_index.HistoryFile(snapshot, self.path + history_index.INDEX_SUFFIX) as history:
+                    index = history.index
+                    spans = list(index.spans(index.for_days(self.date_from, self.date_to)))
+            except ValueError:
+                # Not laid out as order_store writes it (edited by hand?):
+                # one worker streams the whole file instead
+                self._futures = [executor.submit(_summarise_file, snapshot, self.date_from, self.date_to, skip)]
+            else:
+                self._futures = [executor.submit(_summarise_spans, snapshot, partition, self.date_from, self.date_to, skip)
+                                 for partition in _partition(spans, parts or 2 * os.cpu_count())]
+            self._tail = summarise((order for order in changes.values() if order is not None),
+                                   self.date_from, self.date_to)
+            self._snapshot = stack.pop_all()
+        return self
+
+    def progress(self):
+        """(partitions finished, partitions) so far."""
+        return sum(1 for future in self._futures if future.done()), len(self._futures)
+
+    def done(self):
+        return all(future.done() for future in self._futures)
+
+    def cancel(self):
+        for future in self._futures:
+            future.cancel()
+        self._close()
+
+    def _close(self):
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    def result(self):
+        """Wait for the workers and return the merged report."""
+        try:
+            partials = [future.result() for future in self._futures]
+        finally:
+            self._close()
+        partial = merge(partials + [self._tail])
+        report = {
+            "from": self.date_from,
+            "to": self.date_to,
+            "generated_at": datetime.datetime.now().strftime(order_store.TIME_FORMAT),
+            "first_order": partial["first"],
+            "last_order": partial["last"],
+            "partitions": len(self._futures),
+            "seconds": round(time.perf_counter() - self._started, 3),
+        }
+        report.update(_totals(partial))
+        report["days"] = dict(sorted(partial["days"].items()))
+        return report
+
+
+def format_sales_report(report):
+    lines = [
+        f"SALES REPORT  {report['from'] or 'start'} to {report['to'] or 'today'}",
+        f"Generated: {report['generated_at']}  ({report['partitions']} partitions, {report['seconds']} s)",
+        "",
+        f"{'Orders':<24}{report['orders']:>10}",
+        f"{'Gross sales':<24}{'$' + str(report['gross_sales']):>10}",
+        f"{'Paid':<14}{report['paid']['count']:>10}{'$' + str(report['paid']['total']):>10}",
+        f"{'Unpaid':<14}{report['unpaid']['count']:>10}{'$' + str(report['unpaid']['total']):>10}",
+        f"{'Average ticket':<24}{'$' + format(report['average_ticket'], '.2f'):>10}",
+        f"{'Trading days':<24}{len(report['days']):>10}",
+        "",
+        f"{'Item':<24}{'units':>10}{'sales':>10}",
+    ]
+    for name, line in report["items"].items():
+        lines.append(f"{name:<24}{line['units']:>10}{'$' + str(line['sales']):>10}")
+    lines += ["", f"{'Staff':<24}{'orders':>10}{'sales':>10}"]
+    for name, line in report["staff"].items():
+        lines.append(f"{name:<24}{line['orders']:>10}{'$' + str(line['sales']):>10}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-of-shift Z-report and sales reports.")
+    parser.add_argument("--close", action="store_true", help="close the shift and write the report files")
+    parser.add_argument("--sales", action="store_true", help="sales report over a date range of the whole history")
+    parser.add_argument("--from", dest="date_from", metavar="YYYY-MM-DD", help="first day of the sales report")
+    parser.add_argument("--to", dest="date_to", metavar="YYYY-MM-DD", help="last day of the sales report")
+    parser.add_argument("--workers", type=int, help="worker processes for the sales report (default: CPU count)")
+    parser.add_argument("--source", default=order_store.ORDERS_FILE, help="order store (default orders.json)")
+    args = parser.parse_args(argv)
+    if args.sales:
+        with make_executor(args.workers) as executor:
+            report = SalesReport(args.source, args.date_from, args.date_to).start(executor).result()
+        print(format_sales_report(report))
+        return
+    store = order_store.OrderStore(args.source)
+    if args.close:
+        report, paths = close_shift(store)
+        print(format_z_report(report))
+        print(f"\nShift {report['shift']} closed; report written to {paths[0]} and {paths[1]}")
+    else:
+        print(format_z_report(shift_report(store)))
+    store.wait()
+
+
+if __name__ == "__main__":
+    main()
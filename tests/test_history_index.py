@@ -0,0 +1,50 @@
+"""Index checkpoints as order_store writes them, and as Windows text files do."""
+import json
+import os
+
+import pytest
+
+import history_index
+import order_store
+
+
+def orders(count):
+    return [{"order_number": number, "items": [{"name": "Latte", "price": 5, "count": 1}], "total": 5,
+             "staff": "sam", "paid": True, "date": f"2025-10-{10 + number % 5:02d} 09:00:00"}
+            for number in range(1, count + 1)]
+
+
+def write(path, records, newline):
+    with open(path, "wb") as f:
+        f.write(json.dumps(records, indent=4).replace("\n", newline).encode("utf-8"))
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_read_orders_by_day_and_number(tmp_path, newline):
+    path = str(tmp_path / "orders.json")
+    records = orders(40)
+    write(path, records, newline)
+    assert len(history_index.write_index(path)) == 40
+    day = [order for order in records if order["date"].startswith("2025-10-12")]
+    assert list(history_index.read_orders(path, "2025-10-12", "2025-10-12")) == day
+    assert list(history_index.read_orders(path, first=7, last=9)) == records[6:9]
+
+
+def test_shipped_orders_file_indexes():
+    shipped = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "orders.json")
+    with open(shipped, "rb") as f:
+        data = f.read()
+    index = history_index.HistoryIndex.scan(data, (0, 0))
+    assert len(index) == len(json.loads(data))
+
+
+def test_checkpoint_has_unix_line_endings(tmp_path):
+    path = str(tmp_path / "orders.json")
+    store = order_store.OrderStore(path)
+    for order in orders(3):
+        store.add(order)
+    store.checkpoint(background=False)
+    with open(path, "rb") as f:
+        assert b"\r\n" not in f.read()
+    with history_index.HistoryFile(path) as history:
+        assert len(history.index) == 3
@@ -0,0 +1,48 @@
+"""OrderStore kept in step with its journal, across stores sharing the files."""
+import random
+
+import order_store
+import user_store
+
+
+def test_updates_and_cancels_keep_order_and_positions(tmp_path):
+    path = str(tmp_path / "orders.json")
+    store = order_store.OrderStore(path)
+    rng = random.Random(7)
+    numbers = [store.add({"items": [], "total": 4, "paid": False}) for _ in range(60)]
+    for _ in range(200):
+        number = rng.choice(numbers)
+        if rng.random() < 0.3:
+            store.cancel(number)
+            numbers.remove(number)
+            numbers.append(store.add({"items": [], "total": 2, "paid": False}))
+        else:
+            store.set_paid(number, rng.random() < 0.5)
+    assert [order["order_number"] for order in store.orders] == numbers
+    assert all(store.get(number) is store.orders[i] for i, number in enumerate(numbers))
+    other = order_store.OrderStore(path)
+    assert other.orders == store.orders
+    assert (other.unpaid, other.revenue) == (store.unpaid, store.revenue)
+
+
+def test_user_store_put_and_delete(tmp_path):
+    users = user_store.UserStore(str(tmp_path / "users.json"))
+    for name in "abcde":
+        users.add(name, "secret", "Waiter")
+    users.delete("b")
+    users.set_pin("d", None)
+    users.delete("a")
+    users.add("f", "secret")
+    assert [user["username"] for user in users] == ["c", "d", "e", "f"]
+    assert [user["username"] for user in user_store.UserStore(users.path)] == ["c", "d", "e", "f"]
+
+
+def test_checkpoint_out_of_number_order(tmp_path):
+    path = tmp_path / "orders.json"
+    path.write_text('[{"order_number": 5, "items": [], "total": 1, "paid": false},'
+                    ' {"order_number": 2, "items": [], "total": 1, "paid": false}]', encoding="utf-8")
+    store = order_store.OrderStore(str(path))
+    store.set_paid(2, True)
+    store.cancel(5)
+    number = store.add({"items": [], "total": 1, "paid": False})
+    assert [(order["order_number"], order["paid"]) for order in store.orders] == [(2, True), (number, False)]
@@ -0,0 +1,49 @@
+"""Sales reports over indexed and unindexable checkpoints."""
+import concurrent.futures
+import json
+import os
+
+import pytest
+
+import reports
+
+
+def orders(count):
+    return [{"order_number": number, "items": [{"name": "Tea", "price": 3, "count": number % 3 + 1}],
+             "total": 3 * (number % 3 + 1), "staff": "sam", "paid": number % 2 == 0,
+             "date": f"2025-10-{10 + number % 5:02d} 09:00:00"}
+            for number in range(1, count + 1)]
+
+
+def run(path, date_from=None, date_to=None):
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        return reports.SalesReport(path, date_from, date_to).start(executor, parts=2).result()
+
+
+@pytest.mark.parametrize("indent", [4, None])
+def test_sales_report_totals(tmp_path, indent):
+    path = str(tmp_path / "orders.json")
+    records = orders(50)
+    with open(path, "w", encoding="utf-8") as f:
+        # Without an indent the file can't be indexed and is streamed instead
+        json.dump(records, f, indent=indent)
+    report = run(path, "2025-10-11", "2025-10-12")
+    expected = [order for order in records if order["date"][:10] in ("2025-10-11", "2025-10-12")]
+    assert report["orders"] == len(expected)
+    assert report["gross_sales"] == sum(order["total"] for order in expected)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".report")]
+
+
+def test_failed_start_releases_snapshot(tmp_path):
+    path = str(tmp_path / "orders.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(orders(5), f, indent=4)
+
+    class Broken:
+        def submit(self, *args):
+            raise RuntimeError("pool is shut down")
+
+    report = reports.SalesReport(path)
+    with pytest.raises(RuntimeError):
+        report.start(Broken())
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".report")]
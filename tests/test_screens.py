@@ -0,0 +1,131 @@
+"""Build every screen of the till, on a stubbed tkinter and temporary data."""
+import pytest
+
+import tk_stub
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    tk = tk_stub.install(monkeypatch)
+    import Final
+
+    monkeypatch.setattr(Final, "ORDERS_FILE", str(tmp_path / "orders.json"))
+    monkeypatch.setattr(Final, "USERS_FILE", str(tmp_path / "users.json"))
+    monkeypatch.setattr(Final, "STOCK_FILE", str(tmp_path / "stock.json"))
+    app = Final.App()
+    app.users.add("admin", "admin1", "Admin", pin="1111")
+    app.users.add("waiter", "waiter1", "Waiter", pin="2222")
+    app.run_idle()
+    app.shown = tk.messagebox.shown
+    yield app
+    app.inventory.stop()
+    app.destroy()
+
+
+def login(app, username):
+    app.login(app.users.get(username))
+    app.run_idle()
+
+
+def labels(widget):
+    """Texts of every widget under `widget`."""
+    found = [widget.cget("text")] if widget.cget("text") else []
+    for child in widget.winfo_children():
+        found.extend(labels(child))
+    return found
+
+
+def test_every_screen_builds(app):
+    login(app, "admin")
+    for show in (app.show_order, app.show_order_history, app.show_prep_queue, app.show_accounts,
+                 app.show_diagnostics, app.show_export, app.show_sales_report, app.show_demand,
+                 app.show_z_report, app.show_quick_switch, app.show_welcome):
+        show()
+        app.run_idle()
+    assert not [dialog for dialog in app.shown if dialog[0] == "error"]
+
+
+def test_order_flow(app):
+    import Final
+
+    login(app, "waiter")
+    app.show_order()
+    app.apply_to_cart([("add", Final.MENU_ITEMS[0], 2)])
+    app.run_idle()
+    assert "Total: $10" in labels(app)
+    app.submit_order()
+    app.apply_to_cart([("add", Final.MENU_ITEMS[1], 1)])
+    app.checkout()
+    app.run_idle()
+    unpaid, paid = app.order_store.orders
+    assert not unpaid["paid"] and paid["paid"]
+    app.show_order_history()
+    app.mark_order_paid(unpaid["order_number"])
+    app.mark_order_unpaid(unpaid["order_number"])
+    app.cancel_order(unpaid["order_number"])
+    app.show_order_history()
+    assert [order["order_number"] for order in app.order_store.orders] == [paid["order_number"]]
+
+
+def test_switch_user_rebuilds_the_screen(app):
+    import Final
+
+    login(app, "admin")
+    app.show_order_history()
+    assert "Sales Report" in labels(app)
+    app.switch_user(app.users.get("waiter"))
+    assert "Sales Report" not in labels(app)
+    app.switch_user(app.users.get("admin"))
+    assert "Sales Report" in labels(app)
+    # The order in progress survives a switch
+    app.show_order()
+    app.apply_to_cart([("add", Final.MENU_ITEMS[2], 1)])
+    app.switch_user(app.users.get("waiter"))
+    app.run_idle()
+    assert isinstance(app.current_screen, Final.OrderScreen)
+    assert "Total: $4" in labels(app)
+    app.show_accounts()
+    app.switch_user(app.users.get("waiter"))
+    assert app.current_screen is None and "Welcome waiter" in labels(app)
+
+
+def test_quick_switch_locks_out_after_wrong_pins(app):
+    import user_store
+
+    login(app, "admin")
+    app.show_quick_switch()
+    overlay = app.quick_switch
+    overlay.select("waiter")
+    for _ in range(user_store.PIN_MAX_ATTEMPTS):
+        overlay.pin_var.set("9999")
+        overlay.submit()
+    assert overlay.status.cget("text").startswith("Too many wrong PINs")
+    overlay.pin_var.set("2222")
+    overlay.submit()
+    assert app.username == "admin"
+
+
+def test_keys_reach_quick_entry_unless_the_pin_pad_is_up(app):
+    login(app, "waiter")
+    app.show_order()
+    screen = app.current_screen
+    menu_button = next(w for w in walk(app) if w.cget("text").startswith("101 "))
+    menu_button.focus_set()
+    app.key("1")
+    app.key("0")
+    assert screen.quick_entry.get() == "10"
+    app.show_quick_switch()
+    keypad_button = next(w for w in walk(app.quick_switch) if w.cget("text") == "5")
+    keypad_button.focus_set()
+    app.key("3")
+    assert screen.quick_entry.get() == "10"
+    app.quick_switch.destroy()
+    menu_button.focus_set()
+    app.key("2")
+    assert screen.quick_entry.get() == "102"
+
+
+def walk(widget):
+    yield widget
+    for child in widget.winfo_children():
+        yield from walk(child)
@@ -0,0 +1,52 @@
+"""The ticket printer's retries, failures and receipt retention."""
+import os
+import time
+
+import tickets
+
+
+def order(number, **changes):
+    return dict({"order_number": number, "items": [{"name": "Tea", "price": 3, "count": 1}], "total": 3,
+                 "staff": "sam", "paid": True, "date": "2025-10-13 09:00:00"}, **changes)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_bad_order_fails_at_once_and_printing_goes_on(tmp_path, monkeypatch):
+    attempts = []
+    monkeypatch.setattr(tickets, "RETRY_DELAYS", (0.01, 0.01))
+    printer = tickets.TicketPrinter(directory=str(tmp_path)).start()
+    write = printer.write
+    monkeypatch.setattr(printer, "write", lambda o, output: (attempts.append(o["order_number"]), write(o, output)))
+    printer.submit(order(1, items=[{"name": "Tea"}]))  # no price: KeyError
+    printer.submit(order(2))
+    printer.stop()
+    assert printer.failed == [(1, "receipt"), (1, "kitchen")]
+    assert attempts.count(1) == 2
+    assert sorted(os.listdir(tmp_path)) == ["2-kitchen.txt", "2-receipt.txt"]
+
+
+def test_offline_printer_is_retried_then_given_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(tickets, "RETRY_DELAYS", (0.01, 0.01))
+    # A directory can't be opened for writing, like a printer that is off
+    printer = tickets.TicketPrinter(receipt_printer=str(tmp_path), directory=str(tmp_path)).start()
+    printer.submit(order(1))
+    assert wait_for(lambda: printer.failed)
+    printer.stop()
+    assert printer.failed == [(1, "receipt")]
+    assert os.listdir(tmp_path) == ["1-kitchen.txt"]
+
+
+def test_receipt_directory_keeps_the_newest(tmp_path):
+    for number in range(1, 11):
+        path = tmp_path / f"{number}-receipt.txt"
+        path.write_text("old")
+        os.utime(path, (1000 + number, 1000 + number))
+    printer = tickets.TicketPrinter(directory=str(tmp_path), keep=4)
+    printer.write(order(11), "receipt")
+    assert sorted(os.listdir(tmp_path)) == ["10-receipt.txt", "11-receipt.txt", "8-receipt.txt", "9-receipt.txt"]
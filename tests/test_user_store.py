@@ -0,0 +1,29 @@
+"""Quick-switch PINs: cached checks and the lockout after wrong guesses."""
+import time
+
+import user_store
+
+
+def test_pin_lockout(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_store, "PIN_LOCKOUT_SECONDS", 0.2)
+    users = user_store.UserStore(str(tmp_path / "users.json"))
+    users.add("sam", "secret", "Waiter", pin="1234")
+    assert users.verify_pin("sam", "1234") is not None
+    for guess in range(user_store.PIN_MAX_ATTEMPTS):
+        assert users.verify_pin("sam", f"{guess:04d}") is None
+    assert users.pin_locked("sam") > 0
+    # Even the right PIN is refused until the lockout ends
+    assert users.verify_pin("sam", "1234") is None
+    time.sleep(0.25)
+    assert users.pin_locked("sam") == 0
+    assert users.verify_pin("sam", "1234") is not None
+
+
+def test_right_pin_resets_the_count(tmp_path):
+    users = user_store.UserStore(str(tmp_path / "users.json"))
+    users.add("sam", "secret", "Waiter", pin="1234")
+    for _ in range(3):
+        for guess in range(user_store.PIN_MAX_ATTEMPTS - 1):
+            assert users.verify_pin("sam", f"{guess:04d}") is None
+        assert users.verify_pin("sam", "1234") is not None
+    assert users.pin_locked("sam") == 0
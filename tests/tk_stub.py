@@ -0,0 +1,369 @@
+"""A stand-in for tkinter, so the screens can be built without a display.
+
+`install(monkeypatch)` puts fake `tkinter`, `tkinter.ttk`, `tkinter.font`
+and dialog modules in sys.modules. Widgets keep their options, children
+and bindings and ignore geometry calls; `Tk.after`/`after_idle` only queue
+callbacks, which `Tk.run_idle` runs. Dialogs answer "yes" (or cancel a
+file/string prompt) and are logged to `messagebox.shown`.
+"""
+import itertools
+import sys
+import types
+import tkinter.constants
+
+from tkinter import TclError
+
+_ids = itertools.count(1)
+
+# Widget methods that only affect what is drawn
+_IGNORED = {
+    "pack", "grid", "place", "lift", "grid_rowconfigure", "grid_columnconfigure", "title", "geometry",
+    "resizable", "bell", "update", "update_idletasks", "select_range", "yview", "yview_scroll", "bind_all",
+    "unbind_all", "itemconfig", "heading", "column", "see", "set",
+}
+
+
+class Event:
+    def __init__(self, widget, **kwargs):
+        self.widget = widget
+        self.keysym = kwargs.pop("keysym", "")
+        self.char = kwargs.pop("char", "")
+        self.__dict__.update(kwargs)
+
+
+class Variable:
+    def __init__(self, master=None, value=None, name=None):
+        self._value = value
+        self._traces = []
+
+    def get(self):
+        return self._value
+
+    def set(self, value):
+        self._value = value
+        for callback in self._traces:
+            callback("", "", "write")
+
+    def trace_add(self, mode, callback):
+        self._traces.append(callback)
+
+
+class StringVar(Variable):
+    def __init__(self, master=None, value="", name=None):
+        super().__init__(master, value, name)
+
+
+class BooleanVar(Variable):
+    def __init__(self, master=None, value=False, name=None):
+        super().__init__(master, value, name)
+
+
+class Misc:
+    def __init__(self, master=None, cnf=None, **kw):
+        self.master = master
+        self.children = []
+        self.options = dict(cnf or {}, **kw)
+        self.bindings = {}
+        self.alive = True
+        if master is not None:
+            master.children.append(self)
+
+    def __getitem__(self, key):
+        return self.options.get(key, "")
+
+    def __setitem__(self, key, value):
+        self.options[key] = value
+
+    def __getattr__(self, name):
+        # Geometry, scrolling and styling calls: accepted and ignored
+        if name not in _IGNORED:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+    def _root(self):
+        widget = self
+        while widget.master is not None:
+            widget = widget.master
+        return widget
+
+    def config(self, cnf=None, **kw):
+        self.options.update(cnf or {}, **kw)
+
+    configure = config
+
+    def cget(self, key):
+        return self.options.get(key, "")
+
+    def bind(self, sequence, func=None, add=None):
+        self.bindings.setdefault(sequence, [])
+        if not add:
+            self.bindings[sequence].clear()
+        self.bindings[sequence].append(func)
+
+    def unbind(self, sequence, funcid=None):
+        self.bindings.pop(sequence, None)
+
+    def fire(self, sequence, **kwargs):
+        """Deliver `sequence` to this widget's bindings; returns the last result."""
+        result = None
+        widget = kwargs.pop("widget", self)
+        for func in list(self.bindings.get(sequence, ())):
+            result = func(Event(widget, **kwargs))
+        return result
+
+    def winfo_children(self):
+        return list(self.children)
+
+    def winfo_exists(self):
+        return self.alive
+
+    def winfo_width(self):
+        return 1
+
+    winfo_height = winfo_reqwidth = winfo_reqheight = winfo_width
+
+    def focus_set(self):
+        self._root().focused = self
+
+    def after(self, ms, func=None, *args):
+        return self._root().after(ms, func, *args)
+
+    def after_idle(self, func, *args):
+        return self._root().after_idle(func, *args)
+
+    def after_cancel(self, after_id):
+        self._root().after_cancel(after_id)
+
+    def destroy(self):
+        if not self.alive:
+            return
+        for child in list(self.children):
+            child.destroy()
+        self.alive = False
+        if self.master is not None and self in self.master.children:
+            self.master.children.remove(self)
+        self.fire("<Destroy>")
+
+
+class Widget(Misc):
+    pass
+
+
+class Tk(Misc):
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.focused = None
+        self.idle = []
+        self.timers = []
+
+    def after(self, ms, func=None, *args):
+        after_id = f"after#{next(_ids)}"
+        self.timers.append((after_id, ms, func, args))
+        return after_id
+
+    def after_idle(self, func, *args):
+        after_id = f"after#{next(_ids)}"
+        self.idle.append((after_id, func, args))
+        return after_id
+
+    def after_cancel(self, after_id):
+        self.idle = [call for call in self.idle if call[0] != after_id]
+        self.timers = [call for call in self.timers if call[0] != after_id]
+
+    def run_idle(self):
+        """Run queued idle callbacks (and any they queue) until none are left."""
+        while self.idle:
+            _, func, args = self.idle.pop(0)
+            func(*args)
+
+    def key(self, char="", keysym=None):
+        """Type a key with focus on the focused widget (or the window)."""
+        widget = self.focused or self
+        keysym = keysym or char
+        # Bind tags in Tk's order: the widget, its class, then the window
+        if widget.fire("<Key>", char=char, keysym=keysym) == "break":
+            return
+        if isinstance(widget, Entry) and char:
+            widget.insert(tkinter.constants.END, char)
+        if widget is not self:
+            self.fire("<Key>", widget=widget, char=char, keysym=keysym)
+
+
+class Frame(Widget):
+    pass
+
+
+class Label(Widget):
+    pass
+
+
+class Scrollbar(Widget):
+    pass
+
+
+class Canvas(Widget):
+    def create_window(self, *args, **kwargs):
+        return next(_ids)
+
+    create_text = create_rectangle = create_window
+
+    def delete(self, *items):
+        pass
+
+    def bbox(self, *args):
+        return (0, 0, 1, 1)
+
+
+class Button(Widget):
+    def invoke(self):
+        if self.options.get("state") != tkinter.constants.DISABLED and self.options.get("command"):
+            return self.options["command"]()
+
+
+class Checkbutton(Button):
+    pass
+
+
+class Entry(Widget):
+    def __init__(self, master=None, cnf=None, **kw):
+        super().__init__(master, cnf, **kw)
+        self.variable = self.options.get("textvariable") or StringVar()
+
+    def get(self):
+        return self.variable.get()
+
+    def insert(self, index, text):
+        value = self.variable.get()
+        self.variable.set(value + text if index == tkinter.constants.END else text + value)
+
+    def delete(self, first, last=None):
+        self.variable.set("")
+
+
+class Text(Widget):
+    def __init__(self, master=None, cnf=None, **kw):
+        super().__init__(master, cnf, **kw)
+        self.text = ""
+
+    def insert(self, index, text):
+        self.text += text
+
+    def delete(self, first, last=None):
+        self.text = ""
+
+    def get(self, first, last=None):
+        return self.text
+
+
+class OptionMenu(Widget):
+    def __init__(self, master, variable, value, *values, command=None):
+        super().__init__(master, command=command)
+        self.variable = variable
+        self.values = [value, *values]
+
+    def select(self, value):
+        self.variable.set(value)
+        if self.options["command"]:
+            self.options["command"](value)
+
+
+class Treeview(Widget):
+    def __init__(self, master=None, **kw):
+        super().__init__(master, **kw)
+        self.items = {}
+        self.attached = []
+        self.selected = ()
+
+    def insert(self, parent, index, iid=None, **kw):
+        iid = iid if iid is not None else f"I{next(_ids)}"
+        self.items[iid] = kw
+        self.attached.insert(len(self.attached) if index == tkinter.constants.END else index, iid)
+        return iid
+
+    def exists(self, iid):
+        return iid in self.items
+
+    def move(self, iid, parent, index):
+        if iid in self.attached:
+            self.attached.remove(iid)
+        self.attached.insert(index, iid)
+
+    def detach(self, iid):
+        if iid in self.attached:
+            self.attached.remove(iid)
+
+    def delete(self, iid):
+        self.detach(iid)
+        self.items.pop(iid, None)
+
+    def get_children(self, item=""):
+        return tuple(self.attached)
+
+    def item(self, iid, **kw):
+        self.items[iid].update(kw)
+        return self.items[iid]
+
+    def selection(self):
+        return self.selected
+
+    def selection_set(self, iid):
+        self.selected = (iid,)
+
+
+class Combobox(Entry):
+    pass
+
+
+class Style:
+    def __init__(self, master=None):
+        self.styles = {}
+
+    def configure(self, style, **kw):
+        self.styles.setdefault(style, {}).update(kw)
+
+
+class Font:
+    def __init__(self, root=None, font=None, name=None, exists=False, **options):
+        self.name = name
+        self.options = options
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    return module
+
+
+def install(monkeypatch):
+    """Swap the stub in for tkinter until `monkeypatch` is undone."""
+    shown = []
+
+    def dialog(kind, answer):
+        def show(*args, **kwargs):
+            shown.append((kind, *args))
+            return answer
+        return show
+
+    constants = {name: value for name, value in vars(tkinter.constants).items() if name.isupper()}
+    messagebox = _module("tkinter.messagebox", shown=shown, showinfo=dialog("info", "ok"),
+                         showwarning=dialog("warning", "ok"), showerror=dialog("error", "ok"),
+                         askyesno=dialog("askyesno", True))
+    filedialog = _module("tkinter.filedialog", asksaveasfilename=dialog("save", ""))
+    simpledialog = _module("tkinter.simpledialog", askstring=dialog("askstring", None))
+    ttk = _module("tkinter.ttk", Style=Style, Treeview=Treeview, Scrollbar=Scrollbar, Combobox=Combobox,
+                  Entry=Entry, Progressbar=Widget)
+    font = _module("tkinter.font", Font=Font)
+    tk = _module("tkinter", **constants, TclError=TclError, Tk=Tk, Misc=Misc, Widget=Widget, Frame=Frame,
+                 Label=Label, Button=Button, Checkbutton=Checkbutton, Entry=Entry, Text=Text, Canvas=Canvas,
+                 Scrollbar=Scrollbar, OptionMenu=OptionMenu, StringVar=StringVar, BooleanVar=BooleanVar,
+                 Variable=Variable, messagebox=messagebox, filedialog=filedialog, simpledialog=simpledialog,
+                 ttk=ttk, font=font)
+    for name, module in [("tkinter", tk), ("tkinter.messagebox", messagebox), ("tkinter.filedialog", filedialog),
+                         ("tkinter.simpledialog", simpledialog), ("tkinter.ttk", ttk), ("tkinter.font", font)]:
+        monkeypatch.setitem(sys.modules, name, module)
+    # Modules that bound tkinter at import are imported afresh against the
+    # stub, and dropped again (or restored) when the test is over
+    for name in ("Final", "ui_style"):
+        monkeypatch.setitem(sys.modules, name, sys.modules.get(name))
+        monkeypatch.delitem(sys.modules, name)
+    return tk
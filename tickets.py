@@ -0,0 +1,308 @@
+"""Customer receipts and kitchen tickets, printed off the Tk thread.
+
+Once an order is recorded the till hands it to `TicketPrinter.submit` and
+goes straight back to taking orders. A worker thread takes jobs from a
+bounded queue, renders the receipt and the kitchen ticket from templates
+compiled once at import, and writes them out:
+  * as an ESC/POS byte stream to a printer device (e.g. /dev/usb/lp0) or
+    any file path given for the receipt or kitchen printer;
+  * otherwise as plain text files in RECEIPT_DIR;
+  * plus, if asked, a one-page PDF of the receipt in RECEIPT_DIR.
+An output that fails (printer offline, out of paper) is retried after each
+of RETRY_DELAYS in turn while later orders keep printing, then given up on
+and left in `failed`. Any other error (bad order data, a template that
+doesn't fit it) would only fail again, so it goes into `failed` at once
+with its traceback printed. Only the newest RECEIPT_KEEP files are kept in
+the receipts directory. If the queue is full the order is not queued at all
+and goes into `failed` too; reprint with
+    python tickets.py ORDER_NUMBER [--receipt-printer PATH] [--kitchen-printer PATH]
+"""
+import argparse
+import heapq
+import os
+import queue
+import threading
+import time
+import traceback
+
+import metrics
+
+RECEIPT_DIR = os.path.join(os.path.dirname(__file__), "receipts")
+
+SHOP_NAME = "Cafe"
+
+# Characters per line of an 80 mm printer in its standard font
+LINE_WIDTH = 42
+
+# Orders waiting to print before new ones are turned away
+QUEUE_SIZE = 64
+
+# Seconds between attempts at an output that failed
+RETRY_DELAYS = (1, 2, 5, 10, 30)
+
+# Files kept in the receipts directory (the oldest go first), and how many
+# are written between checks
+RECEIPT_KEEP = 2000
+PRUNE_EVERY = 100
+
+# ESC/POS: reset, then a prefix per template row style; feed and cut at the end
+ESC_INIT = b"\x1b@"
+ESC_CUT = b"\n\n\n\x1dV\x42\x00"
+STYLES = {
+    "left": b"\x1ba\x00\x1bE\x00\x1d!\x00",
+    "center": b"\x1ba\x01\x1bE\x00\x1d!\x00",
+    "bold": b"\x1ba\x00\x1bE\x01\x1d!\x00",
+    "title": b"\x1ba\x01\x1bE\x01\x1d!\x11",
+}
+
+# Template rows are (style, format[, list]); a row naming a list is
+# repeated once per entry of that list in the render context
+RECEIPT_TEMPLATE = [
+    ("title", "{shop}"),
+    ("center", "Order #{order_number}"),
+    ("center", "{date}  {staff}"),
+    ("left", "{rule}"),
+    ("left", "{count:>3} x {name:<26.26}{amount:>9}", "items"),
+    ("left", "      {name:<26.26}{amount:>9}", "discounts"),
+    ("left", "{rule}"),
+    ("bold", "TOTAL{total:>37}"),
+    ("center", "{status}"),
+    ("center", "Thank you!"),
+]
+KITCHEN_TEMPLATE = [
+    ("title", "#{order_number}"),
+    ("left", "{time}  {staff}"),
+    ("left", "{rule}"),
+    ("bold", "{count:>3} x {name}", "items"),
+]
+
+
+class Template:
+    """Rows bound to their format methods and ESC/POS prefixes up front."""
+    def __init__(self, rows):
+        self._rows = [(STYLES[style], style, fmt.format, repeat[0] if repeat else None)
+                      for style, fmt, *repeat in rows]
+
+    def render(self, context):
+        """[(style, text)] lines for `context`."""
+        lines = []
+        for _, style, fmt, repeat in self._rows:
+            if repeat is None:
+                lines.append((style, fmt(**context)))
+            else:
+                lines.extend((style, fmt(**dict(context, **entry))) for entry in context[repeat])
+        return lines
+
+    def escpos(self, context):
+        out = [ESC_INIT]
+        for prefix, _, fmt, repeat in self._rows:
+            entries = [context] if repeat is None else [dict(context, **entry) for entry in context[repeat]]
+            for entry in entries:
+                out.append(prefix + fmt(**entry).encode("cp437", "replace") + b"\n")
+        out.append(ESC_CUT)
+        return b"".join(out)
+
+
+RECEIPT = Template(RECEIPT_TEMPLATE)
+KITCHEN = Template(KITCHEN_TEMPLATE)
+
+
+def _context(order):
+    items = [{"count": item.get("count", 1), "name": item["name"],
+              "amount": f"${item['price'] * item.get('count', 1)}"} for item in order["items"]]
+    discounts = [{"name": discount["name"], "amount": f"-${discount['amount']}"}
+                 for discount in order.get("discounts", [])]
+    return {"shop": SHOP_NAME, "order_number": order["order_number"], "date": order.get("date", ""),
+            "time": order.get("date", "")[11:16], "staff": order.get("staff", ""), "rule": "-" * LINE_WIDTH,
+            "items": items, "discounts": discounts, "total": f"${order['total']}",
+            "status": "PAID" if order.get("paid") else "TO PAY"}
+
+
+def text(template, order):
+    lines = template.render(_context(order))
+    return "".join((line.center(LINE_WIDTH).rstrip() if style in ("center", "title") else line) + "\n"
+                   for style, line in lines)
+
+
+def pdf(template, order):
+    """A single-page PDF of the rendered lines in 10 pt Courier."""
+    lines = template.render(_context(order))
+    height = 40 + 14 * len(lines)
+    stream = ["BT", "/F1 10 Tf", f"20 {height - 24} Td", "14 TL"]
+    for _, line in lines:
+        escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream.append(f"({escaped}) '")
+    stream.append("ET")
+    content = "\n".join(stream).encode("latin-1", "replace")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {LINE_WIDTH * 6 + 40} {height}] "
+        f"/Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>".encode("ascii"),
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>",
+    ]
+    out = [b"%PDF-1.4\n"]
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(sum(len(part) for part in out))
+        out.append(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref_at = sum(len(part) for part in out)
+    out.append(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.extend(b"%010d 00000 n \n" % offset for offset in offsets)
+    out.append(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at))
+    return b"".join(out)
+
+
+class TicketPrinter:
+    """Bounded queue of orders to print, drained by one daemon thread."""
+    def __init__(self, receipt_printer=None, kitchen_printer=None, pdf_receipts=False,
+                 directory=RECEIPT_DIR, queue_size=QUEUE_SIZE, keep=RECEIPT_KEEP):
+        self.receipt_printer = receipt_printer
+        self.kitchen_printer = kitchen_printer
+        self.pdf_receipts = pdf_receipts
+        self.directory = directory
+        self.keep = keep
+        self._written = 0
+        # (order number, output) pairs that could not be printed
+        self.failed = []
+        self.error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        # heap of (due time, sequence, order, output, attempt)
+        self._retries = []
+        self._sequence = 0
+        self._thread = threading.Thread(target=self._run, name="ticket-printer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, order):
+        """Queue `order` for printing; never blocks the caller."""
+        try:
+            self._queue.put_nowait(order)
+        except queue.Full:
+            self.failed.append((order["order_number"], "all"))
+            metrics.inc("cafe_tickets_failed_total", 1, {"output": "all"})
+
+    def stop(self, timeout=5.0):
+        """Let queued orders print for up to `timeout` seconds."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def outputs(self):
+        outputs = ["receipt", "kitchen"]
+        if self.pdf_receipts:
+            outputs.append("pdf")
+        return outputs
+
+    def _run(self):
+        while True:
+            wait = self._retries[0][0] - time.monotonic() if self._retries else None
+            try:
+                order = self._queue.get(timeout=max(wait, 0) if wait is not None else None)
+            except queue.Empty:
+                order = False
+            if order is None:
+                # Shutting down: whatever is still waiting for a retry failed
+                self.failed.extend((retry[2]["order_number"], retry[3]) for retry in self._retries)
+                break
+            if order:
+                for output in self.outputs():
+                    self._attempt(order, output, 0)
+            while self._retries and self._retries[0][0] <= time.monotonic():
+                _, _, retry_order, output, attempt = heapq.heappop(self._retries)
+                self._attempt(retry_order, output, attempt)
+
+    def _attempt(self, order, output, attempt):
+        try:
+            self.write(order, output)
+            metrics.inc("cafe_tickets_printed_total", 1, {"output": output})
+            self.error = None
+        except OSError as e:
+            self.error = f"Order #{order['order_number']} {output}: {e}"
+            if attempt < len(RETRY_DELAYS):
+                self._sequence += 1
+                heapq.heappush(self._retries, (time.monotonic() + RETRY_DELAYS[attempt], self._sequence,
+                                               order, output, attempt + 1))
+            else:
+                self._give_up(order, output)
+        except Exception as e:
+            # A bad order or template fails the same way every time; caught
+            # so it doesn't end this thread and every ticket after it
+            traceback.print_exc()
+            self.error = f"Order #{order['order_number']} {output}: {e!r}"
+            self._give_up(order, output)
+
+    def _give_up(self, order, output):
+        self.failed.append((order["order_number"], output))
+        metrics.inc("cafe_tickets_failed_total", 1, {"output": output})
+
+    def write(self, order, output):
+        """Render and write one output for `order` now, on this thread."""
+        number = order["order_number"]
+        if output == "pdf":
+            self._write_file(f"{number}-receipt.pdf", pdf(RECEIPT, order))
+            return
+        template, device = (RECEIPT, self.receipt_printer) if output == "receipt" else (KITCHEN, self.kitchen_printer)
+        if device:
+            with open(device, "ab") as f:
+                f.write(template.escpos(_context(order)))
+        else:
+            self._write_file(f"{number}-{output}.txt", text(template, order).encode("utf-8"))
+
+    def _write_file(self, name, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = os.path.join(self.directory, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+        if self.keep is not None and self._written % PRUNE_EVERY == 0:
+            self._prune()
+        self._written += 1
+
+    def _prune(self):
+        # Delete all but the `keep` newest files
+        paths = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                try:
+                    paths.append((entry.stat().st_mtime_ns, entry.path))
+                except OSError:
+                    continue
+        if len(paths) <= self.keep:
+            return
+        paths.sort()
+        for _, path in paths[:len(paths) - self.keep]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def main(argv=None):
+    import order_store
+
+    parser = argparse.ArgumentParser(description="Reprint an order's receipt and kitchen ticket.")
+    parser.add_argument("order_number", type=int)
+    parser.add_argument("--receipt-printer", help="receipt printer device or file (default: text file)")
+    parser.add_argument("--kitchen-printer", help="kitchen printer device or file (default: text file)")
+    parser.add_argument("--pdf", action="store_true", help="also write a PDF receipt")
+    parser.add_argument("--only", choices=["receipt", "kitchen"], help="print just one of the two")
+    args = parser.parse_args(argv)
+
+    order = order_store.OrderStore(order_store.ORDERS_FILE).get(args.order_number)
+    if order is None:
+        parser.error(f"No order #{args.order_number}")
+    printer = TicketPrinter(args.receipt_printer, args.kitchen_printer, args.pdf)
+    for output in printer.outputs():
+        if args.only in (None, output) or (output == "pdf" and args.only == "receipt"):
+            printer.write(order, output)
+    print(f"Printed order #{args.order_number}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""Record logical UI actions of a till session and replay them as a benchmark.
+
+Recording (``python Final.py --record DIR``) copies the starting data
+files into DIR and appends one JSON line per top-level user action to
+DIR/session.jsonl: logins, navigation, cart changes, submit/checkout and
+the order list actions. App methods opt in with the `recorded` decorator.
+
+Replaying (``python ui_replay.py DIR``) builds a fresh App on a copy of
+those starting files, performs the same actions in order and times each
+one until Tk has finished redrawing. Dialogs are answered automatically.
+Without a $DISPLAY it starts Xvfb if one is installed.
+
+Before replaying it launches the till COLD_STARTS times in a new Python
+process on the same files and reports, as the "cold_start_interactive"
+and "cold_start_loaded" rows, the time from launch until the login frame
+is drawn and until the order data has been loaded behind it.
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SESSION_FILE = "session.jsonl"
+
+# Launches of a fresh till process timed before each replay
+COLD_STARTS = 3
+
+# Run in the child process: start the till on the given files and report
+# the moment it becomes interactive and the moment its data is loaded
+_COLD_START_CHILD = """
+import sys
+import Final
+Final.ORDERS_FILE, Final.USERS_FILE, Final.STOCK_FILE = sys.argv[1:4]
+app = Final.App()
+
+def interactive():
+    print("interactive", flush=True)
+    app.after_idle(loaded)
+
+def loaded():
+    print("loaded", flush=True)
+    app.destroy()
+
+app.on_interactive = interactive
+app.mainloop()
+"""
+
+
+class SessionRecorder:
+    """Appends recorded actions to DIR/session.jsonl as they happen."""
+    def __init__(self, directory, data_files):
+        os.makedirs(directory, exist_ok=True)
+        for path in data_files:
+            if os.path.exists(path):
+                shutil.copyfile(path, os.path.join(directory, os.path.basename(path)))
+        self.directory = directory
+        self.depth = 0
+        self.start = time.monotonic()
+        self._file = open(os.path.join(directory, SESSION_FILE), "w", encoding="utf-8")
+
+    def record(self, action, args):
+        event = {"t": round(time.monotonic() - self.start, 4), "action": action, "args": args}
+        self._file.write(json.dumps(event) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def recorded(action, args_fn=None):
+    """Decorator for App methods that are user actions worth recording.
+
+    `args_fn(app, *args, **kwargs)` turns the call into JSON-friendly
+    arguments; it runs before the method so it sees the state acted on.
+    Calls made from inside another recorded action (e.g. submit_order
+    returning to the order screen) are not recorded separately.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(app, *args, **kwargs):
+            recorder = getattr(app, "recorder", None)
+            if recorder is None:
+                return method(app, *args, **kwargs)
+            if recorder.depth == 0:
+                recorder.record(action, args_fn(app, *args, **kwargs) if args_fn else {})
+            recorder.depth += 1
+            try:
+                return method(app, *args, **kwargs)
+            finally:
+                recorder.depth -= 1
+        return wrapper
+    return decorator
+
+
+def load_session(directory):
+    with open(os.path.join(directory, SESSION_FILE), "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@contextlib.contextmanager
+def auto_dialogs(messagebox):
+    # Answer every dialog at once (and "yes" to questions) while replaying
+    names = ("showinfo", "showwarning", "showerror", "askyesno")
+    saved = {name: getattr(messagebox, name) for name in names}
+    for name in names:
+        setattr(messagebox, name, lambda *a, **kw: True)
+    try:
+        yield
+    finally:
+        for name, func in saved.items():
+            setattr(messagebox, name, func)
+
+
+@contextlib.contextmanager
+def ensure_display():
+    """Make sure Tk has a display, starting a private Xvfb if needed."""
+    if os.environ.get("DISPLAY") or os.name == "nt":
+        yield
+        return
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        raise RuntimeError("No $DISPLAY and Xvfb is not installed; run under xvfb-run or a desktop session.")
+    display = ":97"
+    proc = subprocess.Popen([xvfb, display, "-screen", "0", "1365x768x24"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(0.5)
+    try:
+        yield
+    finally:
+        proc.terminate()
+        proc.wait()
+        del os.environ["DISPLAY"]
+
+
+def perform(app, event):
+    """Carry out one recorded event against `app`."""
+    import Final
+
+    action, args = event["action"], event["args"]
+    if action == "login":
+        app.login(app.users.get(args["username"]))
+    elif action == "switch_user":
+        app.switch_user(app.users.get(args["username"]))
+    elif action == "navigate":
+        getattr(app, f"show_{args['screen']}")()
+    elif action == "cart":
+        items = {item["name"]: item for item in Final.MENU_ITEMS}
+        mutations = []
+        for op, name, *rest in args["mutations"]:
+            mutations.append((op, items[name], *rest) if op == "add" else (op, name, *rest))
+        app.apply_to_cart(mutations)
+    elif action in ("submit_order", "checkout", "close_shift"):
+        getattr(app, action)()
+    elif action == "order_type":
+        app.set_order_type(args["type"])
+    elif action in ("mark_order_paid", "mark_order_unpaid", "mark_order_ready", "cancel_order"):
+        getattr(app, action)(args["order_number"])
+    else:
+        raise ValueError(f"Unknown recorded action {action!r}")
+
+
+def cold_start(orders_file, users_file, stock_file):
+    """Seconds from launching a till process to interactive, and to loaded."""
+    import Final
+
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", _COLD_START_CHILD, orders_file, users_file, stock_file],
+                            cwd=os.path.dirname(os.path.abspath(Final.__file__)), stdout=subprocess.PIPE, text=True)
+    marks = {}
+    for line in proc.stdout:
+        marks[line.strip()] = time.perf_counter() - start
+    if proc.wait() != 0 or len(marks) != 2:
+        raise RuntimeError(f"Cold start run failed (exit code {proc.returncode})")
+    return marks["interactive"], marks["loaded"]
+
+
+def replay(directory, realtime=False, cold_starts=COLD_STARTS):
+    """Replay a recording on a fresh App; returns [(event, seconds), ...]."""
+    import Final
+
+    events = load_session(directory)
+    # Everything beside session.jsonl is the data snapshot taken at startup
+    work_dir = tempfile.mkdtemp(prefix="cafe-replay-")
+    for name in os.listdir(directory):
+        if name != SESSION_FILE:
+            shutil.copyfile(os.path.join(directory, name), os.path.join(work_dir, name))
+    saved_paths = (Final.ORDERS_FILE, Final.USERS_FILE, Final.STOCK_FILE)
+    Final.ORDERS_FILE = os.path.join(work_dir, "orders.json")
+    Final.USERS_FILE = os.path.join(work_dir, "users.json")
+    Final.STOCK_FILE = os.path.join(work_dir, "stock.json")
+    timings = []
+    try:
+        with ensure_display(), auto_dialogs(Final.messagebox):
+            for _ in range(cold_starts):
+                interactive, loaded = cold_start(Final.ORDERS_FILE, Final.USERS_FILE, Final.STOCK_FILE)
+                timings.append(({"action": "cold_start_interactive", "args": {}}, interactive))
+                timings.append(({"action": "cold_start_loaded", "args": {}}, loaded))
+            app = Final.App()
+            app.update()
+            started = time.monotonic()
+            for event in events:
+                if realtime:
+                    delay = event["t"] - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                start = time.perf_counter()
+                perform(app, event)
+                # Include the redraw: idle callbacks (cart refresh, geometry)
+                app.update_idletasks()
+                app.update()
+                timings.append((event, time.perf_counter() - start))
+            if app.inventory is not None:
+                app.inventory.stop()
+            app.destroy()
+    finally:
+        Final.ORDERS_FILE, Final.USERS_FILE, Final.STOCK_FILE = saved_paths
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return timings
+
+
+def summarise(timings):
+    from instrumentation import percentile
+
+    by_action = {}
+    for event, seconds in timings:
+        key = event["action"]
+        if key == "navigate":
+            key = f"navigate:{event['args']['screen']}"
+        by_action.setdefault(key, []).append(seconds)
+    summary = {}
+    for key, values in sorted(by_action.items()):
+        values.sort()
+        summary[key] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+            "total_ms": round(sum(values) * 1000, 3),
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded till session as a timed benchmark.")
+    parser.add_argument("directory", help="recording made with Final.py --record DIR")
+    parser.add_argument("--realtime", action="store_true", help="keep the recorded gaps between actions")
+    parser.add_argument("--json", dest="json_path", help="write the per-action summary as JSON")
+    parser.add_argument("--cold-starts", type=int, default=COLD_STARTS,
+                        help=f"till launches to time before replaying (default {COLD_STARTS})")
+    args = parser.parse_args(argv)
+
+    timings = replay(args.directory, args.realtime, args.cold_starts)
+    summary = summarise(timings)
+    print(f"{'action':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'total ms':>11}")
+    for key, s in summary.items():
+        print(f"{key:<28}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['max_ms']:>10.2f}{s['total_ms']:>11.2f}")
+    actions = [t for event, t in timings if not event["action"].startswith("cold_start")]
+    print(f"Replayed {len(actions)} actions in {sum(actions) * 1000:.1f} ms of action time")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Fonts and widget presets shared by every screen of the till.
+
+Screens used to pass a fresh ("Arial", 24) tuple to each widget, which Tk
+parses into a font again for each one. `font(size, *styles)` instead
+hands out one named tkinter.font.Font per family, size and style, created
+on first use and reused by every screen after that. `preset(name)`
+returns the keyword arguments of a recurring widget look (a screen title,
+an admin bar button) built from those fonts, and `ttk_style(root)`
+configures the ttk styles once per application.
+
+Named fonts belong to a Tk interpreter, so App calls `reset()` when it
+creates a new one.
+"""
+import tkinter.font as tkfont
+from tkinter import ttk
+
+FAMILY = "Arial"
+
+# Widget keyword arguments by preset name; fonts are (size, *styles)
+PRESETS = {
+    "title": {"font": (32, "bold"), "bg": "white"},
+    "admin_button": {"font": (16,), "bg": "white", "bd": 1, "relief": "solid"},
+}
+
+_fonts = {}
+_presets = {}
+_ttk_style = None
+
+
+def reset():
+    global _ttk_style
+    _fonts.clear()
+    _presets.clear()
+    _ttk_style = None
+
+
+def font(size, *styles, family=FAMILY):
+    """Shared named font, e.g. font(24), font(32, "bold")."""
+    key = (family, size, styles)
+    cached = _fonts.get(key)
+    if cached is None:
+        name = "cafe-" + "-".join([family.replace(" ", "_"), str(size), *styles])
+        cached = _fonts[key] = tkfont.Font(name=name, family=family, size=size,
+                                           weight="bold" if "bold" in styles else "normal",
+                                           slant="italic" if "italic" in styles else "roman")
+    return cached
+
+
+def preset(name):
+    """Keyword arguments for a widget in the `name` preset."""
+    kwargs = _presets.get(name)
+    if kwargs is None:
+        kwargs = _presets[name] = dict(PRESETS[name], font=font(*PRESETS[name]["font"]))
+    return kwargs
+
+
+def ttk_style(root):
+    """The application's ttk.Style, configured on first use."""
+    global _ttk_style
+    if _ttk_style is None:
+        _ttk_style = ttk.Style(root)
+        _ttk_style.configure("Accounts.Treeview", font=font(18), rowheight=36)
+        _ttk_style.configure("Accounts.Treeview.Heading", font=font(20, "bold"))
+    return _ttk_style
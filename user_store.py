@@ -0,0 +1,368 @@
+"""Shared user repository used by Final.py and the iteration entry points.
+
+`users.json` holds a list of {"username", "password_hash", "permission"}
+records, optionally with a "pin_hash" for quick staff switching; changes
+since it was last written sit in a small append-only journal beside it. Secrets
+are stored as salted scrypt hashes (PBKDF2-HMAC-SHA256 where OpenSSL lacks
+scrypt). `UserStore` keeps the records in file order together with a
+username index, so lookups are a dict access. The parsed copy is cached
+against the file's modification time and size: it is only re-read when
+another till (or another entry point) has changed the file.
+
+`migrate_passwords` folds the older `passwords.json` ({username: password},
+used by Iteration1/Iteration2) into `users.json`, and `hash_plaintext`
+replaces any plaintext "password" fields left from before hashing.
+"""
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+
+import instrumentation
+import metrics
+from locks import file_lock, stat_stamp
+
+USERS_FILE = os.path.join(os.path.dirname(__file__), "users.json")
+PASSWORDS_FILE = os.path.join(os.path.dirname(__file__), "passwords.json")
+
+# Permission given to accounts that predate permissions (passwords.json)
+DEFAULT_PERMISSION = "Waiter"
+
+# scrypt cost parameters (~16 MiB and tens of milliseconds per hash)
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 14, 8, 1
+PBKDF2_ITERATIONS = 200_000
+
+# How long a PIN verified by the full hash is trusted in memory
+PIN_SESSION_SECONDS = 12 * 60 * 60
+
+# Wrong PINs in a row after which a user's quick switch is locked, and for how long
+PIN_MAX_ATTEMPTS = 5
+PIN_LOCKOUT_SECONDS = 5 * 60
+
+
+def hash_secret(secret):
+    """Return a salted, self-describing hash string for a password or PIN."""
+    salt = os.urandom(16)
+    if hasattr(hashlib, "scrypt"):
+        digest = hashlib.scrypt(secret.encode("utf-8"), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=32)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+    digest = hashlib.pbkdf2_hmac("sha256", secret.encode("utf-8"), salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+
+def verify_secret(secret, encoded):
+    """Check `secret` against a string produced by hash_secret."""
+    try:
+        scheme, *fields = encoded.split("$")
+        if scheme == "scrypt":
+            n, r, p, salt, expected = fields
+            digest = hashlib.scrypt(secret.encode("utf-8"), salt=bytes.fromhex(salt),
+                                    n=int(n), r=int(r), p=int(p), dklen=len(expected) // 2)
+        elif scheme == "pbkdf2_sha256":
+            iterations, salt, expected = fields
+            digest = hashlib.pbkdf2_hmac("sha256", secret.encode("utf-8"), bytes.fromhex(salt), int(iterations))
+        else:
+            return False
+    except (ValueError, AttributeError):
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+# Changed records are appended to `<users file>.journal` as one JSON line
+# each ({"op": "put", "user": {...}} or {"op": "delete", "username": ...});
+# after this many entries the journal is folded back into users.json.
+COMPACT_AFTER = 100
+
+
+class UserStore:
+    """Indexed, mtime-validated view of users.json plus its change journal.
+
+    Each add, delete or PIN change appends just that record to the journal
+    instead of rewriting the whole file; other stores sharing the files
+    pick up only the new journal lines on their next refresh.
+    """
+    def __init__(self, path=USERS_FILE):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self._users = []
+        self._by_name = {}
+        # username -> index in _users, so a put or delete doesn't search the list
+        self._position = {}
+        self._stamp = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        # Verified PIN sessions: username -> (pin_hash, HMAC of the PIN, expiry)
+        self._session_key = secrets.token_bytes(32)
+        self._pin_sessions = {}
+        # username -> (wrong PINs in a row, time.monotonic() the lockout ends)
+        self._pin_failures = {}
+        self.refresh()
+
+    def _stamps(self):
+        return (stat_stamp(self.path), stat_stamp(self.journal_path))
+
+    def refresh(self):
+        """Re-read whatever changed since the files were last read or written."""
+        stamp = self._stamps()
+        if stamp == self._stamp:
+            return
+        if self._stamp is not None and stamp[0] == self._stamp[0] and stamp[1] is not None \
+                and stamp[1][1] >= self._journal_offset:
+            # users.json untouched and the journal only grew: apply the tail
+            self._read_journal()
+            self._stamp = stamp
+            return
+        users = []
+        if stamp[0] is not None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    content = f.read().strip()
+                users = json.loads(content) if content else []
+            except (json.JSONDecodeError, IOError):
+                users = []
+        self._users = users
+        self._by_name = {user["username"]: user for user in users}
+        self._position = {user["username"]: i for i, user in enumerate(users)}
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._read_journal()
+        self._stamp = stamp
+
+    def _read_journal(self):
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(self._journal_offset)
+                data = f.read()
+        except OSError:
+            return
+        # A line still being written by another till has no newline yet
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Torn by a till that crashed mid-append; skip it
+                continue
+            self._apply(entry)
+            self._journal_entries += 1
+        self._journal_offset += end
+
+    def _apply(self, entry):
+        if entry["op"] == "put":
+            user = entry["user"]
+            old = self._by_name.get(user["username"])
+            if old is None:
+                self._position[user["username"]] = len(self._users)
+                self._users.append(user)
+            else:
+                self._users[self._position[user["username"]]] = user
+            self._by_name[user["username"]] = user
+        elif entry["op"] == "delete":
+            if self._by_name.pop(entry["username"], None) is not None:
+                position = self._position.pop(entry["username"])
+                del self._users[position]
+                for i in range(position, len(self._users)):
+                    self._position[self._users[i]["username"]] = i
+
+    @instrumentation.timed_function("save_users")
+    def _append(self, entry):
+        # Caller holds the file lock and has just refreshed, so the journal
+        # ends exactly at our offset
+        start = time.perf_counter()
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8")
+        with open(self.journal_path, "ab") as f:
+            if f.tell() > self._journal_offset:
+                # Past the last complete line: a crashed till's torn write
+                f.truncate(self._journal_offset)
+            f.write(line)
+        self._apply(entry)
+        self._journal_offset += len(line)
+        self._journal_entries += 1
+        metrics.record_write("users", time.perf_counter() - start, len(line))
+        if self._journal_entries >= COMPACT_AFTER:
+            self._write_base()
+        self._stamp = self._stamps()
+
+    @instrumentation.timed_function("save_users")
+    def _write_base(self):
+        # Write users.json via a temp file and rename so readers never see
+        # half a file, then empty the journal it now contains. A reader that
+        # lands in between replays the old journal on the new base, which
+        # gives the same records.
+        start = time.perf_counter()
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._users, f, indent=4)
+            size = f.tell()
+        os.replace(tmp_path, self.path)
+        open(self.journal_path, "wb").close()
+        self._journal_offset = 0
+        self._journal_entries = 0
+        metrics.record_write("users", time.perf_counter() - start, size)
+
+    def save(self):
+        """Rewrite users.json in full and clear the journal."""
+        with file_lock(self.path):
+            self._write_base()
+            self._stamp = self._stamps()
+
+    def __len__(self):
+        self.refresh()
+        return len(self._users)
+
+    def __iter__(self):
+        self.refresh()
+        return iter(list(self._users))
+
+    def __contains__(self, username):
+        self.refresh()
+        return username in self._by_name
+
+    def get(self, username):
+        """Return the record for `username`, or None."""
+        self.refresh()
+        return self._by_name.get(username)
+
+    def authenticate(self, username, password):
+        """Return the record if the credentials match, otherwise None."""
+        user = self.get(username)
+        if user is None:
+            return None
+        if "password_hash" in user:
+            return user if verify_secret(password, user["password_hash"]) else None
+        # Record written before hashing: check, then upgrade it
+        if not hmac.compare_digest(user.get("password", ""), password):
+            return None
+        return self._update(username, password=None, password_hash=hash_secret(password))
+
+    def _update(self, username, **changes):
+        # Journal a copy of the record with `changes` applied (None removes a key)
+        with file_lock(self.path):
+            self.refresh()
+            user = dict(self._by_name[username])
+            for key, value in changes.items():
+                if value is None:
+                    user.pop(key, None)
+                else:
+                    user[key] = value
+            self._append({"op": "put", "user": user})
+        return user
+
+    def has_pin(self, username):
+        user = self.get(username)
+        return user is not None and "pin_hash" in user
+
+    def set_pin(self, username, pin):
+        """Set (or with pin=None clear) a user's quick-switch PIN and save."""
+        self._pin_sessions.pop(username, None)
+        self._pin_failures.pop(username, None)
+        return self._update(username, pin_hash=hash_secret(pin) if pin is not None else None)
+
+    def pin_locked(self, username):
+        """Seconds until `username` may try a PIN again; 0 if not locked out."""
+        failures = self._pin_failures.get(username)
+        return max(failures[1] - time.monotonic(), 0) if failures is not None else 0
+
+    def verify_pin(self, username, pin):
+        """Return the record if `pin` is the user's PIN, otherwise None.
+
+        The first success runs the full hash; after that the PIN is checked
+        against an HMAC kept in memory (keyed per process) until the session
+        expires or the stored PIN changes, so staff switching stays instant.
+        That makes guessing cheap too, so after PIN_MAX_ATTEMPTS wrong PINs
+        in a row the user's PIN is refused for PIN_LOCKOUT_SECONDS.
+        """
+        user = self.get(username)
+        if user is None or "pin_hash" not in user or self.pin_locked(username):
+            return None
+        tag = hmac.new(self._session_key, pin.encode("utf-8"), hashlib.sha256).digest()
+        session = self._pin_sessions.get(username)
+        if session is not None and session[0] == user["pin_hash"] and session[2] > time.monotonic():
+            ok = hmac.compare_digest(session[1], tag)
+        else:
+            ok = verify_secret(pin, user["pin_hash"])
+            if ok:
+                self._pin_sessions[username] = (user["pin_hash"], tag, time.monotonic() + PIN_SESSION_SECONDS)
+        if ok:
+            self._pin_failures.pop(username, None)
+            return user
+        wrong = self._pin_failures.get(username, (0, 0))[0] + 1
+        if wrong >= PIN_MAX_ATTEMPTS:
+            self._pin_failures[username] = (0, time.monotonic() + PIN_LOCKOUT_SECONDS)
+        else:
+            self._pin_failures[username] = (wrong, 0)
+        return None
+
+    def add(self, username, password, permission=DEFAULT_PERMISSION, pin=None):
+        """Add a user and save. Raises ValueError if the name is taken."""
+        user = {"username": username, "password_hash": hash_secret(password), "permission": permission}
+        if pin:
+            user["pin_hash"] = hash_secret(pin)
+        with file_lock(self.path):
+            self.refresh()
+            if username in self._by_name:
+                raise ValueError(f"Username '{username}' already exists.")
+            self._append({"op": "put", "user": user})
+        return user
+
+    def hash_plaintext(self):
+        """Replace any plaintext "password" fields with hashes; returns the count."""
+        # Under the lock and after a refresh, so the journal the rewrite
+        # clears holds nothing this store hasn't applied
+        with file_lock(self.path):
+            self.refresh()
+            upgraded = 0
+            for i, user in enumerate(self._users):
+                if "password" in user:
+                    user = dict(user)
+                    user["password_hash"] = hash_secret(user.pop("password"))
+                    self._users[i] = self._by_name[user["username"]] = user
+                    upgraded += 1
+            if upgraded:
+                self._write_base()
+                self._stamp = self._stamps()
+        return upgraded
+
+    def delete(self, username):
+        """Remove a user and save. Returns False if there was no such user."""
+        self._pin_sessions.pop(username, None)
+        with file_lock(self.path):
+            self.refresh()
+            if username not in self._by_name:
+                return False
+            self._append({"op": "delete", "username": username})
+        return True
+
+
+def migrate_passwords(passwords_path=PASSWORDS_FILE, users_path=USERS_FILE):
+    """Merge passwords.json into users.json and return the number of users added.
+
+    Names already in users.json keep their record. The old file is renamed
+    to `<name>.migrated` afterwards so the merge runs only once.
+    """
+    if not os.path.exists(passwords_path):
+        return 0
+    try:
+        with open(passwords_path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+        legacy = json.loads(content) if content else {}
+    except (json.JSONDecodeError, IOError):
+        return 0
+    store = UserStore(users_path)
+    added = 0
+    for username, password in legacy.items():
+        if username not in store:
+            store.add(username, password, DEFAULT_PERMISSION)
+            added += 1
+    os.replace(passwords_path, passwords_path + ".migrated")
+    return added
+
+
+def migrate(users_path=USERS_FILE, passwords_path=PASSWORDS_FILE):
+    """Run every pending users.json migration; entry points call this at startup."""
+    migrate_passwords(passwords_path, users_path)
+    UserStore(users_path).hash_plaintext()